@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import json
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+LOG_DB = Path("coach/logs/coach.db")
+LOG_DIR = Path("coach/logs")
+# Daily NDJSON logs the store mirrors, by file stem.
+LOGS = (
+    "activity",
+    "events",
+    "overlay_cmd_history",
+    "overlay_actions",
+    "speech",
+    "trace",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    id INTEGER PRIMARY KEY,
+    log TEXT NOT NULL,
+    day TEXT NOT NULL,
+    ts TEXT,
+    type TEXT,
+    status TEXT,
+    block_id TEXT,
+    event_id TEXT,
+    cmd_id TEXT,
+    trace_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_log_day ON rows (log, day, id);
+CREATE INDEX IF NOT EXISTS rows_log_ts ON rows (log, ts);
+CREATE INDEX IF NOT EXISTS rows_log_type ON rows (log, type, ts);
+CREATE INDEX IF NOT EXISTS rows_log_status ON rows (log, status, ts);
+CREATE INDEX IF NOT EXISTS rows_block_id ON rows (block_id, ts);
+CREATE INDEX IF NOT EXISTS rows_event_id ON rows (event_id);
+CREATE INDEX IF NOT EXISTS rows_cmd_id ON rows (cmd_id);
+CREATE INDEX IF NOT EXISTS rows_trace_id ON rows (trace_id);
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL
+);
+"""
+
+COLUMNS = "log, day, ts, type, status, block_id, event_id, cmd_id, trace_id, data"
+INSERT_ROW = f"INSERT INTO rows ({COLUMNS}) VALUES ({', '.join('?' * 10)})"
+FILTERS = ("type", "status", "block_id", "event_id", "cmd_id", "trace_id")
+
+
+def as_text(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def row_values(log: str, day: str, row: dict, line: Optional[str] = None) -> tuple:
+    # The row's kind: events/actions carry "type", trace spans "stage", speech
+    # rows "event_type".
+    kind = row.get("type") or row.get("stage") or row.get("event_type")
+    data = line.rstrip("\n") if line else json.dumps(row, ensure_ascii=True)
+    return (
+        log,
+        day,
+        as_text(row.get("ts")),
+        as_text(kind),
+        as_text(row.get("status")),
+        as_text(row.get("block_id")),
+        as_text(row.get("event_id") or row.get("source_event_id")),
+        as_text(row.get("cmd_id")),
+        as_text(row.get("trace_id")),
+        data,
+    )
+
+
+def day_from_path(path: Path, log: str) -> Optional[str]:
+    suffix = path.stem[len(log) + 1 :]
+    try:
+        return dt.date.fromisoformat(suffix).isoformat()
+    except ValueError:
+        return None
+
+
+def read_rows(
+    path: Path, start: int, end: Optional[int] = None
+) -> Tuple[List[Tuple[dict, str]], int]:
+    # (row, line) pairs of the complete lines in [start, end), and the offset
+    # just past the last one.
+    try:
+        with path.open("rb") as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(max(0, end - start))
+    except OSError:
+        return [], start
+    # A trailing line without "\n" is a write in progress.
+    data = data[: data.rfind(b"\n") + 1]
+    rows = []
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(row, dict):
+            rows.append((row, line))
+    return rows, start + len(data)
+
+
+class LogStore:
+    # SQLite (WAL) copy of the daily logs: one table, a column per field the
+    # runner and reports filter on, and the original row as JSON. The monitor
+    # and runner share the file; WAL lets each read while the other writes.
+    # imports records how far each NDJSON file has been copied, so importing
+    # is incremental and never duplicates rows a writer mirrored itself.
+    def __init__(self, path: Path = LOG_DB, logs: Iterable[str] = LOGS) -> None:
+        self.path = path
+        self.logs = set(logs)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(
+            str(path), timeout=10.0, check_same_thread=False, isolation_level=None
+        )
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+
+    @property
+    def wal_path(self) -> Path:
+        # Changes when any process commits; watch it to wake on new rows.
+        return self.path.with_name(self.path.name + "-wal")
+
+    def insert(
+        self,
+        log: str,
+        day: str,
+        rows: List[Tuple[dict, str]],
+        source: Optional[Tuple[Path, int, int]] = None,
+    ) -> None:
+        # rows are (row, line) pairs. source is the NDJSON file and the byte
+        # range they were written to; the import offset only advances over a
+        # contiguous copy, so rows already in the file before it (the store was
+        # enabled mid-day, another process wrote them) are copied first.
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if source is not None:
+                    path, start, end = source
+                    offset = self._offset(str(path))
+                    if offset >= end:
+                        # An import already copied this range from the file.
+                        rows = []
+                    elif offset < start:
+                        rows = read_rows(path, offset, start)[0] + rows
+                self.conn.executemany(
+                    INSERT_ROW,
+                    [row_values(log, day, row, line) for row, line in rows],
+                )
+                if source is not None:
+                    self._set_offset(str(source[0]), source[2])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _offset(self, source: str) -> int:
+        found = self.conn.execute(
+            "SELECT offset FROM imports WHERE source = ?", (source,)
+        ).fetchone()
+        return found[0] if found else 0
+
+    def _set_offset(self, source: str, offset: int) -> None:
+        self.conn.execute(
+            "INSERT INTO imports (source, offset) VALUES (?, ?) "
+            "ON CONFLICT(source) DO UPDATE SET offset = MAX(offset, excluded.offset)",
+            (source, offset),
+        )
+
+    def import_file(self, log: str, path: Path, day: Optional[str] = None) -> int:
+        # Copies rows appended to path since the last import; returns the count.
+        day = day or day_from_path(path, log)
+        if day is None:
+            return 0
+        source = str(path.resolve())
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                offset = self._offset(source)
+                rows, end = read_rows(Path(source), offset)
+                self.conn.executemany(
+                    INSERT_ROW,
+                    [row_values(log, day, row, line) for row, line in rows],
+                )
+                self._set_offset(source, end)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def import_dir(self, log_dir: Path = LOG_DIR) -> dict:
+        counts = {}
+        for log in sorted(self.logs):
+            for path in sorted(log_dir.glob(f"{log}_*.ndjson")):
+                if day_from_path(path, log) is None:
+                    continue
+                counts[log] = counts.get(log, 0) + self.import_file(log, path)
+        return counts
+
+    def _query(self, sql: str, params: tuple) -> list:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def read_after(
+        self, log: str, after_id: int, day: Optional[dt.date] = None
+    ) -> Tuple[int, List[str]]:
+        # Rows past after_id as NDJSON lines, like tailing the daily file.
+        sql = "SELECT id, data FROM rows WHERE log = ? AND id > ?"
+        params: tuple = (log, after_id)
+        if day is not None:
+            sql += " AND day = ?"
+            params += (day.isoformat(),)
+        found = self._query(sql + " ORDER BY id", params)
+        if not found:
+            return after_id, []
+        return found[-1][0], [data for _, data in found]
+
+    def tail_lines(
+        self, log: str, max_lines: int, day: Optional[dt.date] = None
+    ) -> List[str]:
+        if max_lines <= 0:
+            return []
+        sql = "SELECT data FROM rows WHERE log = ?"
+        params: tuple = (log,)
+        if day is not None:
+            sql += " AND day = ?"
+            params += (day.isoformat(),)
+        found = self._query(sql + " ORDER BY id DESC LIMIT ?", params + (max_lines,))
+        return [data for (data,) in reversed(found)]
+
+    def last_row(self, log: str, day: Optional[dt.date] = None) -> Optional[dict]:
+        lines = self.tail_lines(log, 1, day)
+        if not lines:
+            return None
+        try:
+            row = json.loads(lines[0])
+        except json.JSONDecodeError:
+            return None
+        return row if isinstance(row, dict) else None
+
+    def rows(self, log: str, day: dt.date, **filters) -> List[dict]:
+        # Rows of one day, optionally filtered on indexed columns (FILTERS).
+        sql = "SELECT data FROM rows WHERE log = ? AND day = ?"
+        params: tuple = (log, day.isoformat())
+        for column, value in filters.items():
+            if column not in FILTERS:
+                raise ValueError(f"unknown filter: {column}")
+            sql += f" AND {column} = ?"
+            params += (value,)
+        result = []
+        for (data,) in self._query(sql + " ORDER BY id", params):
+            try:
+                row = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(row, dict):
+                result.append(row)
+        return result
+
+    def counts(self, day: dt.date) -> List[Tuple[str, Optional[str], int]]:
+        return self._query(
+            "SELECT log, type, COUNT(*) FROM rows WHERE day = ? "
+            "GROUP BY log, type ORDER BY log, type",
+            (day.isoformat(),),
+        )
+
+    def prune(self, keep_days: int) -> None:
+        if keep_days <= 0:
+            return
+        cutoff = dt.date.today() - dt.timedelta(days=keep_days)
+        with self.lock:
+            self.conn.execute("DELETE FROM rows WHERE day < ?", (cutoff.isoformat(),))
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+
+def open_store(path: Optional[Path]) -> Optional[LogStore]:
+    return LogStore(path) if path else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Indexed SQLite copy of coach logs")
+    parser.add_argument(
+        "command",
+        choices=["import", "counts"],
+        help="import: copy daily NDJSON files; counts: rows per log and type",
+    )
+    parser.add_argument("--db", type=Path, default=LOG_DB, help="SQLite file")
+    parser.add_argument(
+        "--log-dir", type=Path, default=LOG_DIR, help="Directory of daily logs"
+    )
+    parser.add_argument(
+        "--day",
+        type=dt.date.fromisoformat,
+        default=dt.date.today(),
+        help="Day for counts (YYYY-MM-DD)",
+    )
+    args = parser.parse_args()
+
+    store = LogStore(args.db)
+    try:
+        if args.command == "import":
+            counts = store.import_dir(args.log_dir)
+            for log in sorted(counts):
+                print(f"{log}: {counts[log]} row(s)")
+        else:
+            for log, kind, count in store.counts(args.day):
+                print(f"{log:<22} {kind or '-':<24} {count:>7}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+import ctypes
+import ctypes.util
+import datetime as dt
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+TAIL_BLOCK_SIZE = 8192
+
+
+def read_tail_lines(
+    path: Path, max_lines: int, block_size: int = TAIL_BLOCK_SIZE
+) -> list:
+    # Seek backwards from EOF in fixed blocks until enough newlines are buffered,
+    # so the cost depends on max_lines rather than on how large the log has grown.
+    # A trailing line without "\n" is a write in progress and is skipped.
+    if max_lines <= 0:
+        return []
+    try:
+        with path.open("rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= max_lines:
+                step = min(block_size, position)
+                position -= step
+                f.seek(position)
+                data = f.read(step) + data
+    except OSError:
+        return []
+    if position > 0:
+        # The first buffered line may start mid-row.
+        data = data[data.find(b"\n") + 1 :]
+    if not data.endswith(b"\n"):
+        data = data[: data.rfind(b"\n") + 1]
+    lines = [
+        line
+        for line in data.decode("utf-8", errors="replace").splitlines()
+        if line.strip()
+    ]
+    return lines[-max_lines:]
+
+
+def file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class LastRowCache:
+    # Parsed last row per log, re-read only when the file's size or mtime moves.
+    def __init__(self) -> None:
+        self.rows: Dict[Path, Tuple[Tuple[int, int], Optional[dict]]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, path: Path) -> Optional[dict]:
+        signature = file_signature(path)
+        if signature is None:
+            return None
+        with self.lock:
+            cached = self.rows.get(path)
+            if cached and cached[0] == signature:
+                return cached[1]
+        row = None
+        lines = read_tail_lines(path, 1)
+        if lines:
+            try:
+                parsed = json.loads(lines[0])
+                row = parsed if isinstance(parsed, dict) else None
+            except json.JSONDecodeError:
+                row = None
+        with self.lock:
+            self.rows[path] = (signature, row)
+        return row
+
+    def invalidate(self, path: Optional[Path] = None) -> None:
+        with self.lock:
+            if path is None:
+                self.rows.clear()
+            else:
+                self.rows.pop(path, None)
+
+
+LAST_ROWS = LastRowCache()
+
+
+def read_last_row(path: Path) -> Optional[dict]:
+    return LAST_ROWS.get(path)
+
+
+FLUSH_POLICIES = ("row", "interval", "close")
+
+
+def log_path_for_day(path: Path, day: dt.date) -> Path:
+    stamp = day.isoformat()
+    return path.with_name(f"{path.stem}_{stamp}{path.suffix}")
+
+
+class NdjsonWriter:
+    # Keeps the log open between rows and buffers whole lines. Every flush is a
+    # single O_APPEND write of complete rows, so tailing readers never observe a
+    # half-written line from this writer.
+    #
+    # With a db (logdb.LogStore) that stores this log, each flush also inserts
+    # the rows in one transaction; files=False then skips the NDJSON file.
+    #
+    # tailed marks a log another process reads as it is written (events,
+    # activity): commit() flushes it even under the close policy.
+    def __init__(
+        self,
+        base_path: Path,
+        daily: bool = True,
+        policy: str = "interval",
+        flush_interval: float = 1.0,
+        fsync: bool = False,
+        db=None,
+        files: bool = True,
+        tailed: bool = False,
+    ) -> None:
+        if policy not in FLUSH_POLICIES:
+            raise ValueError(f"unknown flush policy: {policy}")
+        self.base_path = base_path
+        self.daily = daily
+        self.policy = policy
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.tailed = tailed
+        self.log = base_path.stem
+        self.db = db if db is not None and daily and self.log in db.logs else None
+        self.files = files or self.db is None
+        self.path: Optional[Path] = None
+        self.day: Optional[str] = None
+        self.fd: Optional[int] = None
+        self.pending: list = []
+        self.pending_rows: list = []
+        self.last_row: Optional[dict] = None
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+
+    def path_for(self, now: Optional[dt.datetime] = None) -> Path:
+        if not self.daily:
+            return self.base_path
+        return log_path_for_day(self.base_path, (now or dt.datetime.now()).date())
+
+    def write(self, row: dict, now: Optional[dt.datetime] = None) -> None:
+        line = json.dumps(row, ensure_ascii=True) + "\n"
+        now = now or dt.datetime.now()
+        path = self.path_for(now)
+        with self.lock:
+            if path != self.path:
+                self._flush()
+                self._open(path)
+                self.day = now.date().isoformat()
+            self.pending.append(line)
+            if self.db is not None:
+                self.pending_rows.append((row, line))
+            self.last_row = row
+            if self.policy == "row" or (
+                self.policy == "interval"
+                and time.monotonic() - self.last_flush >= self.flush_interval
+            ):
+                self._flush()
+
+    def commit(self) -> None:
+        # Group-commit boundary: rows written since the last commit land in one
+        # write. The close policy defers everything else to close().
+        if self.policy == "close" and not self.tailed:
+            return
+        with self.lock:
+            self._flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+            self.path = None
+
+    def _open(self, path: Path) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.path = path
+        if not self.files:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _flush(self) -> None:
+        self.last_flush = time.monotonic()
+        if not self.pending or self.path is None:
+            return
+        data = "".join(self.pending).encode("utf-8")
+        rows = self.pending_rows
+        self.pending = []
+        self.pending_rows = []
+        source = None
+        if self.fd is not None:
+            view = memoryview(data)
+            while view:
+                written = os.write(self.fd, view)
+                view = view[written:]
+            if self.fsync:
+                os.fsync(self.fd)
+            # With O_APPEND the fd offset ends where this write landed, even if
+            # another process appended since; the rows occupy [end - len, end).
+            end = os.lseek(self.fd, 0, os.SEEK_CUR)
+            source = (self.path.resolve(), end - len(data), end)
+        if self.db is not None and rows:
+            try:
+                self.db.insert(self.log, self.day, rows, source=source)
+            except Exception as exc:
+                print(f"logio: {self.log} rows not stored in {self.db.path}: {exc}")
+
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class FileWatcher:
+    # Blocks until one of the watched files changes, a timeout passes, or
+    # wake() is called from another thread. inotify watches the parent
+    # directories (so files that do not exist yet, or are replaced by rename,
+    # are still seen); elsewhere the files are stat-polled.
+    def __init__(
+        self, paths: Iterable[Path], backend: str = "auto", poll_interval: float = 0.5
+    ) -> None:
+        self.poll_interval = poll_interval
+        self.paths: Set[Path] = set()
+        self.signatures: Dict[Path, Optional[Tuple[int, int]]] = {}
+        self.dirs: Dict[Path, int] = {}
+        self.wds: Dict[int, Path] = {}
+        self.fd: Optional[int] = None
+        self.libc = None
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        if backend not in ("auto", "inotify", "poll"):
+            raise ValueError(f"unknown watcher backend: {backend}")
+        if backend != "poll" and sys.platform.startswith("linux"):
+            self._init_inotify()
+        if backend == "inotify" and self.fd is None:
+            raise RuntimeError("inotify is not available")
+        self.name = "inotify" if self.fd is not None else "poll"
+        self.watch(paths)
+
+    def _init_inotify(self) -> None:
+        try:
+            libc = ctypes.CDLL(
+                ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+            )
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        self.libc = libc
+        self.fd = fd
+
+    def watch(self, paths: Iterable[Path]) -> None:
+        # Replaces the watched set, e.g. when daily log names roll over.
+        self.paths = {Path(os.path.abspath(path)) for path in paths}
+        self.signatures = {path: file_signature(path) for path in self.paths}
+        if self.fd is None:
+            return
+        for directory in {path.parent for path in self.paths}:
+            if directory in self.dirs:
+                continue
+            wd = self.libc.inotify_add_watch(
+                self.fd, str(directory).encode(), WATCH_MASK
+            )
+            if wd < 0:
+                # Missing directory or watch limit reached; poll everything.
+                self.close_inotify()
+                return
+            self.dirs[directory] = wd
+            self.wds[wd] = directory
+
+    def wake(self) -> None:
+        try:
+            os.write(self.wake_w, b"x")
+        except (BlockingIOError, OSError):
+            pass
+
+    def wait(self, timeout: Optional[float]) -> Set[Path]:
+        deadline = None if timeout is None else time.monotonic() + max(0.0, timeout)
+        while True:
+            remaining = None
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+            readers = [self.wake_r]
+            if self.fd is not None:
+                readers.append(self.fd)
+            elif remaining is None or remaining > self.poll_interval:
+                remaining = self.poll_interval
+            try:
+                ready, _, _ = select.select(readers, [], [], remaining)
+            except InterruptedError:
+                ready = []
+            changed: Set[Path] = set()
+            if self.wake_r in ready:
+                self._drain_wake()
+                return changed
+            if self.fd is not None and self.fd in ready:
+                changed = self._read_events()
+            elif self.fd is None:
+                changed = self._poll()
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return changed
+
+    def _drain_wake(self) -> None:
+        try:
+            while os.read(self.wake_r, 64):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _read_events(self) -> Set[Path]:
+        changed: Set[Path] = set()
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                break
+            except OSError:
+                self.close_inotify()
+                return set(self.paths)
+            if not data:
+                break
+            offset = 0
+            while offset + INOTIFY_EVENT.size <= len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                raw_name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    changed |= self.paths
+                    continue
+                directory = self.wds.get(wd)
+                if directory is None or not raw_name:
+                    continue
+                path = directory / os.fsdecode(raw_name)
+                if path in self.paths:
+                    changed.add(path)
+        return changed
+
+    def _poll(self) -> Set[Path]:
+        changed: Set[Path] = set()
+        for path in self.paths:
+            signature = file_signature(path)
+            if signature != self.signatures.get(path):
+                self.signatures[path] = signature
+                changed.add(path)
+        return changed
+
+    def close_inotify(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+        self.fd = None
+        self.dirs = {}
+        self.wds = {}
+        self.name = "poll"
+
+    def close(self) -> None:
+        self.close_inotify()
+        for fd in (self.wake_r, self.wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
@@ -1,18 +1,47 @@
 #!/usr/bin/env python3
 import argparse
+import ctypes
+import ctypes.util
 import datetime as dt
 import json
 import os
 import platform
+import queue
 import random
+import re
 import shutil
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
 import time
+import urllib.parse
 import uuid
+from collections import OrderedDict, deque
 from pathlib import Path
 from typing import Optional, Tuple, Dict
 
+try:
+    from PIL import Image
+
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    from coach import logdb, logio, tracing, voice, worker
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    try:
+        from coach import logdb, logio, tracing, voice, worker
+    except ImportError:
+        import logdb
+        import logio
+        import tracing
+        import voice
+        import worker
+
 
 def is_macos() -> bool:
     return platform.system() == "Darwin"
@@ -88,14 +117,252 @@ def play_sound(sound_path: Optional[Path]) -> None:
             pass
 
 
-def frontmost_app_info() -> Tuple[str, str]:
-    if not is_macos():
+# Front tab URL per browser. Each script is only compiled while its browser is
+# frontmost, so a browser that is not installed never triggers a lookup prompt.
+CHROMIUM_TAB_URL = 'tell application "{}" to return URL of active tab of front window'
+BROWSER_URL_SCRIPTS = {
+    "Safari": 'tell application "Safari" to return URL of front document',
+    **{
+        name: CHROMIUM_TAB_URL.format(name)
+        for name in ("Google Chrome", "Brave Browser", "Microsoft Edge", "Arc")
+    },
+}
+
+
+def url_domain_of(url: str) -> Optional[str]:
+    host = urllib.parse.urlsplit(url.strip()).hostname
+    if not host:
+        return None
+    return host[4:] if host.startswith("www.") else host
+
+
+def browser_url_domain(app_name: str) -> Optional[str]:
+    # Domain of the front tab when a known browser is frontmost (macOS only).
+    script = BROWSER_URL_SCRIPTS.get(app_name)
+    if script is None or not is_macos():
+        return None
+    code, out, _ = run(["osascript", "-e", script], timeout=5)
+    if code != 0 or not out:
+        return None
+    return url_domain_of(out)
+
+
+class WindowProbe:
+    name = "none"
+
+    def read(self) -> Tuple[str, str]:
         return "", ""
-    app_script = 'tell application "System Events" to get name of first application process whose frontmost is true'
-    win_script = 'tell application "System Events" to tell (first application process whose frontmost is true) to get name of front window'
-    _, app_out, _ = run(["osascript", "-e", app_script])
-    _, win_out, _ = run(["osascript", "-e", win_script])
-    return app_out, win_out
+
+    def probe(self) -> Tuple[str, str, float]:
+        started = time.perf_counter()
+        try:
+            app_name, win_title = self.read()
+        except Exception:
+            app_name, win_title = "", ""
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        return app_name, win_title, latency_ms
+
+    def close(self) -> None:
+        pass
+
+
+class MacWindowProbe(WindowProbe):
+    name = "macos"
+    # One osascript round trip for both values; the window lookup is wrapped in
+    # `try` because apps without windows (e.g. Finder on the desktop) throw.
+    script = [
+        'tell application "System Events"',
+        "set frontProc to first application process whose frontmost is true",
+        "set appName to name of frontProc",
+        'set winName to ""',
+        "try",
+        "set winName to name of front window of frontProc",
+        "end try",
+        "end tell",
+        "return appName & linefeed & winName",
+    ]
+
+    def read(self) -> Tuple[str, str]:
+        cmd = ["osascript"]
+        for line in self.script:
+            cmd += ["-e", line]
+        code, out, _ = run(cmd, timeout=5)
+        if code != 0:
+            return "", ""
+        app_name, _, win_title = out.partition("\n")
+        return app_name.strip(), win_title.strip()
+
+
+class X11WindowProbe(WindowProbe):
+    name = "x11"
+
+    def __init__(self) -> None:
+        self.xlib = None
+        self.display = None
+        self.atoms: Dict[str, int] = {}
+        path = ctypes.util.find_library("X11")
+        if path and os.environ.get("DISPLAY"):
+            try:
+                self.open_display(ctypes.cdll.LoadLibrary(path))
+            except OSError:
+                self.xlib = None
+        if self.display is None and not shutil.which("xprop"):
+            raise RuntimeError("x11 probe needs libX11 or xprop and a DISPLAY")
+
+    def open_display(self, xlib) -> None:
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XDefaultRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultRootWindow.argtypes = [ctypes.c_void_p]
+        xlib.XInternAtom.restype = ctypes.c_ulong
+        xlib.XInternAtom.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int]
+        xlib.XGetWindowProperty.restype = ctypes.c_int
+        xlib.XGetWindowProperty.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_ulong,
+            ctypes.c_ulong,
+            ctypes.c_long,
+            ctypes.c_long,
+            ctypes.c_int,
+            ctypes.c_ulong,
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_int),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_ulong),
+            ctypes.POINTER(ctypes.c_void_p),
+        ]
+        xlib.XFree.argtypes = [ctypes.c_void_p]
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        # Without a handler a BadWindow (window closed mid-probe) kills the process.
+        handler_type = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+        self.error_handler = handler_type(lambda display, event: 0)
+        xlib.XSetErrorHandler(self.error_handler)
+        display = xlib.XOpenDisplay(None)
+        if not display:
+            return
+        self.xlib = xlib
+        self.display = display
+        self.root = xlib.XDefaultRootWindow(display)
+        for name in ("_NET_ACTIVE_WINDOW", "_NET_WM_NAME", "UTF8_STRING", "WM_CLASS"):
+            self.atoms[name] = xlib.XInternAtom(display, name.encode(), 0)
+        self.atoms["WM_NAME"] = 39  # predefined XA_WM_NAME
+
+    def get_property(self, window: int, atom: str) -> Optional[Tuple[int, bytes]]:
+        actual_type = ctypes.c_ulong()
+        actual_format = ctypes.c_int()
+        nitems = ctypes.c_ulong()
+        bytes_after = ctypes.c_ulong()
+        prop = ctypes.c_void_p()
+        status = self.xlib.XGetWindowProperty(
+            self.display,
+            window,
+            self.atoms[atom],
+            0,
+            1024,
+            0,
+            0,
+            ctypes.byref(actual_type),
+            ctypes.byref(actual_format),
+            ctypes.byref(nitems),
+            ctypes.byref(bytes_after),
+            ctypes.byref(prop),
+        )
+        if status != 0 or not prop.value:
+            return None
+        try:
+            count = nitems.value
+            if actual_format.value == 32:
+                # Format-32 properties come back as C longs, not 32-bit ints.
+                values = ctypes.cast(prop, ctypes.POINTER(ctypes.c_ulong))
+                return 32, struct.pack(f"{count}Q", *values[:count])
+            return actual_format.value, ctypes.string_at(prop, count)
+        finally:
+            self.xlib.XFree(prop)
+
+    def read(self) -> Tuple[str, str]:
+        if self.display is None:
+            return self.read_xprop()
+        active = self.get_property(self.root, "_NET_ACTIVE_WINDOW")
+        if not active or len(active[1]) < 8:
+            return "", ""
+        window = struct.unpack("Q", active[1][:8])[0]
+        if not window:
+            return "", ""
+        title = ""
+        for atom in ("_NET_WM_NAME", "WM_NAME"):
+            value = self.get_property(window, atom)
+            if value and value[1]:
+                title = value[1].decode("utf-8", errors="replace")
+                break
+        app_name = ""
+        wm_class = self.get_property(window, "WM_CLASS")
+        if wm_class and wm_class[1]:
+            parts = [p for p in wm_class[1].split(b"\0") if p]
+            if parts:
+                app_name = parts[-1].decode("utf-8", errors="replace")
+        return app_name, title
+
+    def read_xprop(self) -> Tuple[str, str]:
+        script = (
+            "id=$(xprop -root -notype _NET_ACTIVE_WINDOW | awk '{print $NF}'); "
+            'xprop -id "$id" -notype WM_CLASS _NET_WM_NAME WM_NAME'
+        )
+        code, out, _ = run(["sh", "-c", script], timeout=5)
+        if code != 0:
+            return "", ""
+        app_name, title = "", ""
+        for line in out.splitlines():
+            key, _, value = line.partition(" = ")
+            strings = re.findall(r'"((?:[^"\\]|\\.)*)"', value)
+            if key.startswith("WM_CLASS") and strings:
+                app_name = strings[-1]
+            elif key.startswith("_NET_WM_NAME") and strings:
+                title = strings[0]
+            elif key.startswith("WM_NAME") and strings and not title:
+                title = strings[0]
+        return app_name, title
+
+    def close(self) -> None:
+        if self.display is not None:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+
+class FakeWindowProbe(WindowProbe):
+    name = "fake"
+
+    def __init__(self, windows: Optional[list] = None, latency: float = 0.0) -> None:
+        self.windows = windows or [("Fake", "fake window")]
+        self.latency = latency
+        self.index = 0
+
+    def read(self) -> Tuple[str, str]:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        app_name, win_title = self.windows[self.index % len(self.windows)]
+        self.index += 1
+        return app_name, win_title
+
+
+def make_window_probe(name: str = "auto") -> WindowProbe:
+    if name == "auto":
+        if is_macos():
+            name = "macos"
+        elif os.environ.get("DISPLAY"):
+            name = "x11"
+        else:
+            name = "none"
+    if name == "macos":
+        return MacWindowProbe()
+    if name == "x11":
+        try:
+            return X11WindowProbe()
+        except RuntimeError as exc:
+            print(f"monitor: {exc}; window probe disabled")
+            return WindowProbe()
+    if name == "fake":
+        return FakeWindowProbe()
+    return WindowProbe()
 
 
 def screencap(out_path: Path) -> bool:
@@ -106,6 +373,240 @@ def screencap(out_path: Path) -> bool:
     return code == 0
 
 
+def read_bmp_gray(path: Path) -> Optional[Tuple[int, int, list]]:
+    # Minimal reader for the uncompressed 24/32-bit BMPs that `sips` emits.
+    try:
+        data = path.read_bytes()
+        if data[:2] != b"BM":
+            return None
+        pixel_offset = struct.unpack_from("<I", data, 10)[0]
+        width, height = struct.unpack_from("<ii", data, 18)
+        bpp = struct.unpack_from("<H", data, 28)[0]
+    except (OSError, struct.error):
+        return None
+    if bpp not in (24, 32) or width <= 0 or height == 0:
+        return None
+    step = bpp // 8
+    row_size = (width * step + 3) & ~3
+    bottom_up = height > 0
+    height = abs(height)
+    gray = []
+    for y in range(height):
+        row = (height - 1 - y) if bottom_up else y
+        base = pixel_offset + row * row_size
+        for x in range(width):
+            b, g, r = data[base + x * step : base + x * step + 3]
+            gray.append((r * 299 + g * 587 + b * 114) // 1000)
+    return width, height, gray
+
+
+def frame_fingerprint(path: Path, hash_size: int = 8) -> Optional[int]:
+    # Difference hash: shrink to (hash_size+1)x hash_size grayscale and record
+    # whether each pixel is brighter than its right-hand neighbour.
+    width, height = hash_size + 1, hash_size
+    gray = None
+    if HAS_PIL:
+        try:
+            with Image.open(path) as img:
+                small = img.convert("L").resize((width, height), Image.BILINEAR)
+                gray = list(small.getdata())
+        except Exception:
+            gray = None
+    elif is_macos():
+        with tempfile.TemporaryDirectory() as tmp:
+            bmp_path = Path(tmp) / "thumb.bmp"
+            code, _, _ = run(
+                [
+                    "sips",
+                    "-s",
+                    "format",
+                    "bmp",
+                    "-z",
+                    str(height),
+                    str(width),
+                    str(path),
+                    "--out",
+                    str(bmp_path),
+                ]
+            )
+            if code == 0:
+                decoded = read_bmp_gray(bmp_path)
+                if decoded and decoded[:2] == (width, height):
+                    gray = decoded[2]
+    if not gray or len(gray) != width * height:
+        return None
+    value = 0
+    for y in range(height):
+        for x in range(hash_size):
+            left = gray[y * width + x]
+            right = gray[y * width + x + 1]
+            value = (value << 1) | (1 if left > right else 0)
+    return value
+
+
+def hash_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def reusable_verdict(
+    last: Optional[dict],
+    frame_hash: Optional[int],
+    app_name: str,
+    win_title: str,
+    now: dt.datetime,
+    threshold: int,
+    max_age: int,
+) -> Optional[int]:
+    if not last or frame_hash is None or last.get("hash") is None:
+        return None
+    if last.get("app") != app_name or last.get("title") != win_title:
+        return None
+    if max_age > 0 and (now - last["ts"]).total_seconds() > max_age:
+        return None
+    distance = hash_distance(frame_hash, last["hash"])
+    if distance > threshold:
+        return None
+    return distance
+
+
+def normalize_title(title: str) -> str:
+    # Drop unread badges, counters and clocks so "(3) Discord" and
+    # "(4) Discord" share one cache entry.
+    value = re.sub(r"[\(\[]\d+[\)\]]", " ", title.lower())
+    value = re.sub(r"\d+", "#", value)
+    value = re.sub(r"[•●·|—–-]+", " ", value)
+    return " ".join(value.split())
+
+
+class VerdictCache:
+    def __init__(
+        self,
+        path: Path,
+        capacity: int = 256,
+        ttl: int = 900,
+        min_confidence: float = 0.8,
+    ) -> None:
+        self.path = path
+        self.stats_path = path.with_name(f"{path.stem}_stats.json")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.min_confidence = min_confidence
+        self.entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "uncacheable": 0,
+            "expired": 0,
+            "admitted": 0,
+            "rejected": 0,
+            "evicted": 0,
+        }
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.saved_at = 0.0
+        self.load()
+
+    @staticmethod
+    def key(
+        app_name: str, win_title: str, url_domain: Optional[str]
+    ) -> Optional[tuple]:
+        if not app_name:
+            return None
+        return (app_name, normalize_title(win_title), url_domain or "")
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        now = time.time()
+        for entry in data.get("entries", []):
+            try:
+                key = tuple(entry["key"])
+                if entry["expires_at"] > now:
+                    self.entries[key] = entry
+            except (KeyError, TypeError):
+                continue
+        stats = data.get("stats")
+        if isinstance(stats, dict):
+            for name in self.stats:
+                if isinstance(stats.get(name), int):
+                    self.stats[name] = stats[name]
+
+    def lookup(
+        self, app_name: str, win_title: str, url_domain: Optional[str]
+    ) -> Optional[dict]:
+        key = self.key(app_name, win_title, url_domain)
+        with self.lock:
+            self.dirty = True
+            if key is None:
+                self.stats["uncacheable"] += 1
+                return None
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            if entry["expires_at"] <= time.time():
+                del self.entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry["verdict"]
+
+    def admit(
+        self,
+        app_name: str,
+        win_title: str,
+        url_domain: Optional[str],
+        verdict: dict,
+    ) -> bool:
+        key = self.key(app_name, win_title, url_domain)
+        if key is None:
+            return False
+        confidence = verdict.get("confidence")
+        with self.lock:
+            self.dirty = True
+            if (
+                verdict.get("status") not in ("on_task", "off_task")
+                or not isinstance(confidence, (int, float))
+                or confidence < self.min_confidence
+            ):
+                self.stats["rejected"] += 1
+                return False
+            # Confident verdicts live longer; borderline ones are re-checked sooner.
+            ttl = self.ttl * min(1.0, float(confidence))
+            self.entries[key] = {
+                "key": list(key),
+                "verdict": verdict,
+                "confidence": confidence,
+                "expires_at": time.time() + ttl,
+            }
+            self.entries.move_to_end(key)
+            self.stats["admitted"] += 1
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.stats["evicted"] += 1
+            return True
+
+    def save(self, min_interval: float = 0.0) -> None:
+        with self.lock:
+            if not self.dirty or time.time() - self.saved_at < min_interval:
+                return
+            now = time.time()
+            entries = [e for e in self.entries.values() if e["expires_at"] > now]
+            stats = dict(self.stats)
+            self.dirty = False
+            self.saved_at = now
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        stats["entries"] = len(entries)
+        stats["updated_at"] = dt.datetime.now().isoformat()
+        write_json(self.path, {"entries": entries, "stats": stats})
+        write_json(self.stats_path, stats)
+
+
 def webcam_snap(out_path: Path) -> bool:
     # Uses imagesnap if available (brew install imagesnap). Requires Camera permission.
     exe = shutil.which("imagesnap")
@@ -119,11 +620,6 @@ def timestamp() -> str:
     return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
-def log_path_for_day(path: Path, day: dt.date) -> Path:
-    stamp = day.isoformat()
-    return path.with_name(f"{path.stem}_{stamp}{path.suffix}")
-
-
 def prune_logs(log_dir: Path, stem: str, keep_days: int) -> None:
     if keep_days <= 0:
         return
@@ -164,37 +660,143 @@ def prune_archive(root: Path, keep_days: int) -> None:
             shutil.rmtree(path, ignore_errors=True)
 
 
-def frame_path(buffer_dir: Path, timestamp: dt.datetime) -> Path:
-    ensure_dir(buffer_dir)
-    stamp = timestamp.strftime("%Y-%m-%d_%H-%M-%S")
-    return buffer_dir / f"{stamp}.png"
+FRAME_SUFFIXES = {"jpeg": ".jpg", "webp": ".webp", "png": ".png"}
+GRAY_PROFILE = Path("/System/Library/ColorSync/Profiles/Generic Gray Profile.icc")
 
 
-def trim_dir(buffer_dir: Path, keep: int, min_age_seconds: int = 0) -> None:
-    if keep <= 0:
-        return
-    frames = sorted(buffer_dir.glob("*.png"))
-    excess = len(frames) - keep
-    if excess <= 0:
-        return
-    cutoff = dt.datetime.now().timestamp() - min_age_seconds
-    removed = 0
-    for path in frames:
-        if removed >= excess:
-            break
+def prepare_frame(
+    src: Path, dst: Path, max_edge: int, fmt: str, quality: int, grayscale: bool
+) -> Optional[Path]:
+    # Produce the classifier-sized derivative. Returns the written path, whose
+    # suffix may differ from dst when the backend cannot encode `fmt`.
+    dst = dst.with_suffix(FRAME_SUFFIXES.get(fmt, ".jpg"))
+    if HAS_PIL:
         try:
-            if min_age_seconds > 0 and path.stat().st_mtime > cutoff:
-                continue
-            path.unlink()
-            removed += 1
+            with Image.open(src) as img:
+                img = img.convert("L" if grayscale else "RGB")
+                if max_edge > 0:
+                    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                if fmt == "png":
+                    img.save(dst, format="PNG", optimize=True)
+                else:
+                    img.save(
+                        dst, format=fmt.upper(), quality=quality, optimize=True
+                    )
+            return dst
         except Exception:
-            pass
-
-
-def write_ndjson(path: Path, row: dict) -> None:
-    ensure_dir(path.parent)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=True) + "\n")
+            return None
+    if is_macos():
+        # sips ships with macOS but cannot write WebP; fall back to JPEG.
+        if fmt == "webp":
+            fmt = "jpeg"
+            dst = dst.with_suffix(FRAME_SUFFIXES["jpeg"])
+        cmd = ["sips", "-s", "format", fmt]
+        if fmt == "jpeg":
+            cmd += ["-s", "formatOptions", str(quality)]
+        if max_edge > 0:
+            cmd += ["-Z", str(max_edge)]
+        if grayscale and GRAY_PROFILE.exists():
+            cmd += ["-m", str(GRAY_PROFILE)]
+        cmd += [str(src), "--out", str(dst)]
+        code, _, _ = run(cmd, timeout=10)
+        if code == 0 and dst.exists():
+            return dst
+    return None
+
+
+def file_size(path: Optional[Path]) -> int:
+    try:
+        return path.stat().st_size if path else 0
+    except OSError:
+        return 0
+
+
+class FrameRing:
+    # Fixed set of slot files plus a small manifest, so rotation and "last K
+    # frames" never need to list or sort the buffer directory.
+    def __init__(self, buffer_dir: Path, capacity: int) -> None:
+        self.buffer_dir = buffer_dir
+        self.capacity = max(1, capacity)
+        self.manifest_path = buffer_dir / "manifest.json"
+        self.slots: list = [None] * self.capacity
+        self.next_slot = 0
+        self.lock = threading.Lock()
+        ensure_dir(buffer_dir)
+        self.load()
+
+    def load(self) -> None:
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return
+        slots = data.get("slots")
+        if data.get("capacity") != self.capacity or not isinstance(slots, list):
+            # Capacity changed: drop slots that no longer exist.
+            for entry in slots or []:
+                if isinstance(entry, dict) and entry.get("slot", 0) >= self.capacity:
+                    (self.buffer_dir / entry.get("file", "")).unlink(missing_ok=True)
+            return
+        self.slots = [s if isinstance(s, dict) else None for s in slots]
+        self.next_slot = int(data.get("next", 0)) % self.capacity
+
+    def save(self) -> None:
+        data = {
+            "capacity": self.capacity,
+            "next": self.next_slot,
+            "slots": self.slots,
+        }
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, ensure_ascii=True), encoding="utf-8")
+        os.replace(tmp_path, self.manifest_path)
+
+    def claim(self, suffix: str = ".png") -> Tuple[int, Path]:
+        with self.lock:
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.capacity
+            previous = self.slots[slot]
+            self.slots[slot] = None
+        if previous:
+            # Slot files are reused in place; only a suffix change leaves a
+            # stale file behind.
+            old = self.buffer_dir / previous.get("file", "")
+            if old.suffix != suffix:
+                old.unlink(missing_ok=True)
+            old.with_name(f"{old.stem}_cam{old.suffix}").unlink(missing_ok=True)
+        return slot, self.buffer_dir / f"slot_{slot:03d}{suffix}"
+
+    def commit(
+        self, slot: int, path: Path, ts: dt.datetime, frame_hash: Optional[int]
+    ) -> None:
+        with self.lock:
+            self.slots[slot] = {
+                "slot": slot,
+                "file": path.name,
+                "ts": ts.isoformat(),
+                "hash": f"{frame_hash:016x}" if frame_hash is not None else None,
+                "verdict": None,
+            }
+            self.save()
+
+    def set_verdict(self, slot: int, ts: dt.datetime, status: str) -> None:
+        with self.lock:
+            entry = self.slots[slot]
+            if entry and entry.get("ts") == ts.isoformat():
+                entry["verdict"] = status
+                self.save()
+
+    def last(self, count: int, until: Optional[dt.datetime] = None) -> list:
+        frames = []
+        with self.lock:
+            for step in range(1, self.capacity + 1):
+                entry = self.slots[(self.next_slot - step) % self.capacity]
+                if not entry:
+                    continue
+                if until is not None and entry["ts"] > until.isoformat():
+                    continue
+                frames.append((self.buffer_dir / entry["file"], entry["ts"]))
+                if len(frames) >= count:
+                    break
+        return list(reversed(frames))
 
 
 def write_json(path: Path, data: dict) -> None:
@@ -203,34 +805,22 @@ def write_json(path: Path, data: dict) -> None:
         json.dump(data, f, ensure_ascii=True, indent=2)
 
 
-def daily_log_path(base_path: Path, now: dt.datetime) -> Path:
-    return log_path_for_day(base_path, now.date())
-
-
-def read_tail_lines(path: Path, max_lines: int) -> list:
-    if not path.exists():
-        return []
-    with path.open("r", encoding="utf-8") as f:
-        lines = f.readlines()
-    return lines[-max_lines:]
-
-
 def snapshot_drift_bundle(
-    bundle_root: Path, frames_dir: Path, summaries_path: Path, now: dt.datetime
+    bundle_root: Path, recent_frames: list, summaries_path: Path, now: dt.datetime
 ) -> Optional[Path]:
     try:
         bundle_dir = bundle_root / now.strftime("%Y-%m-%d_%H-%M")
         frames_out = bundle_dir / "frames"
         ensure_dir(frames_out)
-        recent_frames = sorted(frames_dir.glob("*.png"))[-4:]
-        for frame in recent_frames:
-            shutil.copy2(frame, frames_out / frame.name)
-        excerpt_lines = read_tail_lines(summaries_path, 6)
+        for frame, ts in recent_frames:
+            stamp = dt.datetime.fromisoformat(ts).strftime("%Y-%m-%d_%H-%M-%S")
+            shutil.copy2(frame, frames_out / f"{stamp}{frame.suffix}")
+        excerpt_lines = logio.read_tail_lines(summaries_path, 6)
         if excerpt_lines:
             with (bundle_dir / "activity_excerpt.ndjson").open(
                 "w", encoding="utf-8"
             ) as f:
-                f.writelines(excerpt_lines)
+                f.write("\n".join(excerpt_lines) + "\n")
         return bundle_dir
     except Exception:
         return None
@@ -276,6 +866,563 @@ def append_log(log_path: Path, row: dict) -> None:
         f.write(",".join(v.replace(",", " ") for v in values) + "\n")
 
 
+class SamplingScheduler:
+    def __init__(
+        self,
+        interval: float,
+        policy: str = "adaptive",
+        min_interval: float = 15,
+        max_interval: float = 300,
+        backoff: float = 1.5,
+        stable_cycles: int = 3,
+    ) -> None:
+        self.interval = interval
+        self.policy = policy
+        self.min_interval = min(min_interval, interval)
+        self.max_interval = max(max_interval, interval)
+        self.backoff = backoff
+        self.stable_cycles = stable_cycles
+        self.rows: deque = deque(maxlen=5)
+        self.on_task_streak = 0
+        self.switched = False
+        self.last_app: Optional[Tuple[str, str]] = None
+        self.lock = threading.Lock()
+
+    def seed(self, lines: list) -> None:
+        for line in lines:
+            try:
+                self.observe(json.loads(line))
+            except (json.JSONDecodeError, AttributeError):
+                continue
+
+    def observe(self, row: dict) -> None:
+        with self.lock:
+            self.rows.append(row)
+            if row.get("monitor_status") == "on_task":
+                self.on_task_streak += 1
+            else:
+                self.on_task_streak = 0
+
+    def note_window(self, app_name: str, win_title: str) -> bool:
+        with self.lock:
+            current = (app_name, win_title)
+            changed = self.last_app is not None and current != self.last_app
+            self.last_app = current
+            if changed:
+                self.switched = True
+                self.on_task_streak = 0
+            return changed
+
+    def drift_rising(self) -> bool:
+        recent = list(self.rows)[-3:]
+        if not recent:
+            return False
+        last = recent[-1]
+        if last.get("monitor_status") == "off_task":
+            return True
+        scores = []
+        for row in recent:
+            confidence = row.get("confidence")
+            if not isinstance(confidence, (int, float)):
+                continue
+            if row.get("monitor_status") == "off_task":
+                scores.append(confidence)
+            elif row.get("monitor_status") == "on_task":
+                scores.append(1 - confidence)
+            else:
+                scores.append(0.5)
+        return len(scores) >= 2 and scores[-1] > scores[0] and scores[-1] >= 0.4
+
+    def next_interval(self) -> Tuple[float, str]:
+        if self.policy == "fixed":
+            return self.interval, "fixed"
+        with self.lock:
+            if self.switched:
+                self.switched = False
+                return self.min_interval, "app_switch"
+            if self.drift_rising():
+                return self.min_interval, "drift_rising"
+            excess = self.on_task_streak - self.stable_cycles
+            if excess >= 0:
+                stretched = self.interval * (self.backoff ** (excess + 1))
+                return min(self.max_interval, stretched), "stable"
+            return self.interval, "base"
+
+
+# Rotating psychological nudges
+NUDGES = [
+    "Identity: You are an AI research engineer. Act like it.",
+    "Loss aversion: Future you loses if you drift now.",
+    "Implementation: If distracted, then close tab and reopen editor.",
+    "Timebox: Next 50 minutes on {task}, nothing else.",
+    "Focus: One tab. One file. One thought.",
+    "Compounding: This minute becomes an hour by evening.",
+    "Self-image: This is what focused people do.",
+    "Progress > perfection: Ship small wins.",
+    "Environment: Phone away. Full-screen your tool.",
+    "Breathing: Two deep breaths, then execute.",
+]
+
+
+def put_drop_oldest(q: queue.Queue, item: dict) -> list:
+    dropped = []
+    while True:
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                dropped.append(q.get_nowait())
+            except queue.Empty:
+                pass
+
+
+def drop_job(job: dict, results: queue.Queue, dedup: dict, reason: str) -> None:
+    # A frame that will not be classified still goes to the emitter, which
+    # emits in capture order and would otherwise wait on it.
+    with dedup["lock"]:
+        anchor = dedup.get("anchor")
+        if anchor and anchor["seq"] == job["seq"]:
+            dedup["anchor"] = None
+    try:
+        job["now_file"].unlink()
+    except Exception:
+        pass
+    job["verdict_source"] = "dropped"
+    job["drop_reason"] = reason
+    results.put(job)
+
+
+def capture_frame(args: argparse.Namespace, seq: int, ctx: dict) -> dict:
+    dedup = ctx["dedup"]
+    cache = ctx["cache"]
+    ring = ctx["ring"]
+    now = dt.datetime.now()
+    app_name, win_title, probe_ms = ctx["probe"].probe()
+    ctx["scheduler"].note_window(app_name, win_title)
+    url_domain = browser_url_domain(app_name)
+    if (
+        args.archive_captures
+        and args.archive_keep_days > 0
+        and ctx.get("archive_pruned") != now.date()
+    ):
+        prune_archive(args.root, args.archive_keep_days)
+        ctx["archive_pruned"] = now.date()
+
+    now_payload = {
+        "ts": now.isoformat(),
+        "app": app_name,
+        "title": win_title,
+        "block_id": args.block_id,
+    }
+    write_json(Path("coach/state/now.json"), now_payload)
+
+    job = {
+        "seq": seq,
+        "trace_id": tracing.new_trace_id(),
+        "ts": now,
+        "app": app_name,
+        "title": win_title,
+        "url_domain": url_domain,
+        "probe_ms": probe_ms,
+        "slot": None,
+        "frame": None,
+        "bytes_written": 0,
+        "bytes_uploaded": 0,
+        "now_file": None,
+        "screen_ok": False,
+        "screen_path": None,
+        "cam_path": Path(""),
+        "frame_hash": None,
+        "frame_distance": None,
+        "reuse_of": None,
+        "verdict_source": "none",
+        "monitor_out": None,
+        "error_reason": "",
+    }
+    if cache is not None:
+        # A hit skips the capture and downscale as well as the classifier.
+        cached = cache.lookup(app_name, win_title, url_domain)
+        if cached:
+            job["monitor_out"] = cached
+            job["verdict_source"] = "cache"
+            return job
+
+    slot, buffer_frame = ring.claim(FRAME_SUFFIXES.get(args.frame_format, ".png"))
+    raw_bytes = 0
+    frame_bytes = 0
+    bytes_written = 0
+
+    if args.archive_captures:
+        screen_path, cam_path = new_capture_paths(args.root)
+        screen_ok = screencap(screen_path)
+        raw_path = screen_path
+    else:
+        raw_path = buffer_frame.with_name(f"{buffer_frame.stem}_raw.png")
+        screen_ok = screencap(raw_path)
+        screen_path = raw_path
+        cam_path = Path("")
+
+    if screen_ok:
+        raw_bytes = file_size(raw_path)
+        bytes_written = raw_bytes
+        keep_original = (
+            args.frame_format == "png"
+            and args.frame_max_edge <= 0
+            and not args.frame_grayscale
+        )
+        prepared = None
+        if not keep_original:
+            prepared = prepare_frame(
+                raw_path,
+                buffer_frame,
+                args.frame_max_edge,
+                args.frame_format,
+                args.frame_quality,
+                args.frame_grayscale,
+            )
+        if prepared:
+            buffer_frame = prepared
+            frame_bytes = file_size(prepared)
+            bytes_written += frame_bytes
+        elif args.archive_captures:
+            buffer_frame = buffer_frame.with_suffix(raw_path.suffix)
+            try:
+                shutil.copy2(raw_path, buffer_frame)
+                frame_bytes = raw_bytes
+                bytes_written += frame_bytes
+            except Exception:
+                pass
+        else:
+            buffer_frame = buffer_frame.with_suffix(raw_path.suffix)
+            raw_path.replace(buffer_frame)
+            frame_bytes = raw_bytes
+            screen_path = buffer_frame
+        # The full-resolution capture only survives when archival is on.
+        if not args.archive_captures and raw_path.exists():
+            raw_path.unlink()
+            screen_path = buffer_frame
+    job.update(
+        slot=slot,
+        frame=buffer_frame,
+        bytes_written=bytes_written,
+        screen_ok=screen_ok,
+        screen_path=screen_path,
+        cam_path=cam_path,
+    )
+    if screen_ok and not args.no_dedup:
+        job["frame_hash"] = frame_fingerprint(buffer_frame)
+    if screen_ok:
+        ring.commit(slot, buffer_frame, now, job["frame_hash"])
+
+    if not screen_ok:
+        return job
+
+    if not args.no_dedup:
+        with dedup["lock"]:
+            anchor = dedup.get("anchor")
+            job["frame_distance"] = reusable_verdict(
+                anchor,
+                job["frame_hash"],
+                app_name,
+                win_title,
+                now,
+                args.dedup_threshold,
+                args.dedup_max_age,
+            )
+            if anchor and job["frame_distance"] is not None:
+                job["reuse_of"] = anchor["seq"]
+                job["verdict_source"] = "reused"
+                return job
+            if job["frame_hash"] is not None:
+                dedup["anchor"] = {
+                    "seq": seq,
+                    "ts": now,
+                    "hash": job["frame_hash"],
+                    "app": app_name,
+                    "title": win_title,
+                }
+
+    # Each in-flight frame gets its own now.json so concurrent workers never
+    # read context that belongs to a later capture.
+    now_file = buffer_frame.with_name(f"{buffer_frame.stem}_now.json")
+    write_json(now_file, now_payload)
+    job["now_file"] = now_file
+    job["verdict_source"] = "classifier"
+    job["bytes_uploaded"] = frame_bytes + file_size(now_file)
+    return job
+
+
+def classify_worker(
+    jobs: queue.Queue, results: queue.Queue, timeout: int, client=None
+) -> None:
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        try:
+            message = "Classify focus status for this screen. Return JSON only."
+            files = [job["frame"], job["now_file"]]
+            started = time.time()
+            if client is not None:
+                code, out, err = client.call(message, files=files, timeout=timeout)
+            else:
+                code, out, err = opencode_run(
+                    "coach_monitor", message, files=files, timeout=timeout
+                )
+            job["classify_span"] = (started, time.time())
+            if code != 0:
+                job["error_reason"] = err or f"coach_monitor_exit_{code}"
+            else:
+                job["monitor_out"] = parse_monitor_output(out)
+                if not job["monitor_out"]:
+                    job["error_reason"] = "coach_monitor_non_json"
+        except Exception as exc:
+            job["error_reason"] = f"coach_monitor_failed:{exc}"
+        finally:
+            try:
+                job["now_file"].unlink()
+            except Exception:
+                pass
+            results.put(job)
+
+
+def trace_capture(tracer: tracing.Tracer, job: dict) -> None:
+    trace_id = job["trace_id"]
+    capture_start, capture_end = job["capture_span"]
+    tracer.span(
+        trace_id,
+        "probe",
+        capture_start,
+        capture_start + job["probe_ms"] / 1000.0,
+        seq=job["seq"],
+    )
+    tracer.span(trace_id, "capture", capture_start, capture_end, seq=job["seq"])
+    ready_at = capture_end
+    if job.get("classify_span"):
+        started, ready_at = job["classify_span"]
+        tracer.span(trace_id, "classify_queue", capture_end, started)
+        tracer.span(
+            trace_id, "classify", started, ready_at, error=job["error_reason"] or None
+        )
+    # Time spent waiting for earlier, slower frames to be emitted first.
+    tracer.span(trace_id, "emit_wait", ready_at, verdict_source=job["verdict_source"])
+
+
+def emit_verdict(args: argparse.Namespace, job: dict, state: dict, ctx: dict) -> None:
+    now = job["ts"]
+    tracer = ctx["tracer"]
+    if job.get("capture_span"):
+        trace_capture(tracer, job)
+    app_name = job["app"]
+    win_title = job["title"]
+    screen_ok = job["screen_ok"]
+    monitor_out = job["monitor_out"]
+    error_reason = job["error_reason"]
+    frame_hash = job["frame_hash"]
+    logs = ctx["logs"]
+    buffer_frame = job["frame"]
+    # Cache hits skip the capture, so there is no frame to pair a webcam shot with.
+    captured = buffer_frame is not None
+
+    status = "unsure"
+    confidence = None
+    reason = ""
+    short_caption = None
+    if monitor_out:
+        status = str(monitor_out.get("status", "unsure"))
+        confidence = monitor_out.get("confidence")
+        reason = str(monitor_out.get("reason", ""))
+        short_caption = monitor_out.get("short_caption")
+    elif error_reason:
+        reason = f"analysis_error:{error_reason}"
+
+    is_off_task = (
+        status == "off_task"
+        and isinstance(confidence, (int, float))
+        and confidence >= 0.70
+    )
+    summary_row = {
+        "ts": now.isoformat(),
+        "app": app_name,
+        "title": win_title,
+        "url_domain": job["url_domain"],
+        "monitor_status": status,
+        "confidence": confidence,
+        "short_caption": short_caption if is_off_task else None,
+        "verdict_source": job["verdict_source"],
+    }
+    logs["summaries"].write(summary_row)
+    ctx["scheduler"].observe(summary_row)
+    if screen_ok:
+        ctx["ring"].set_verdict(job["slot"], now, status)
+    logs["activity"].write(
+        {
+            "ts": now.isoformat(),
+            "block_id": args.block_id,
+            "app": app_name,
+            "title": win_title,
+            "url_domain": job["url_domain"],
+            "status": status,
+            "confidence": confidence,
+            "reason": reason,
+            "short_caption": short_caption if is_off_task else None,
+            "verdict_source": job["verdict_source"],
+            "drop_reason": job.get("drop_reason"),
+            "frame_hash": f"{frame_hash:016x}" if frame_hash is not None else None,
+            "frame_distance": job["frame_distance"],
+            "probe_ms": job["probe_ms"],
+            "bytes_written": job["bytes_written"],
+            "bytes_uploaded": job["bytes_uploaded"],
+            "sample_interval": job.get("sample_interval"),
+            "sample_reason": job.get("sample_reason"),
+            "trace_id": job["trace_id"],
+        },
+        now=now,
+    )
+
+    if not is_off_task:
+        return
+
+    cam_ok = False
+    if captured and not args.no_camera:
+        cam_ok = webcam_snap(
+            buffer_frame.with_name(f"{buffer_frame.stem}_cam{buffer_frame.suffix}")
+        )
+
+    with tracer.measure(job["trace_id"], "event_write") as span:
+        if ctx["db"] is not None:
+            previous = ctx["db"].last_row("events", now.date())
+        else:
+            previous = logio.read_last_row(logs["events"].path_for(now))
+        event_type = "DRIFT_START"
+        if previous and previous.get("type") == "DRIFT_START":
+            event_type = "DRIFT_PERSIST"
+        span["event_type"] = event_type
+        logs["events"].write(
+            {
+                "ts": now.isoformat(),
+                "type": event_type,
+                "event_id": str(uuid.uuid4()),
+                "block_id": args.block_id,
+                "app": app_name,
+                "url_domain": job["url_domain"],
+                "confidence": confidence,
+                "reason": reason,
+                "source": "monitor",
+                "trace_id": job["trace_id"],
+            },
+            now=now,
+        )
+        # The runner reacts to events; land this cycle's rows before the nudge.
+        commit_logs(logs)
+
+    if args.emit_drift_bundle:
+        snapshot_drift_bundle(
+            args.bundle_root, ctx["ring"].last(4, until=now), args.summaries, now
+        )
+
+    # Build feedback
+    note_parts = []
+    nudge = random.choice(NUDGES).format(task=args.task)
+    if not args.no_say:
+        if args.tts:
+            voice.speak(nudge, intensity="calm")
+        else:
+            say(nudge, voice=args.voice)
+    if not args.no_notify:
+        notify("Focus", nudge)
+
+    if args.sound:
+        play_sound(args.sound)
+
+    if captured and not screen_ok:
+        note_parts.append("Screen capture failed (grant permission)")
+    if captured and not cam_ok and not args.no_camera:
+        note_parts.append(
+            "Webcam capture unavailable (install imagesnap + grant camera)"
+        )
+
+    if captured and args.archive_captures:
+        append_log(
+            args.log,
+            {
+                "time": timestamp(),
+                "screen_path": str(job["screen_path"] if screen_ok else ""),
+                "webcam_path": str(job["cam_path"] if cam_ok else ""),
+                "note": "; ".join(note_parts),
+            },
+        )
+
+    # Hourly break reminder (simple heuristic)
+    if args.hourly_break_mins > 0 and now.hour != state["last_hour"]:
+        state["last_hour"] = now.hour
+        if not args.no_say:
+            say(
+                "Good work. Take a short break: hydrate and stretch.",
+                voice=args.voice,
+            )
+        if not args.no_notify:
+            notify("Break", "Hydrate, stretch, 5-minute reset.")
+
+
+def commit_logs(logs: dict) -> None:
+    for writer in logs.values():
+        try:
+            writer.commit()
+        except OSError as exc:
+            print(f"monitor: failed to write {writer.base_path}: {exc}")
+
+
+def emit_worker(args: argparse.Namespace, results: queue.Queue, ctx: dict) -> None:
+    # Verdicts finish out of order on the worker pool; hold them until every
+    # earlier capture has been emitted so logs and events stay in ts order.
+    pending: Dict[int, dict] = {}
+    verdicts: Dict[int, Optional[dict]] = {}
+    next_seq = 1
+    state = {"last_hour": dt.datetime.now().hour}
+    dedup = ctx["dedup"]
+    cache = ctx["cache"]
+    while True:
+        job = results.get()
+        if job is None:
+            return
+        pending[job["seq"]] = job
+        while next_seq in pending:
+            job = pending.pop(next_seq)
+            next_seq += 1
+            if job["verdict_source"] == "classifier":
+                if cache is not None and job["monitor_out"]:
+                    cache.admit(
+                        job["app"], job["title"], job["url_domain"], job["monitor_out"]
+                    )
+                verdicts[job["seq"]] = job["monitor_out"]
+                verdicts.pop(job["seq"] - 64, None)
+                if not job["monitor_out"]:
+                    with dedup["lock"]:
+                        anchor = dedup.get("anchor")
+                        if anchor and anchor["seq"] == job["seq"]:
+                            dedup["anchor"] = None
+            elif job["verdict_source"] == "reused":
+                job["monitor_out"] = verdicts.get(job["reuse_of"])
+                if not job["monitor_out"]:
+                    # The frame it duplicates failed classification; log it as
+                    # an unsure reused row rather than dropping it silently.
+                    job["drop_reason"] = "anchor verdict unavailable"
+            if job["verdict_source"] == "dropped":
+                stamp = job["ts"].isoformat()
+                reason = job["drop_reason"]
+                print(f"monitor: dropped frame {stamp} ({reason})")
+                continue
+            try:
+                emit_verdict(args, job, state, ctx)
+            except Exception as exc:
+                print(f"monitor: failed to emit verdict: {exc}")
+            commit_logs(ctx["logs"])
+        if cache is not None:
+            cache.save(min_interval=30)
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Lightweight macOS productivity coach")
     parser.add_argument(
@@ -311,6 +1458,22 @@ def main() -> int:
         "--no-camera", action="store_true", help="Disable webcam snapshots"
     )
     parser.add_argument("--no-say", action="store_true", help="Disable spoken prompts")
+    parser.add_argument(
+        "--tts",
+        action="store_true",
+        help="Speak nudges with the cached edge-tts voice instead of macOS say",
+    )
+    parser.add_argument(
+        "--audio-sink",
+        choices=["auto", "ffplay", "mpg123", "afplay", "paplay", "aplay", "null"],
+        default="auto",
+        help="Player for --tts audio (auto: first installed, streaming players first)",
+    )
+    parser.add_argument(
+        "--no-stream-audio",
+        action="store_true",
+        help="Play --tts audio only once the whole clip is synthesized",
+    )
     parser.add_argument(
         "--no-notify", action="store_true", help="Disable notifications"
     )
@@ -339,7 +1502,30 @@ def main() -> int:
         "--buffer-keep",
         type=int,
         default=30,
-        help="Frames to keep in buffer (default 30 ≈ 15min at 30s)",
+        help="Ring buffer slots (default 30 ≈ 15min at 30s)",
+    )
+    parser.add_argument(
+        "--frame-max-edge",
+        type=int,
+        default=1280,
+        help="Longest edge in pixels of the classifier frame (0=full resolution)",
+    )
+    parser.add_argument(
+        "--frame-format",
+        choices=["jpeg", "webp", "png"],
+        default="jpeg",
+        help="Encoding of the classifier frame",
+    )
+    parser.add_argument(
+        "--frame-quality",
+        type=int,
+        default=70,
+        help="JPEG/WebP quality for the classifier frame",
+    )
+    parser.add_argument(
+        "--frame-grayscale",
+        action="store_true",
+        help="Convert classifier frames to grayscale",
     )
     parser.add_argument(
         "--summaries",
@@ -388,6 +1574,167 @@ def main() -> int:
         default=7,
         help="Days of log retention for daily ndjson logs",
     )
+    parser.add_argument(
+        "--trace-log",
+        type=Path,
+        default=tracing.TRACE_LOG,
+        help="Base path of the daily latency trace log",
+    )
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="Do not record latency trace spans",
+    )
+    parser.add_argument(
+        "--log-flush",
+        choices=list(logio.FLUSH_POLICIES),
+        default="interval",
+        help="When buffered log rows are written: every row, at each verdict "
+        "(or after --log-flush-interval), or only on exit (the shared event "
+        "and activity logs are still written at each commit). Defaults to "
+        "interval since a verdict writes its rows together",
+    )
+    parser.add_argument(
+        "--log-flush-interval",
+        type=float,
+        default=1.0,
+        help="Max seconds rows stay buffered under --log-flush interval",
+    )
+    parser.add_argument(
+        "--log-fsync",
+        action="store_true",
+        help="fsync log files after every flush",
+    )
+    parser.add_argument(
+        "--log-db",
+        type=Path,
+        default=None,
+        help="Also write activity/events/trace rows to this SQLite log store "
+        "(e.g. coach/logs/coach.db); give the runner the same path",
+    )
+    parser.add_argument(
+        "--log-db-only",
+        action="store_true",
+        help="With --log-db, write those rows to the store only, not NDJSON",
+    )
+    parser.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="Classify every frame even when the screen has not changed",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=int,
+        default=4,
+        help="Max frame hash bit distance (of 64) to reuse the previous verdict",
+    )
+    parser.add_argument(
+        "--dedup-max-age",
+        type=int,
+        default=300,
+        help="Seconds before a reused verdict forces reclassification (0=no limit)",
+    )
+    parser.add_argument(
+        "--classify-workers",
+        type=int,
+        default=1,
+        help="Concurrent coach_monitor calls",
+    )
+    parser.add_argument(
+        "--classify-queue",
+        type=int,
+        default=1,
+        help="Frames waiting for a classifier before the oldest is dropped",
+    )
+    parser.add_argument(
+        "--worker-pool",
+        type=int,
+        default=0,
+        help="Persistent coach_monitor workers to keep warm (0=spawn per call)",
+    )
+    parser.add_argument(
+        "--worker-backend",
+        choices=["opencode", "stub"],
+        default="opencode",
+        help="Backend for persistent workers (stub answers offline)",
+    )
+    parser.add_argument(
+        "--worker-socket",
+        type=Path,
+        default=None,
+        help="Send classifier requests to a worker.py listening on this Unix socket",
+    )
+    parser.add_argument(
+        "--window-probe",
+        choices=["auto", "macos", "x11", "fake", "none"],
+        default="auto",
+        help="Active window probe backend",
+    )
+    parser.add_argument(
+        "--sampling-policy",
+        choices=["adaptive", "fixed"],
+        default="adaptive",
+        help="fixed=every --interval; adaptive=tighten on drift, back off when stable",
+    )
+    parser.add_argument(
+        "--min-interval",
+        type=int,
+        default=15,
+        help="Shortest adaptive capture interval in seconds",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=int,
+        default=300,
+        help="Longest adaptive capture interval in seconds",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=1.5,
+        help="Interval multiplier per on-task cycle once stable",
+    )
+    parser.add_argument(
+        "--stable-cycles",
+        type=int,
+        default=3,
+        help="Consecutive on-task verdicts before the interval backs off",
+    )
+    parser.add_argument(
+        "--switch-poll",
+        type=float,
+        default=5,
+        help="Seconds between app-switch probes while waiting (0=off)",
+    )
+    parser.add_argument(
+        "--no-verdict-cache",
+        action="store_true",
+        help="Disable the app/title verdict cache",
+    )
+    parser.add_argument(
+        "--verdict-cache",
+        type=Path,
+        default=Path("coach/state/verdict_cache.json"),
+        help="Verdict cache path (hit/miss counters go to *_stats.json)",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=900,
+        help="Seconds a verdict stays cached at confidence 1.0 (scaled by confidence)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help="Max cached app/title verdicts before LRU eviction",
+    )
+    parser.add_argument(
+        "--cache-min-confidence",
+        type=float,
+        default=0.8,
+        help="Minimum classifier confidence for a verdict to be cached",
+    )
     args = parser.parse_args()
 
     if not is_macos():
@@ -395,211 +1742,171 @@ def main() -> int:
 
     if args.archive_captures:
         ensure_dir(args.root)
-    last_hour = dt.datetime.now().hour
-    cycle = 0
 
     print("Coach running. Press Ctrl+C to stop.")
 
     prune_logs(args.activity_log.parent, args.activity_log.stem, args.log_keep_days)
     prune_logs(args.events_log.parent, args.events_log.stem, args.log_keep_days)
 
-    # Rotating psychological nudges
-    nudges = [
-        "Identity: You are an AI research engineer. Act like it.",
-        "Loss aversion: Future you loses if you drift now.",
-        "Implementation: If distracted, then close tab and reopen editor.",
-        "Timebox: Next 50 minutes on {task}, nothing else.",
-        "Focus: One tab. One file. One thought.",
-        "Compounding: This minute becomes an hour by evening.",
-        "Self-image: This is what focused people do.",
-        "Progress > perfection: Ship small wins.",
-        "Environment: Phone away. Full-screen your tool.",
-        "Breathing: Two deep breaths, then execute.",
-    ]
-    while True:
-        start = time.time()
-        cycle += 1
-
-        now = dt.datetime.now()
-        activity_log = daily_log_path(args.activity_log, now)
-        events_log = daily_log_path(args.events_log, now)
-        app_name, win_title = frontmost_app_info()
-        buffer_frame = frame_path(args.buffer_dir, now)
-
-        if args.archive_captures:
-            screen_path, cam_path = new_capture_paths(args.root)
-            screen_ok = screencap(screen_path)
-            cam_ok = False
-            if not args.no_camera:
-                cam_ok = webcam_snap(cam_path)
-            if screen_ok:
-                try:
-                    shutil.copy2(screen_path, buffer_frame)
-                except Exception:
-                    pass
-            if args.archive_keep_days > 0:
-                prune_archive(args.root, args.archive_keep_days)
-        else:
-            screen_ok = screencap(buffer_frame)
-            cam_ok = False
-            screen_path = buffer_frame
-            cam_path = Path("")
-
-        cam_buffer_path = buffer_frame.with_name(
-            f"{buffer_frame.stem}_cam{buffer_frame.suffix}"
+    client = None
+    if args.worker_pool > 0 or args.worker_socket:
+        client = worker.make_client(
+            "coach_monitor",
+            max(args.worker_pool, args.classify_workers),
+            backend=args.worker_backend,
+            socket_path=args.worker_socket,
         )
 
-        trim_dir(args.buffer_dir, args.buffer_keep)
+    probe = make_window_probe(args.window_probe)
+    print(f"monitor: window probe {probe.name}")
 
-        now_payload = {
-            "ts": now.isoformat(),
-            "app": app_name,
-            "title": win_title,
-            "block_id": args.block_id,
-        }
-        write_json(Path("coach/state/now.json"), now_payload)
-
-        monitor_out = None
-        error_reason = ""
-        if screen_ok:
-            code, out, err = opencode_run(
-                "coach_monitor",
-                "Classify focus status for this screen. Return JSON only.",
-                files=[buffer_frame, Path("coach/state/now.json")],
-                timeout=args.analysis_timeout,
-            )
-            if code != 0:
-                error_reason = err or f"coach_monitor_exit_{code}"
-            if code == 0:
-                monitor_out = parse_monitor_output(out)
-                if not monitor_out:
-                    error_reason = "coach_monitor_non_json"
-
-        status = "unsure"
-        confidence = None
-        reason = ""
-        short_caption = None
-        if monitor_out:
-            status = str(monitor_out.get("status", "unsure"))
-            confidence = monitor_out.get("confidence")
-            reason = str(monitor_out.get("reason", ""))
-            short_caption = monitor_out.get("short_caption")
-        elif error_reason:
-            reason = f"analysis_error:{error_reason}"
-
-        is_off_task = (
-            status == "off_task"
-            and isinstance(confidence, (int, float))
-            and confidence >= 0.70
-        )
-        summary_row = {
-            "ts": now.isoformat(),
-            "app": app_name,
-            "title": win_title,
-            "url_domain": None,
-            "monitor_status": status,
-            "confidence": confidence,
-            "short_caption": short_caption if is_off_task else None,
-        }
-        write_ndjson(args.summaries, summary_row)
-        write_ndjson(
-            activity_log,
-            {
-                "ts": now.isoformat(),
-                "block_id": args.block_id,
-                "app": app_name,
-                "title": win_title,
-                "url_domain": None,
-                "status": status,
-                "confidence": confidence,
-                "reason": reason,
-                "short_caption": short_caption if is_off_task else None,
-            },
+    scheduler = SamplingScheduler(
+        args.interval,
+        policy=args.sampling_policy,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        backoff=args.backoff,
+        stable_cycles=args.stable_cycles,
+    )
+    scheduler.seed(logio.read_tail_lines(args.summaries, 5))
+
+    cache = None
+    if not args.no_verdict_cache:
+        cache = VerdictCache(
+            args.verdict_cache,
+            capacity=args.cache_size,
+            ttl=args.cache_ttl,
+            min_confidence=args.cache_min_confidence,
         )
 
-        cam_ok = False
-        if is_off_task and not args.no_camera:
-            cam_ok = webcam_snap(cam_buffer_path)
-
-        if is_off_task:
-            last_event = read_tail_lines(events_log, 1)
-            event_type = "DRIFT_START"
-            if last_event:
-                try:
-                    previous = json.loads(last_event[0])
-                    if previous.get("type") == "DRIFT_START":
-                        event_type = "DRIFT_PERSIST"
-                except json.JSONDecodeError:
-                    pass
-            write_ndjson(
-                events_log,
-                {
-                    "ts": now.isoformat(),
-                    "type": event_type,
-                    "event_id": str(uuid.uuid4()),
-                    "block_id": args.block_id,
-                    "app": app_name,
-                    "url_domain": None,
-                    "confidence": confidence,
-                    "reason": reason,
-                    "source": "monitor",
-                },
-            )
-
-            if args.emit_drift_bundle:
-                snapshot_drift_bundle(
-                    args.bundle_root, args.buffer_dir, args.summaries, now
-                )
-
-            # Build feedback
-            note_parts = []
-            nudge = random.choice(nudges).format(task=args.task)
-            if not args.no_say:
-                say(nudge, voice=args.voice)
-            if not args.no_notify:
-                notify("Focus", nudge)
-
-            if args.sound and is_off_task:
-                play_sound(args.sound)
-
-            if not screen_ok:
-                note_parts.append("Screen capture failed (grant permission)")
-            if not cam_ok and not args.no_camera:
-                note_parts.append(
-                    "Webcam capture unavailable (install imagesnap + grant camera)"
-                )
-
-            if args.archive_captures:
-                append_log(
-                    args.log,
-                    {
-                        "time": timestamp(),
-                        "screen_path": str(screen_path if screen_ok else ""),
-                        "webcam_path": str(cam_path if cam_ok else ""),
-                        "note": "; ".join(note_parts),
-                    },
-                )
-
-            # Hourly break reminder (simple heuristic)
-            if args.hourly_break_mins > 0 and now.hour != last_hour:
-                last_hour = now.hour
-                if not args.no_say:
-                    say(
-                        "Good work. Take a short break: hydrate and stretch.",
-                        voice=args.voice,
-                    )
-                if not args.no_notify:
-                    notify("Break", "Hydrate, stretch, 5-minute reset.")
+    workers = max(1, args.classify_workers)
+    jobs: queue.Queue = queue.Queue(maxsize=max(1, args.classify_queue))
+    results: queue.Queue = queue.Queue(maxsize=64)
+    dedup: dict = {"lock": threading.Lock(), "anchor": None}
+    db = logdb.open_store(args.log_db)
+    log_opts = {
+        "policy": args.log_flush,
+        "flush_interval": args.log_flush_interval,
+        "fsync": args.log_fsync,
+        "db": db,
+        "files": not args.log_db_only,
+    }
+    ctx = {
+        "db": db,
+        "dedup": dedup,
+        "cache": cache,
+        "probe": probe,
+        "scheduler": scheduler,
+        "ring": FrameRing(args.buffer_dir, args.buffer_keep),
+        "archive_pruned": None,
+        "logs": {
+            "summaries": logio.NdjsonWriter(args.summaries, daily=False, **log_opts),
+            # The runner tails these, so they are written at every verdict.
+            "activity": logio.NdjsonWriter(
+                args.activity_log, tailed=True, **log_opts
+            ),
+            "events": logio.NdjsonWriter(args.events_log, tailed=True, **log_opts),
+        },
+    }
+    trace_writer = None
+    if not args.no_trace:
+        trace_writer = logio.NdjsonWriter(args.trace_log, **log_opts)
+        ctx["logs"]["trace"] = trace_writer
+    ctx["tracer"] = tracing.Tracer(trace_writer, "monitor")
+    if args.tts and not args.no_say:
+        voice.start_worker(sink=args.audio_sink, stream=not args.no_stream_audio)
+        # Every nudge is a fixed phrase; synthesize them once, off the hot path.
+        voice.prewarm_async(
+            [nudge.format(task=args.task) for nudge in NUDGES], intensity="calm"
+        )
+    classify_threads = [
+        threading.Thread(
+            target=classify_worker,
+            args=(jobs, results, args.analysis_timeout, client),
+            daemon=True,
+        )
+        for _ in range(workers)
+    ]
+    emitter = threading.Thread(
+        target=emit_worker,
+        args=(args, results, ctx),
+        daemon=True,
+    )
+    for thread in classify_threads:
+        thread.start()
+    emitter.start()
 
-        # Sleep remaining time in interval
-        elapsed = time.time() - start
-        to_sleep = max(0, args.interval - elapsed)
+    seq = 0
+    next_capture = time.monotonic()
+    while True:
         try:
-            time.sleep(to_sleep)
+            seq += 1
+            captured_at = time.monotonic()
+            capture_start = time.time()
+            job = capture_frame(args, seq, ctx)
+            job["capture_span"] = (capture_start, time.time())
+            interval, reason = scheduler.next_interval()
+            job["sample_interval"] = round(interval, 1)
+            job["sample_reason"] = reason
+            if job["verdict_source"] == "classifier":
+                for dropped in put_drop_oldest(jobs, job):
+                    drop_job(dropped, results, dedup, "classifier busy")
+            else:
+                results.put(job)
+
+            # Schedule against the capture clock, not the classifier, so a slow
+            # analysis call never stretches the sampling cadence.
+            if args.sampling_policy == "fixed":
+                next_capture += interval
+            else:
+                next_capture = captured_at + interval
+            earliest = captured_at + scheduler.min_interval
+            while True:
+                current = time.monotonic()
+                if next_capture <= current:
+                    next_capture = current
+                    break
+                wait = next_capture - current
+                polling = args.sampling_policy == "adaptive" and args.switch_poll > 0
+                if polling:
+                    wait = min(wait, args.switch_poll)
+                time.sleep(wait)
+                if polling and time.monotonic() < next_capture:
+                    app_name, win_title, _ = probe.probe()
+                    if scheduler.note_window(app_name, win_title):
+                        next_capture = max(earliest, time.monotonic())
         except KeyboardInterrupt:
             print("\nStopping coach.")
             break
 
+    try:
+        # Unstarted frames are dropped so every worker's stop sentinel fits.
+        while True:
+            try:
+                dropped = jobs.get_nowait()
+            except queue.Empty:
+                break
+            drop_job(dropped, results, dedup, "shutdown")
+        for _ in classify_threads:
+            jobs.put(None)
+        for thread in classify_threads:
+            thread.join(timeout=args.analysis_timeout + 1)
+        results.put(None)
+        emitter.join(timeout=5)
+    except KeyboardInterrupt:
+        pass
+    if client is not None:
+        client.close()
+    if args.tts:
+        voice.close()
+    if cache is not None:
+        cache.save()
+    for writer in ctx["logs"].values():
+        writer.close()
+    if db is not None:
+        db.close()
+    probe.close()
+
     return 0
 
 
@@ -1,6 +1,7 @@
 const { app, BrowserWindow, globalShortcut, ipcMain, Tray, Menu, screen, nativeImage } = require("electron");
 const path = require("path");
 const fs = require("fs");
+const { isRefinementOf } = require("./overlay-utils");
 
 const LOG_DIR = path.join(__dirname, "..", "logs");
 const OVERLAY_BASE = path.join(LOG_DIR, "overlay_cmd.ndjson");
@@ -115,6 +116,28 @@ function showOverlay(payload) {
   });
 }
 
+function refineOverlay(payload) {
+  if (!overlayWindow) return;
+  if (!isRefinementOf(payload, currentPayload)) {
+    // The instant overlay was never read (both commands landed between polls).
+    if (payload.cmd_id !== lastCmdId) showOverlay(payload);
+    return;
+  }
+  // Hidden means the user already answered the instant overlay.
+  if (!overlayWindow.isVisible()) return;
+  currentPayload = payload;
+  overlayWindow.webContents.send("overlay:show", payload);
+  appendAction({
+    ts: new Date().toISOString(),
+    type: "OVERLAY_REFINED",
+    cmd_id: lastCmdId,
+    source_event_id: payload.source_event_id || null,
+    level: payload.level || "B",
+    action: "refined",
+    source: "overlay"
+  });
+}
+
 function hideOverlay() {
   if (!overlayWindow) return;
   overlayWindow.hide();
@@ -179,7 +202,11 @@ function watchOverlayCommands() {
         for (const line of lines) {
           try {
             const payload = JSON.parse(line);
-            showOverlay(payload);
+            if (payload.phase === "refine") {
+              refineOverlay(payload);
+            } else {
+              showOverlay(payload);
+            }
           } catch (err) {
             // ignore malformed lines
           }
@@ -40,7 +40,16 @@
     return isTextInputTarget(t) || isInteractiveTarget(t);
   }
 
+  // A refine payload upgrades the overlay already on screen (same cmd_id) instead of
+  // showing a new one, so its shown time and action lineage carry over.
+  function isRefinementOf(payload, current) {
+    if (!payload || !current) return false;
+    if (payload.phase !== "refine" || !payload.cmd_id) return false;
+    return payload.cmd_id === current.cmd_id;
+  }
+
   return {
+    isRefinementOf,
     isTextInputTarget,
     isInteractiveTarget,
     shouldIgnoreGlobalEnter
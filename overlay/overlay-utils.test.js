@@ -1,7 +1,12 @@
 const test = require("node:test");
 const assert = require("node:assert/strict");
 
-const { isTextInputTarget, isInteractiveTarget, shouldIgnoreGlobalEnter } = require("./overlay-utils");
+const {
+  isRefinementOf,
+  isTextInputTarget,
+  isInteractiveTarget,
+  shouldIgnoreGlobalEnter
+} = require("./overlay-utils");
 
 test("isTextInputTarget: recognizes common typing targets", () => {
   assert.equal(isTextInputTarget({ tagName: "INPUT" }), true);
@@ -46,3 +51,15 @@ test("shouldIgnoreGlobalEnter: child of button/link should still block global En
   };
   assert.equal(shouldIgnoreGlobalEnter(spanInsideButton), true);
 });
+
+test("isRefinementOf: refine payload for the overlay on screen", () => {
+  const current = { cmd_id: "c1", phase: "instant" };
+  assert.equal(isRefinementOf({ cmd_id: "c1", phase: "refine" }, current), true);
+});
+
+test("isRefinementOf: other commands are shown as new overlays", () => {
+  const current = { cmd_id: "c1" };
+  assert.equal(isRefinementOf({ cmd_id: "c2", phase: "refine" }, current), false);
+  assert.equal(isRefinementOf({ cmd_id: "c1" }, current), false);
+  assert.equal(isRefinementOf({ cmd_id: "c1", phase: "refine" }, null), false);
+});
@@ -63,9 +63,13 @@ function resetAlignInput() {
 }
 
 function showOverlay(payload) {
+  // Refinements update the text in place; keep the snooze state and shown time.
+  const refine = window.overlayUtils?.isRefinementOf?.(payload, currentPayload);
   overlay.classList.remove("hidden");
-  resetSnooze();
-  resetAlignInput();
+  if (!refine) {
+    resetSnooze();
+    resetAlignInput();
+  }
   updateEventLabel(payload);
   updatePrimaryLabel(payload);
 
@@ -106,7 +110,9 @@ function showOverlay(payload) {
 
   overlay.dataset.level = payload.level || "B";
   currentPayload = payload;
-  shownAt = Date.now();
+  if (!refine) {
+    shownAt = Date.now();
+  }
 }
 
 function sendAction(action) {
@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 import argparse
+import bisect
+import copy
 import datetime as dt
+import heapq
 import json
 import os
+import queue
+import re
 import subprocess
+import threading
 import time
 import uuid
-from collections import deque
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
 try:
     from coach import voice
@@ -21,6 +28,17 @@ except ImportError:
     except ImportError:
         voice = None
 
+try:
+    from coach import logdb, logio, tracing, worker
+except ImportError:
+    import logdb
+    import logio
+    import tracing
+    import worker
+
+# The monitor writes a drift event once off-task confidence reaches this.
+DRIFT_EVENT_CONFIDENCE = 0.70
+
 EVENT_TYPES = {
     "DRIFT_START",
     "DRIFT_PERSIST",
@@ -74,11 +92,23 @@ ALIGN_QUESTIONS = [
 ]
 
 
-def run(cmd: list) -> Tuple[int, str, str]:
-    proc = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
-    )
-    out, err = proc.communicate()
+def run(
+    cmd: list, timeout: Optional[float] = None, on_start=None
+) -> Tuple[int, str, str]:
+    try:
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+        )
+    except OSError as exc:
+        return 127, "", str(exc)
+    if on_start is not None:
+        on_start(proc)
+    try:
+        out, err = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        return 124, "", "timeout"
     return proc.returncode, out.strip(), err.strip()
 
 
@@ -95,8 +125,58 @@ def read_json(path: Path) -> Optional[dict]:
         return None
 
 
-def read_alignment(path: Path) -> dict:
-    data = read_json(path) or {"step": 0, "answers": {}}
+class StateStore:
+    # coach/state records held in memory. set() only marks a key dirty when the
+    # value changed, flush() persists dirty keys atomically, and files are
+    # re-read only when reload() is told another process touched them.
+    def __init__(self, paths: Dict[str, Path]) -> None:
+        self.paths = paths
+        self.records: Dict[str, Optional[dict]] = {}
+        self.signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self.dirty: set = set()
+        for key in paths:
+            self.load(key)
+
+    def load(self, key: str) -> None:
+        path = self.paths[key]
+        self.signatures[key] = logio.file_signature(path)
+        self.records[key] = read_json(path)
+
+    def get(self, key: str) -> Optional[dict]:
+        return copy.deepcopy(self.records.get(key))
+
+    def set(self, key: str, data: Optional[dict]) -> None:
+        if self.records.get(key) == data and key in self.records:
+            return
+        self.records[key] = copy.deepcopy(data)
+        self.dirty.add(key)
+
+    def delete(self, key: str) -> None:
+        self.set(key, None)
+
+    def flush(self) -> None:
+        for key in sorted(self.dirty):
+            path = self.paths[key]
+            data = self.records.get(key)
+            if data is None:
+                path.unlink(missing_ok=True)
+            else:
+                write_json(path, data)
+            self.signatures[key] = logio.file_signature(path)
+        self.dirty.clear()
+
+    def reload(self, changed: Iterable[Path]) -> None:
+        # Our own flushes match the recorded signature and are ignored.
+        changed = {os.path.abspath(path) for path in changed}
+        for key, path in self.paths.items():
+            if key in self.dirty or os.path.abspath(path) not in changed:
+                continue
+            if logio.file_signature(path) != self.signatures.get(key):
+                self.load(key)
+
+
+def read_alignment(store: StateStore) -> dict:
+    data = store.get("align_state") or {"step": 0, "answers": {}}
     if "step" not in data:
         data["step"] = 0
     if "answers" not in data:
@@ -104,8 +184,8 @@ def read_alignment(path: Path) -> dict:
     return data
 
 
-def read_off_schedule_state(path: Path) -> dict:
-    return read_json(path) or {
+def read_off_schedule_state(store: StateStore) -> dict:
+    return store.get("off_schedule_state") or {
         "block_id": None,
         "since": None,
         "last_emitted": None,
@@ -113,8 +193,8 @@ def read_off_schedule_state(path: Path) -> dict:
     }
 
 
-def read_habit_state(path: Path) -> dict:
-    return read_json(path) or {
+def read_habit_state(store: StateStore) -> dict:
+    return store.get("last_habit") or {
         "block_id": None,
         "due_at": None,
         "escalated": False,
@@ -122,12 +202,16 @@ def read_habit_state(path: Path) -> dict:
     }
 
 
-def read_align_prompted(path: Path) -> dict:
-    return read_json(path) or {"question_id": None, "prompted_at": None}
+def read_align_prompted(store: StateStore) -> dict:
+    return store.get("align_prompted") or {"question_id": None, "prompted_at": None}
 
 
-def read_current_block_state(path: Path) -> dict:
-    return read_json(path) or {"block_id": None, "block_type": None, "block_name": None}
+def read_current_block_state(store: StateStore) -> dict:
+    return store.get("current_block") or {
+        "block_id": None,
+        "block_type": None,
+        "block_name": None,
+    }
 
 
 def block_overlay_payload(
@@ -149,11 +233,6 @@ def block_overlay_payload(
     }
 
 
-def log_path_for_day(path: Path, day: dt.date) -> Path:
-    stamp = day.isoformat()
-    return path.with_name(f"{path.stem}_{stamp}{path.suffix}")
-
-
 def prune_logs(log_dir: Path, stem: str, keep_days: int) -> None:
     if keep_days <= 0:
         return
@@ -172,7 +251,7 @@ def prune_logs(log_dir: Path, stem: str, keep_days: int) -> None:
 
 
 def daily_log_path(base_path: Path, now: dt.datetime) -> Path:
-    return log_path_for_day(base_path, now.date())
+    return logio.log_path_for_day(base_path, now.date())
 
 
 def minutes_between(start: dt.datetime, end: dt.datetime) -> int:
@@ -194,17 +273,6 @@ def parse_minutes(value: str, fallback: int) -> int:
         return fallback
 
 
-def remaining_blocks(schedule: dict, now: dt.datetime) -> list:
-    remaining = []
-    for block in schedule.get("blocks", []):
-        end = parse_time(block.get("end", ""), now.date())
-        if not end:
-            continue
-        if end > now:
-            remaining.append(block)
-    return remaining
-
-
 def schedule_to_yaml(schedule: dict) -> str:
     lines = [
         f"timezone: {schedule.get('timezone', 'America/Los_Angeles')}",
@@ -430,13 +498,6 @@ def write_schedule(path: Path, schedule: dict) -> None:
     path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
 
-def is_today(schedule: dict) -> bool:
-    try:
-        return schedule.get("day") == dt.date.today().isoformat()
-    except Exception:
-        return False
-
-
 def parse_time(value: str, day: dt.date) -> Optional[dt.datetime]:
     try:
         hour, minute = [int(part) for part in value.split(":")]
@@ -445,50 +506,273 @@ def parse_time(value: str, day: dt.date) -> Optional[dt.datetime]:
         return None
 
 
-def current_block(schedule: dict, now: dt.datetime) -> Optional[dict]:
-    blocks = schedule.get("blocks", [])
-    for block in blocks:
-        start = parse_time(block.get("start", ""), now.date())
-        end = parse_time(block.get("end", ""), now.date())
-        if not start or not end:
-            continue
-        if start <= now < end:
-            return block
-    return None
+class Schedule:
+    # A parsed schedule compiled for one day: block intervals sorted by start
+    # (ties keep file order) plus every start/end boundary, so lookups bisect
+    # instead of re-parsing each block's times.
+    def __init__(self, data: dict, day: dt.date) -> None:
+        self.data = data
+        self.day = day
+        intervals = []
+        ends = []
+        for order, block in enumerate(data.get("blocks", [])):
+            start = parse_time(block.get("start", ""), day)
+            end = parse_time(block.get("end", ""), day)
+            if end:
+                ends.append((end, order, block))
+            if start and end:
+                intervals.append((start, end, order, block))
+        intervals.sort(key=lambda item: (item[0], item[1]))
+        ends.sort(key=lambda item: (item[0], item[1]))
+        self.intervals = intervals
+        self.starts = [item[0] for item in intervals]
+        self.max_ends = []
+        latest = None
+        for item in intervals:
+            latest = item[1] if latest is None or item[1] > latest else latest
+            self.max_ends.append(latest)
+        self.ends = ends
+        self.end_times = [item[0] for item in ends]
+        self.boundaries = sorted(
+            {item[0] for item in intervals} | {item[1] for item in intervals}
+        )
+
+    def is_today(self) -> bool:
+        return self.data.get("day") == dt.date.today().isoformat()
+
+    def current_block(self, now: dt.datetime) -> Optional[dict]:
+        # First block in file order whose [start, end) contains now; walking
+        # back stops once no earlier block can still be running.
+        index = bisect.bisect_right(self.starts, now)
+        found = None
+        while index > 0 and self.max_ends[index - 1] > now:
+            index -= 1
+            _, end, order, block = self.intervals[index]
+            if now < end and (found is None or order < found[0]):
+                found = (order, block)
+        return found[1] if found else None
+
+    def remaining_blocks(self, now: dt.datetime) -> list:
+        index = bisect.bisect_right(self.end_times, now)
+        pending = sorted(self.ends[index:], key=lambda item: item[1])
+        return [item[2] for item in pending]
+
+    def next_boundary(self, now: dt.datetime) -> Optional[dt.datetime]:
+        index = bisect.bisect_right(self.boundaries, now)
+        return self.boundaries[index] if index < len(self.boundaries) else None
+
+    def next_transition(self, now: dt.datetime) -> Optional[dt.datetime]:
+        # Next boundary at which the current block actually changes, i.e. when
+        # the loop will emit BLOCK_START/BLOCK_END.
+        current = self.current_block(now)
+        index = bisect.bisect_right(self.boundaries, now)
+        for boundary in self.boundaries[index:]:
+            if self.current_block(boundary) is not current:
+                return boundary
+        return None
+
+
+SCHEDULE_CACHE: dict = {}
+
+
+def load_schedule(path: Path) -> Optional[Schedule]:
+    # Recompiled only when the file changes (size/mtime) or the day rolls over.
+    signature = logio.file_signature(path)
+    if signature is None:
+        SCHEDULE_CACHE.pop(path, None)
+        return None
+    key = (signature, dt.date.today())
+    cached = SCHEDULE_CACHE.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    data = read_schedule(path)
+    if data is None:
+        return None
+    schedule = Schedule(data, key[1])
+    SCHEDULE_CACHE[path] = (key, schedule)
+    return schedule
 
 
 def schedule_needs_alignment(schedule_path: Path) -> bool:
-    schedule = read_schedule(schedule_path)
+    schedule = load_schedule(schedule_path)
     if not schedule:
         return True
-    return not is_today(schedule)
+    return not schedule.is_today()
 
 
-def read_tail_lines(path: Path, max_lines: int) -> list:
-    if not path.exists():
-        return []
-    return path.read_text(encoding="utf-8").splitlines()[-max_lines:]
+HABIT_ESCALATE_AFTER = dt.timedelta(seconds=120)
+RECOVER_AFTER = dt.timedelta(seconds=600)
 
 
-def append_ndjson(path: Path, row: dict) -> None:
-    ensure_dir(path.parent)
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(row, ensure_ascii=True) + "\n")
+class DeadlineScheduler:
+    # Named one-shot deadlines on a heap. Re-arming or cancelling a timer leaves
+    # its old heap entry behind and pop_due() skips entries whose sequence no
+    # longer matches. Persistent timers are mirrored into the state store so a
+    # restarted runner keeps its pending deadlines.
+    def __init__(self, store: StateStore, key: str = "timers") -> None:
+        self.store = store
+        self.key = key
+        self.heap: List[Tuple[dt.datetime, int, str]] = []
+        self.timers: Dict[str, Tuple[dt.datetime, int, dict, bool]] = {}
+        self.seq = 0
+        for name, entry in (store.get(key) or {}).items():
+            try:
+                when = dt.datetime.fromisoformat(entry["at"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._arm(name, when, entry.get("data") or {}, True)
+
+    def _arm(self, name: str, when: dt.datetime, data: dict, persist: bool) -> None:
+        self.seq += 1
+        self.timers[name] = (when, self.seq, dict(data), persist)
+        heapq.heappush(self.heap, (when, self.seq, name))
+        if len(self.heap) > 4 * len(self.timers) + 16:
+            self.heap = [
+                (when, seq, name) for name, (when, seq, _, _) in self.timers.items()
+            ]
+            heapq.heapify(self.heap)
+
+    def set(
+        self,
+        name: str,
+        when: dt.datetime,
+        data: Optional[dict] = None,
+        persist: bool = True,
+    ) -> None:
+        current = self.timers.get(name)
+        if current and current[0] == when and current[2] == (data or {}):
+            return
+        self._arm(name, when, data or {}, persist)
+        if persist or (current and current[3]):
+            self.save()
+
+    def cancel(self, name: str) -> None:
+        current = self.timers.pop(name, None)
+        if current and current[3]:
+            self.save()
+
+    def get(self, name: str) -> Optional[dt.datetime]:
+        current = self.timers.get(name)
+        return current[0] if current else None
+
+    def pending(self, name: str) -> bool:
+        return name in self.timers
+
+    def next_deadline(self) -> Optional[dt.datetime]:
+        while self.heap:
+            when, seq, name = self.heap[0]
+            current = self.timers.get(name)
+            if current and current[1] == seq:
+                return when
+            heapq.heappop(self.heap)
+        return None
 
+    def pop_due(self, now: dt.datetime) -> Dict[str, dict]:
+        fired: Dict[str, dict] = {}
+        persisted = False
+        while self.heap and self.heap[0][0] <= now:
+            _, seq, name = heapq.heappop(self.heap)
+            current = self.timers.get(name)
+            if current is None or current[1] != seq:
+                continue
+            del self.timers[name]
+            fired[name] = current[2]
+            persisted = persisted or current[3]
+        if persisted:
+            self.save()
+        return fired
+
+    def save(self) -> None:
+        self.store.set(
+            self.key,
+            {
+                name: {"at": when.isoformat(), "data": data}
+                for name, (when, _, data, persist) in sorted(self.timers.items())
+                if persist
+            },
+        )
 
-def append_overlay_cmd(path: Path, payload: dict) -> None:
-    ensure_dir(path.parent)
-    path.write_text("", encoding="utf-8")
-    append_ndjson(path, payload)
-    history_path = path.with_name(
+
+def restore_timers(
+    timers: DeadlineScheduler, store: StateStore, args: argparse.Namespace
+) -> None:
+    # Re-derive deadlines for pending state written before timers were persisted
+    # (or by hand), so nothing waits forever on a timer that was never armed.
+    habit_state = read_habit_state(store)
+    off_state = read_off_schedule_state(store)
+    align_prompted = read_align_prompted(store)
+    try:
+        due_at = habit_state.get("due_at")
+        pending = not habit_state.get("done") and not habit_state.get("escalated")
+        if due_at and pending and not timers.pending("habit_escalate"):
+            timers.set(
+                "habit_escalate",
+                dt.datetime.fromisoformat(due_at) + HABIT_ESCALATE_AFTER,
+                {"block_id": habit_state.get("block_id")},
+            )
+        since = off_state.get("since")
+        if (
+            since
+            and not off_state.get("recover_triggered")
+            and not timers.pending("recover_trigger")
+        ):
+            timers.set(
+                "recover_trigger",
+                dt.datetime.fromisoformat(since) + RECOVER_AFTER,
+                {"block_id": off_state.get("block_id")},
+            )
+        prompted_at = align_prompted.get("prompted_at")
+        if prompted_at and not timers.pending("align_reprompt"):
+            timers.set(
+                "align_reprompt",
+                dt.datetime.fromisoformat(prompted_at)
+                + dt.timedelta(seconds=args.align_min_interval),
+            )
+    except ValueError:
+        pass
+
+
+def wait_for_work(
+    watcher: logio.FileWatcher,
+    store: StateStore,
+    timers: DeadlineScheduler,
+    args: argparse.Namespace,
+    due: Optional[dt.datetime] = None,
+) -> None:
+    # Sleep until the earliest timer, a coalesced event falling due, or a
+    # watched file changing.
+    store.flush()
+    now = dt.datetime.now()
+    wake_at = timers.next_deadline() or now + dt.timedelta(days=1)
+    if due is not None:
+        wake_at = min(wake_at, due)
+    timeout = (max(now, wake_at) - now).total_seconds()
+    if args.max_wait > 0:
+        timeout = min(timeout, args.max_wait)
+    store.reload(watcher.wait(max(0.01, timeout)))
+
+
+def overlay_history_path(path: Path) -> Path:
+    return path.with_name(
         path.stem.replace("overlay_cmd", "overlay_cmd_history") + path.suffix
     )
-    append_ndjson(history_path, payload)
+
+
+def append_overlay_cmd(
+    path: Path, payload: dict, history: logio.NdjsonWriter
+) -> None:
+    # The overlay only ever reads the latest command, so replace it in one write.
+    ensure_dir(path.parent)
+    path.write_text(json.dumps(payload, ensure_ascii=True) + "\n", encoding="utf-8")
+    history.write(payload)
 
 
 def write_json(path: Path, data: dict) -> None:
+    # Write to a sibling temp file and rename so readers never see a torn file.
     ensure_dir(path.parent)
-    path.write_text(json.dumps(data, ensure_ascii=True, indent=2), encoding="utf-8")
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(json.dumps(data, ensure_ascii=True, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
 
 
 def ensure_uuid() -> str:
@@ -508,18 +792,34 @@ def tail_file(path: Path, offset: int) -> Tuple[int, list]:
     return new_offset, lines
 
 
-def append_event(path: Path, payload: dict) -> None:
-    append_ndjson(path, payload)
+def append_event(writer: logio.NdjsonWriter, payload: dict) -> None:
+    # Runner-originated events start their own trace.
+    payload.setdefault("trace_id", tracing.new_trace_id())
+    writer.write(payload)
 
 
-def read_last_activity(path: Path) -> Optional[dict]:
-    lines = read_tail_lines(path, 1)
-    if not lines:
-        return None
-    try:
-        return json.loads(lines[0])
-    except json.JSONDecodeError:
-        return None
+def read_log_tail(
+    db: Optional[logdb.LogStore], log: str, path: Path, max_lines: int
+) -> list:
+    # Indexed query on today's rows when the log store is on, else a tail of
+    # the daily file.
+    if db is None:
+        return logio.read_tail_lines(path, max_lines)
+    return db.tail_lines(log, max_lines, dt.date.today())
+
+
+def read_log_last_row(
+    db: Optional[logdb.LogStore], log: str, path: Path
+) -> Optional[dict]:
+    if db is None:
+        return logio.read_last_row(path)
+    return db.last_row(log, dt.date.today())
+
+
+def read_last_activity(
+    path: Path, db: Optional[logdb.LogStore] = None
+) -> Optional[dict]:
+    return read_log_last_row(db, "activity", path)
 
 
 def parse_json_from_text(raw: str) -> Optional[dict]:
@@ -535,13 +835,22 @@ def parse_json_from_text(raw: str) -> Optional[dict]:
     return None
 
 
-def call_coach_plan(message: str, files: Optional[list] = None) -> Optional[dict]:
-    cmd = ["opencode", "run", "--agent", "coach_plan"]
-    if files:
-        for file_path in files:
-            cmd += ["-f", str(file_path)]
-    cmd += ["--", message]
-    code, out, err = run(cmd)
+def call_coach_plan(
+    message: str,
+    files: Optional[list] = None,
+    client=None,
+    timeout: Optional[float] = None,
+    on_start=None,
+) -> Optional[dict]:
+    if client is not None:
+        code, out, err = client.call(message, files=files, timeout=timeout)
+    else:
+        cmd = ["opencode", "run", "--agent", "coach_plan"]
+        if files:
+            for file_path in files:
+                cmd += ["-f", str(file_path)]
+        cmd += ["--", message]
+        code, out, err = run(cmd, timeout=timeout, on_start=on_start)
     if code != 0:
         if err:
             print(f"coach_plan error: {err}")
@@ -549,6 +858,370 @@ def call_coach_plan(message: str, files: Optional[list] = None) -> Optional[dict
     return parse_json_from_text(out)
 
 
+class PlanCall:
+    def __init__(
+        self,
+        key: str,
+        message: str,
+        files: list,
+        context: dict,
+        cleanup: Optional[list] = None,
+    ) -> None:
+        self.key = key
+        self.message = message
+        self.files = files
+        self.context = context
+        # Files written for this call only, removed once it is done.
+        self.cleanup: list = list(cleanup or [])
+        self.response: Optional[dict] = None
+        self.cancelled = threading.Event()
+        self.proc: Optional[subprocess.Popen] = None
+        self.future = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def attach(self, proc: subprocess.Popen) -> None:
+        self.proc = proc
+        if self.cancelled.is_set():
+            proc.kill()
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        if self.future is not None and self.future.cancel():
+            # Still queued: execute() will never run, so clean up here.
+            self.remove_files()
+            return
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    def remove_files(self) -> None:
+        for path in self.cleanup:
+            Path(path).unlink(missing_ok=True)
+
+
+class PlanExecutor:
+    # Runs coach_plan calls off the main loop. One call per key is live at a
+    # time: submitting a key again cancels the older call (killing its opencode
+    # process, or discarding a pooled worker's answer). Finished calls are
+    # collected by the loop through completed().
+    def __init__(
+        self, client, max_workers: int, timeout: Optional[float], wake=None
+    ) -> None:
+        self.client = client
+        self.timeout = timeout
+        self.wake = wake
+        self.pool = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="coach_plan"
+        )
+        self.inflight: Dict[str, PlanCall] = {}
+        self.results: queue.Queue = queue.Queue()
+
+    def submit(
+        self,
+        key: str,
+        message: str,
+        files: list,
+        context: Optional[dict] = None,
+        cleanup: Optional[list] = None,
+    ) -> PlanCall:
+        previous = self.inflight.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+            print(f"runner: superseded pending coach_plan call {key}")
+        call = PlanCall(key, message, files, context or {}, cleanup)
+        self.inflight[key] = call
+        call.future = self.pool.submit(self.execute, call)
+        return call
+
+    def execute(self, call: PlanCall) -> None:
+        call.started = time.time()
+        try:
+            if not call.cancelled.is_set():
+                call.response = call_coach_plan(
+                    call.message,
+                    files=call.files,
+                    client=self.client,
+                    timeout=self.timeout,
+                    on_start=call.attach,
+                )
+        except Exception as exc:
+            print(f"coach_plan error: {exc}")
+        finally:
+            call.finished = time.time()
+            call.remove_files()
+            self.results.put(call)
+            if self.wake is not None:
+                self.wake()
+
+    def completed(self) -> list:
+        done = []
+        while True:
+            try:
+                call = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if self.inflight.get(call.key) is call:
+                del self.inflight[call.key]
+            if not call.cancelled.is_set():
+                done.append(call)
+        return done
+
+    def cancel(self, key: str) -> None:
+        call = self.inflight.pop(key, None)
+        if call is not None:
+            call.cancel()
+
+    def rekey(self, call: PlanCall, key: str) -> None:
+        if self.inflight.get(call.key) is call:
+            del self.inflight[call.key]
+        previous = self.inflight.get(key)
+        if previous is not None and previous is not call:
+            del self.inflight[key]
+            previous.cancel()
+        call.key = key
+        self.inflight[key] = call
+
+    def close(self) -> None:
+        for call in list(self.inflight.values()):
+            call.cancel()
+        self.pool.shutdown(wait=False)
+
+
+SIGNATURE_STOPWORDS = set(
+    "the and for with user while from that this not task off on_task off_task "
+    "appears seems instead".split()
+)
+
+
+def distraction_signature(activity_lines: list, size: int = 8) -> str:
+    # The most frequent words across recent reasons/captions, so "Discord
+    # server chat" and "chatting in a Discord server" land on one key.
+    rows = []
+    for line in activity_lines:
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(row, dict):
+            rows.append(row)
+    off_task = [row for row in rows if row.get("status") == "off_task"]
+    words: Counter = Counter()
+    for row in off_task or rows:
+        text = " ".join(
+            str(row.get(field) or "") for field in ("app", "reason", "short_caption")
+        )
+        for word in re.findall(r"[a-z][a-z_]{2,}", text.lower()):
+            if word not in SIGNATURE_STOPWORDS:
+                words[word] += 1
+    top = sorted(words.items(), key=lambda item: (-item[1], item[0]))[:size]
+    return " ".join(sorted(word for word, _ in top))
+
+
+class PlanCache:
+    # coach_plan responses keyed on (event type, block_id, distraction
+    # signature). Each entry keeps a few distinct responses and rotates through
+    # them; after max_hits replays the next lookup misses so a fresh response is
+    # fetched and added as another variant.
+    def __init__(
+        self,
+        path: Path,
+        capacity: int = 64,
+        ttl: int = 1800,
+        max_hits: int = 3,
+        variants: int = 3,
+    ) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_hits = max_hits
+        self.variants = max(1, variants)
+        self.entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "refreshes": 0,
+            "admitted": 0,
+            "evicted": 0,
+        }
+        self.dirty = False
+        self.saved_at = 0.0
+        self.load()
+
+    @staticmethod
+    def key(event: dict, activity_lines: list) -> tuple:
+        event_type = event.get("type")
+        if event_type in ["DRIFT_START", "DRIFT_PERSIST"]:
+            event_type = "DRIFT"
+        return (
+            str(event_type),
+            str(event.get("block_id") or ""),
+            distraction_signature(activity_lines),
+        )
+
+    def load(self) -> None:
+        data = read_json(self.path) or {}
+        now = time.time()
+        for entry in data.get("entries", []):
+            try:
+                if entry["expires_at"] > now and entry["variants"]:
+                    self.entries[tuple(entry["key"])] = entry
+            except (KeyError, TypeError):
+                continue
+        stats = data.get("stats")
+        if isinstance(stats, dict):
+            for name in self.stats:
+                if isinstance(stats.get(name), int):
+                    self.stats[name] = stats[name]
+
+    def lookup(self, key: tuple) -> Optional[dict]:
+        self.dirty = True
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if entry["expires_at"] <= time.time():
+            del self.entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        if self.max_hits > 0 and entry["hits"] >= self.max_hits:
+            self.stats["refreshes"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        variant = entry["variants"][entry["hits"] % len(entry["variants"])]
+        entry["hits"] += 1
+        self.stats["hits"] += 1
+        return copy.deepcopy(variant)
+
+    def has(self, key: tuple) -> bool:
+        entry = self.entries.get(key)
+        if entry is None or entry["expires_at"] <= time.time():
+            return False
+        return self.max_hits <= 0 or entry["hits"] < self.max_hits
+
+    def admit(self, key: tuple, response: dict) -> bool:
+        if not isinstance(response.get("overlay"), dict):
+            return False
+        self.dirty = True
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = {"key": list(key), "variants": []}
+            self.entries[key] = entry
+        if response not in entry["variants"]:
+            entry["variants"] = (entry["variants"] + [response])[-self.variants :]
+        entry["hits"] = 0
+        entry["expires_at"] = time.time() + self.ttl
+        self.entries.move_to_end(key)
+        self.stats["admitted"] += 1
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+        return True
+
+    def save(self, min_interval: float = 0.0) -> None:
+        now = time.time()
+        if not self.dirty or now - self.saved_at < min_interval:
+            return
+        entries = [e for e in self.entries.values() if e["expires_at"] > now]
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        stats["entries"] = len(entries)
+        write_json(self.path, {"entries": entries, "stats": stats})
+        self.dirty = False
+        self.saved_at = now
+
+
+def event_time(event: dict) -> Optional[dt.datetime]:
+    try:
+        ts = dt.datetime.fromisoformat(str(event.get("ts")))
+    except ValueError:
+        return None
+    return ts.replace(tzinfo=None) if ts.tzinfo else ts
+
+
+class EventCoalescer:
+    # Planner-bound events keyed by (type, block_id). A burst collapses to the
+    # newest event per key, events older than max_age are dropped, and with a
+    # window > 0 a key is held that long after its first event so the burst can
+    # settle before the planner sees it.
+    def __init__(self, window: float, max_age: float) -> None:
+        self.window = dt.timedelta(seconds=max(0.0, window))
+        self.max_age = max_age
+        self.pending: "OrderedDict[tuple, dict]" = OrderedDict()
+        self.stats = {"received": 0, "collapsed": 0, "stale": 0, "dispatched": 0}
+        self.batch = {"collapsed": 0, "stale": 0}
+
+    def add(self, event: dict, line: str, now: dt.datetime) -> None:
+        self.stats["received"] += 1
+        ts = event_time(event)
+        if self.max_age > 0 and ts and (now - ts).total_seconds() > self.max_age:
+            self.count("stale")
+            return
+        key = (event.get("type"), event.get("block_id"))
+        held = self.pending.get(key)
+        if held is None:
+            self.pending[key] = {"event": event, "line": line, "since": now}
+            return
+        self.count("collapsed")
+        held_ts = event_time(held["event"])
+        if ts and held_ts and ts < held_ts:
+            return
+        held["event"] = event
+        held["line"] = line
+
+    def count(self, name: str) -> None:
+        self.stats[name] += 1
+        self.batch[name] += 1
+
+    def ready(self, now: dt.datetime) -> list:
+        due = [
+            key
+            for key, held in self.pending.items()
+            if now - held["since"] >= self.window
+        ]
+        batch = []
+        for key in due:
+            held = self.pending.pop(key)
+            if self.max_age > 0:
+                ts = event_time(held["event"])
+                if ts and (now - ts).total_seconds() > self.max_age:
+                    self.count("stale")
+                    continue
+            batch.append((held["event"], held["line"]))
+        self.stats["dispatched"] += len(batch)
+        return batch
+
+    def next_due(self) -> Optional[dt.datetime]:
+        if not self.pending:
+            return None
+        return min(held["since"] for held in self.pending.values()) + self.window
+
+    def report(self) -> Optional[str]:
+        batch = self.batch
+        self.batch = {"collapsed": 0, "stale": 0}
+        if not batch["collapsed"] and not batch["stale"]:
+            return None
+        return f"collapsed {batch['collapsed']}, dropped {batch['stale']} stale"
+
+
+def runner_stats(coalescer: EventCoalescer, prefetcher) -> dict:
+    stats = {"events": dict(coalescer.stats)}
+    if prefetcher is not None:
+        stats["prefetch"] = prefetcher.summary()
+    return stats
+
+
+def plan_key(event: dict) -> str:
+    event_type = event.get("type")
+    if event_type in ["DRIFT_START", "DRIFT_PERSIST"]:
+        event_type = "DRIFT"
+    return f"{event_type}:{event.get('block_id')}"
+
+
 def build_prompt(
     event_line: str,
     activity_lines: list,
@@ -566,6 +1239,372 @@ def build_prompt(
     )
 
 
+def apply_recover_result(
+    args: argparse.Namespace, logs: dict, overlay_cmd_log: Path, call: PlanCall
+) -> None:
+    response = call.response
+    schedule = call.context["schedule"]
+    schedule_before = call.context["schedule_before"]
+    revised_yaml = None
+    if isinstance(response, dict):
+        revised_yaml = response.get("revised_schedule_yaml")
+    if not revised_yaml and schedule.get("blocks"):
+        revised_yaml = apply_recover_fallback(schedule, dt.datetime.now())
+    if revised_yaml:
+        args.schedule.write_text(revised_yaml, encoding="utf-8")
+        append_event(
+            logs["events"],
+            {
+                "ts": dt.datetime.now().isoformat(),
+                "type": "SCHEDULE_UPDATED",
+                "event_id": ensure_uuid(),
+                "source": "runner",
+            },
+        )
+        overlay = response.get("overlay") if isinstance(response, dict) else None
+        if isinstance(overlay, dict):
+            overlay_payload = {
+                "ts": dt.datetime.now().isoformat(),
+                "cmd_id": ensure_uuid(),
+                "source_event_id": None,
+                "source": "runner",
+                **overlay,
+            }
+        else:
+            overlay_payload = {
+                "ts": dt.datetime.now().isoformat(),
+                "cmd_id": ensure_uuid(),
+                "source_event_id": None,
+                "source": "runner",
+                "level": "B",
+                "style_id": "calm",
+                "headline": "New plan accepted",
+                "human_line": "Schedule updated.",
+                "diagnosis": "",
+                "next_action": "Resume the next block.",
+                "block_id": None,
+                "block_name": "",
+            }
+        append_overlay_cmd(overlay_cmd_log, overlay_payload, logs["overlay_history"])
+        Path("coach/state/schedule.before.yaml").write_text(
+            schedule_before, encoding="utf-8"
+        )
+
+
+def apply_plan_result(
+    args: argparse.Namespace,
+    logs: dict,
+    overlay_cmd_log: Path,
+    call: PlanCall,
+    tracer: tracing.Tracer,
+) -> bool:
+    # Returns whether a response was applied, i.e. whether this was a nudge.
+    response = call.response
+    event = call.context["event"]
+    trace_id = event.get("trace_id")
+    source_event_id = event.get("event_id")
+    if source_event_id is None:
+        print("runner: event missing event_id")
+    if not response:
+        print("runner: no response from coach_plan")
+        return False
+
+    overlay = response.get("overlay")
+    if isinstance(overlay, dict):
+        if event.get("type") in ["DRIFT_START", "DRIFT_PERSIST"]:
+            overlay = dict(overlay)
+            overlay["level"] = "B"
+        cmd_id = ensure_uuid()
+        source_event_id = event.get("event_id")
+        overlay_payload = {
+            "ts": dt.datetime.now().isoformat(),
+            "cmd_id": cmd_id,
+            "source_event_id": source_event_id,
+            "source_event_type": event.get("type"),
+            "source": "runner",
+            "trace_id": trace_id,
+            **overlay,
+        }
+        # A refinement reuses the instant overlay's cmd_id so the overlay updates
+        # in place and later actions stay attributed to one command.
+        parent_cmd_id = call.context.get("parent_cmd_id")
+        if parent_cmd_id:
+            overlay_payload["cmd_id"] = parent_cmd_id
+            overlay_payload["phase"] = "refine"
+        with tracer.measure(
+            trace_id,
+            "overlay_cmd",
+            cmd_id=overlay_payload["cmd_id"],
+            phase=overlay_payload.get("phase"),
+            plan_source=call.context.get("plan_source", "planner"),
+        ):
+            append_overlay_cmd(
+                overlay_cmd_log, overlay_payload, logs["overlay_history"]
+            )
+        print(f"runner: wrote overlay command source_event_id={source_event_id}")
+
+    hud_text = response.get("hud_text", "")
+    if isinstance(hud_text, str) and hud_text.strip():
+        args.hud.write_text(hud_text, encoding="utf-8")
+
+    speech_text = response.get("speech_text")
+    if voice and isinstance(speech_text, str) and speech_text.strip():
+        print(f"runner: voice speak: {speech_text}")
+        logs["speech"].write(
+            {
+                "ts": dt.datetime.now().isoformat(),
+                "event_id": event.get("event_id"),
+                "event_type": event.get("type"),
+                "speech_text": speech_text,
+                "headline": overlay.get("headline") if isinstance(overlay, dict) else None,
+                "block_id": overlay.get("block_id") if isinstance(overlay, dict) else None,
+                "block_name": overlay.get("block_name") if isinstance(overlay, dict) else None,
+            },
+        )
+        # Speech is queued; the span runs until the first audio reaches a player
+        # and carries the backend, playback mode and sink.
+        queued_at = time.time()
+        voice.speak(
+            speech_text,
+            intensity="urgent",
+            on_start=lambda info: tracer.span(trace_id, "speech", queued_at, **info),
+        )
+    return True
+
+
+def stale_refinement(
+    call: PlanCall, acted_cmds: Iterable[str], history: logio.NdjsonWriter
+) -> Optional[str]:
+    # A refinement only lands while its instant overlay is still the one on
+    # screen and the user has not answered it yet.
+    parent_cmd_id = call.context.get("parent_cmd_id")
+    if not parent_cmd_id:
+        return None
+    if parent_cmd_id in acted_cmds:
+        return "acted"
+    if (history.last_row or {}).get("cmd_id") != parent_cmd_id:
+        return "superseded"
+    return None
+
+
+def read_goals(path: Path) -> List[str]:
+    # goals.json is hand-edited: accept a list, {"goals": [...]} or a mapping of
+    # named goals, and keep the text entries.
+    data = read_json(path)
+    if isinstance(data, dict):
+        data = data.get("goals", list(data.values()))
+    if not isinstance(data, list):
+        return []
+    goals = []
+    for item in data:
+        if isinstance(item, dict):
+            item = item.get("title") or item.get("goal") or item.get("text")
+        if isinstance(item, str) and item.strip():
+            goals.append(item.strip())
+    return goals
+
+
+def drift_overlay_payload(event: dict, block_state: dict, goals: List[str]) -> dict:
+    # Rule-based level-B overlay shown while coach_plan is still thinking; the
+    # planner's answer later refines it under the same cmd_id.
+    block_name = event.get("block_name") or block_state.get("block_name") or ""
+    reason = str(event.get("reason") or "").strip()
+    app = event.get("app")
+    if reason:
+        human_line = reason
+    elif app:
+        human_line = f"{app} is not part of this block."
+    else:
+        human_line = "You drifted off the plan."
+    return {
+        "ts": dt.datetime.now().isoformat(),
+        "cmd_id": ensure_uuid(),
+        "source_event_id": event.get("event_id"),
+        "source_event_type": event.get("type"),
+        "source": "runner",
+        "phase": "instant",
+        "level": "B",
+        "style_id": "strict",
+        "headline": f"Back to {block_name}" if block_name else "Back on task",
+        "human_line": human_line,
+        "diagnosis": f"Goal: {goals[0]}" if goals else "",
+        "next_action": f"Return to {block_name} now."
+        if block_name
+        else "Return to the planned work now.",
+        "block_id": event.get("block_id") or block_state.get("block_id"),
+        "block_name": block_name,
+    }
+
+
+def drift_rising(
+    activity_lines: list, threshold: float, last_event: Optional[dict] = None
+) -> Optional[dict]:
+    # Latest activity row when off-task confidence is climbing toward a drift
+    # event but has not produced one yet: rows at the monitor's event threshold
+    # already have their event, and so does a row a drift event followed.
+    scores = []
+    last_row = None
+    for line in activity_lines[-3:]:
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(row, dict):
+            continue
+        confidence = row.get("confidence")
+        off_task = row.get("status") == "off_task"
+        if off_task and isinstance(confidence, (int, float)):
+            scores.append(float(confidence))
+        else:
+            scores.append(0.0)
+        last_row = row
+    if len(scores) < 2 or last_row is None:
+        return None
+    if scores[-1] >= DRIFT_EVENT_CONFIDENCE:
+        return None
+    if last_event and last_event.get("type") in ("DRIFT_START", "DRIFT_PERSIST"):
+        if str(last_event.get("ts") or "") >= str(last_row.get("ts") or ""):
+            return None
+    if scores[-1] >= threshold and scores[-1] > scores[-2]:
+        return last_row
+    return None
+
+
+class Prefetcher:
+    # Speculative coach_plan calls for events that look imminent. Results are
+    # parked under the event's plan key until the real event takes them or
+    # they expire; expired or unused calls count as wasted. A call still in
+    # flight when its event arrives is adopted by the event rather than
+    # cancelled and issued again.
+    def __init__(self, plans: PlanExecutor) -> None:
+        self.plans = plans
+        self.entries: Dict[str, dict] = {}
+        self.triggers: Dict[str, str] = {}
+        self.stats = {"issued": 0, "hits": 0, "adopted": 0, "wasted": 0}
+
+    def want(self, key: str, trigger: str, now: dt.datetime) -> bool:
+        # One prefetch per trigger (a transition time or an activity row), so
+        # an unchanged tail does not re-issue the same call after expiry.
+        if self.triggers.get(key) == trigger:
+            return False
+        entry = self.entries.get(key)
+        return entry is None or entry["expires_at"] <= now
+
+    def issue(
+        self,
+        key: str,
+        trigger: str,
+        expires_at: dt.datetime,
+        call_args: Tuple[str, list, Path],
+    ) -> None:
+        self.discard(key)
+        self.triggers[key] = trigger
+        prompt, files, context_path = call_args
+        call = self.plans.submit(
+            f"prefetch:{key}", prompt, files, cleanup=[context_path]
+        )
+        self.entries[key] = {"call": call, "expires_at": expires_at, "response": None}
+        self.stats["issued"] += 1
+        print(f"runner: prefetching coach_plan for {key}")
+
+    def complete(self, call: PlanCall) -> None:
+        key = call.key[len("prefetch:") :]
+        entry = self.entries.get(key)
+        if entry is None or entry["call"] is not call:
+            return
+        if not call.response:
+            self.discard(key)
+            return
+        entry["response"] = call.response
+
+    def take(self, key: str, now: dt.datetime) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= now:
+            self.discard(key)
+            return None
+        if entry["response"] is None:
+            return None
+        del self.entries[key]
+        self.stats["hits"] += 1
+        return entry["response"]
+
+    def adopt(self, key: str, context: dict) -> Optional[PlanCall]:
+        # Hands an in-flight prefetch to the real event: the call moves to the
+        # event's plan key and completes like a call submitted for it.
+        entry = self.entries.get(key)
+        if entry is None or entry["response"] is not None:
+            return None
+        call = entry["call"]
+        if call.cancelled.is_set():
+            return None
+        del self.entries[key]
+        self.plans.rekey(call, key)
+        call.context.update(context, plan_source="prefetch")
+        self.stats["adopted"] += 1
+        return call
+
+    def discard(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.plans.cancel(entry["call"].key)
+        self.stats["wasted"] += 1
+
+    def sweep(self, now: dt.datetime) -> None:
+        for key in [k for k, e in self.entries.items() if e["expires_at"] <= now]:
+            self.discard(key)
+
+    def summary(self) -> dict:
+        summary = dict(self.stats)
+        issued = summary["issued"]
+        summary["hit_rate"] = round(summary["hits"] / issued, 3) if issued else None
+        summary["wasted_rate"] = (
+            round(summary["wasted"] / issued, 3) if issued else None
+        )
+        return summary
+
+
+def build_plan_request(
+    event: dict,
+    event_line: str,
+    activity_tail: list,
+    activity_log: Path,
+    overlay_actions_log: Path,
+    db: Optional[logdb.LogStore] = None,
+) -> Tuple[str, list, Path]:
+    now_payload = read_json(Path("coach/state/now.json")) or {}
+    last_action = read_log_last_row(db, "overlay_actions", overlay_actions_log)
+
+    context_payload = {
+        "event": event,
+        "activity_tail": activity_tail,
+        "now": now_payload,
+        "last_overlay_action": last_action,
+    }
+    context_text = json.dumps(context_payload, ensure_ascii=True, indent=2)
+    Path("coach/runner_context.json").write_text(context_text, encoding="utf-8")
+    # Calls may overlap, so each one gets its own copy of the context.
+    context_path = Path("coach/state/plan_context") / f"{ensure_uuid()}.json"
+    write_json(context_path, context_payload)
+
+    prompt = build_prompt(event_line, activity_tail, now_payload, last_action)
+    if event.get("type") in ["DRIFT_START", "DRIFT_PERSIST"]:
+        prompt = "Force level B overlay for drift.\n" + prompt
+    files = [
+        Path("coach/state/now.json"),
+        activity_log,
+        overlay_actions_log,
+        context_path,
+        Path("coach/state/goals.json"),
+    ]
+    if db is not None and not activity_log.exists():
+        # Activity only lives in the log store (--log-db-only on the monitor).
+        files.remove(activity_log)
+    return prompt, files, context_path
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(description="Coach event runner")
     parser.add_argument(
@@ -646,14 +1685,241 @@ def main() -> int:
         default=7,
         help="Days of log retention for daily ndjson logs",
     )
+    parser.add_argument(
+        "--worker-pool",
+        type=int,
+        default=0,
+        help="Persistent coach_plan workers to keep warm (0=spawn per call)",
+    )
+    parser.add_argument(
+        "--worker-backend",
+        choices=["opencode", "stub"],
+        default="opencode",
+        help="Backend for persistent workers (stub answers offline)",
+    )
+    parser.add_argument(
+        "--worker-socket",
+        type=Path,
+        default=None,
+        help="Send planner requests to a worker.py listening on this Unix socket",
+    )
+    parser.add_argument(
+        "--plan-workers",
+        type=int,
+        default=2,
+        help="Max coach_plan calls running at once",
+    )
+    parser.add_argument(
+        "--plan-timeout",
+        type=float,
+        default=90.0,
+        help="Seconds before a coach_plan call is abandoned (0=no limit)",
+    )
+    parser.add_argument(
+        "--no-plan-cache",
+        action="store_true",
+        help="Always call coach_plan instead of replaying cached responses",
+    )
+    parser.add_argument(
+        "--plan-cache",
+        type=Path,
+        default=Path("coach/state/plan_cache.json"),
+        help="Persisted coach_plan response cache",
+    )
+    parser.add_argument(
+        "--plan-cache-ttl",
+        type=int,
+        default=1800,
+        help="Seconds a cached coach_plan response stays valid",
+    )
+    parser.add_argument(
+        "--plan-cache-size",
+        type=int,
+        default=64,
+        help="Max cached (event, block, distraction) keys",
+    )
+    parser.add_argument(
+        "--plan-cache-max-hits",
+        type=int,
+        default=3,
+        help="Replays before a key is refreshed from coach_plan (0=until expiry)",
+    )
+    parser.add_argument(
+        "--plan-cache-variants",
+        type=int,
+        default=3,
+        help="Distinct responses kept per key and rotated on hits",
+    )
+    parser.add_argument(
+        "--speech-max-age",
+        type=float,
+        default=20.0,
+        help="Drop queued speech older than this many seconds (0=disable)",
+    )
+    parser.add_argument(
+        "--audio-sink",
+        choices=["auto", "ffplay", "mpg123", "afplay", "paplay", "aplay", "null"],
+        default="auto",
+        help="Speech player (auto: first installed, streaming players first)",
+    )
+    parser.add_argument(
+        "--no-stream-audio",
+        action="store_true",
+        help="Play speech only once the whole clip is synthesized",
+    )
+    parser.add_argument(
+        "--tts-backends",
+        type=str,
+        default="edge,say,espeak,pyttsx3,null",
+        help="Comma-separated TTS backends in order of preference",
+    )
+    parser.add_argument(
+        "--speech-deadline",
+        type=float,
+        default=1.5,
+        help="Seconds a TTS backend gets to produce its first audio chunk before "
+        "the next one is tried and it cools down (0=disable)",
+    )
+    parser.add_argument(
+        "--no-instant-overlay",
+        action="store_true",
+        help="Wait for coach_plan before showing drift overlays",
+    )
+    parser.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help="Do not call coach_plan ahead of expected drift/block events",
+    )
+    parser.add_argument(
+        "--prefetch-lead",
+        type=int,
+        default=120,
+        help="Seconds before a block transition to prefetch its overlay",
+    )
+    parser.add_argument(
+        "--prefetch-ttl",
+        type=int,
+        default=180,
+        help="Seconds a drift prefetch stays usable",
+    )
+    parser.add_argument(
+        "--prefetch-drift-score",
+        type=float,
+        default=0.5,
+        help="Rising off-task confidence that triggers a drift prefetch",
+    )
+    parser.add_argument(
+        "--coalesce-ms",
+        type=int,
+        default=0,
+        help="Hold planner-bound events this long so bursts collapse (0=per batch)",
+    )
+    parser.add_argument(
+        "--event-max-age",
+        type=float,
+        default=300.0,
+        help="Drop planner-bound events older than this many seconds (0=keep all)",
+    )
+    parser.add_argument(
+        "--watch",
+        choices=["auto", "inotify", "poll"],
+        default="auto",
+        help="How to wait for log changes (inotify on Linux, polling elsewhere)",
+    )
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        default=30.0,
+        help="Longest idle wait in seconds between loop passes (0=until a deadline)",
+    )
+    parser.add_argument(
+        "--log-flush",
+        choices=list(logio.FLUSH_POLICIES),
+        default="row",
+        help="When buffered log rows are written: every row, once per loop tick "
+        "(or after --log-flush-interval), or only on exit (the shared event "
+        "log is still written every tick). Defaults to row, unlike the monitor: "
+        "the runner writes a few rows per event and may then sleep until the "
+        "next change with them still buffered",
+    )
+    parser.add_argument(
+        "--log-flush-interval",
+        type=float,
+        default=1.0,
+        help="Max seconds rows stay buffered under --log-flush interval",
+    )
+    parser.add_argument(
+        "--trace-log",
+        type=Path,
+        default=tracing.TRACE_LOG,
+        help="Base path of the daily latency trace log",
+    )
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help="Do not record latency trace spans",
+    )
+    parser.add_argument(
+        "--log-fsync",
+        action="store_true",
+        help="fsync log files after every flush",
+    )
+    parser.add_argument(
+        "--log-db",
+        type=Path,
+        default=None,
+        help="SQLite log store (e.g. coach/logs/coach.db) for events, activity and "
+        "overlay/speech/trace rows; give the monitor the same path",
+    )
+    parser.add_argument(
+        "--log-db-only",
+        action="store_true",
+        help="With --log-db, write runner logs to the store only, not NDJSON",
+    )
     args = parser.parse_args()
 
+    planner = None
+    if args.worker_pool > 0 or args.worker_socket:
+        planner = worker.make_client(
+            "coach_plan",
+            args.worker_pool,
+            backend=args.worker_backend,
+            socket_path=args.worker_socket,
+        )
+
+    db = logdb.open_store(args.log_db)
+    log_opts = {
+        "policy": args.log_flush,
+        "flush_interval": args.log_flush_interval,
+        "fsync": args.log_fsync,
+        "db": db,
+        "files": not args.log_db_only,
+    }
+    logs = {
+        # Shared with the monitor and read back each loop.
+        "events": logio.NdjsonWriter(args.events_log, tailed=True, **log_opts),
+        "speech": logio.NdjsonWriter(Path("coach/logs/speech.ndjson"), **log_opts),
+        "overlay_history": logio.NdjsonWriter(
+            overlay_history_path(args.overlay_cmd), **log_opts
+        ),
+    }
+    if not args.no_trace:
+        logs["trace"] = logio.NdjsonWriter(args.trace_log, **log_opts)
+    tracer = tracing.Tracer(logs.get("trace"), "runner")
+    if voice:
+        voice.start_worker(
+            args.speech_max_age,
+            sink=args.audio_sink,
+            stream=not args.no_stream_audio,
+            backends=[name.strip() for name in args.tts_backends.split(",")],
+            deadline=args.speech_deadline,
+        )
+
     events_offset = 0
     actions_offset = 0
     last_nudge = None
     pause_until = None
     nudge_times = deque()
-    last_align_prompt = None
 
     now = dt.datetime.now()
     current_day = now.date()
@@ -674,8 +1940,59 @@ def main() -> int:
     if not speech_log.exists():
         speech_log.write_text("", encoding="utf-8")
 
+    store = StateStore(
+        {
+            "current_block": Path("coach/state/current_block.json"),
+            "last_habit": Path("coach/state/last_habit.json"),
+            "off_schedule_state": Path("coach/state/off_schedule_state.json"),
+            "align_prompted": Path("coach/state/align_prompted.json"),
+            "align_state": args.align_state,
+            "runner_stats": Path("coach/state/runner_stats.json"),
+            "timers": Path("coach/state/timers.json"),
+        }
+    )
+    timers = DeadlineScheduler(store)
+    restore_timers(timers, store, args)
+    if timers.get("pause_end") and timers.get("pause_end") > now:
+        pause_until = timers.get("pause_end")
+    ensure_dir(args.schedule.parent)
+    watch_paths = [args.schedule] + list(store.paths.values())
+    if db is not None:
+        # Every commit to the store touches its WAL, from either process.
+        watch_paths.append(db.wal_path)
+    watcher = logio.FileWatcher(
+        [events_log, activity_log, overlay_actions_log] + watch_paths,
+        backend=args.watch,
+    )
+    print(f"runner: file watcher {watcher.name}")
+    plans = PlanExecutor(
+        planner, args.plan_workers, args.plan_timeout or None, wake=watcher.wake
+    )
+    plan_cache = None
+    if not args.no_plan_cache:
+        plan_cache = PlanCache(
+            args.plan_cache,
+            capacity=args.plan_cache_size,
+            ttl=args.plan_cache_ttl,
+            max_hits=args.plan_cache_max_hits,
+            variants=args.plan_cache_variants,
+        )
+    prefetcher = None if args.no_prefetch else Prefetcher(plans)
+    coalescer = EventCoalescer(args.coalesce_ms / 1000.0, args.event_max_age)
+
     print("Runner active. Watching for events.")
     start_time = dt.datetime.now()
+    if args.max_seconds > 0:
+        timers.set(
+            "max_seconds",
+            start_time + dt.timedelta(seconds=args.max_seconds),
+            persist=False,
+        )
+    timers.set(
+        "day_rollover",
+        dt.datetime.combine(current_day + dt.timedelta(days=1), dt.time()),
+        persist=False,
+    )
 
     prune_logs(args.activity_log.parent, args.activity_log.stem, args.log_keep_days)
     prune_logs(args.events_log.parent, args.events_log.stem, args.log_keep_days)
@@ -684,21 +2001,31 @@ def main() -> int:
         args.overlay_actions.parent, args.overlay_actions.stem, args.log_keep_days
     )
     prune_logs(speech_log.parent, "speech", args.log_keep_days)
+    if db is not None:
+        db.prune(args.log_keep_days)
 
-    current_block_path = Path("coach/state/current_block.json")
     goals_path = Path("coach/state/goals.json")
+    acted_cmds: deque = deque(maxlen=64)
 
     while True:
+        for writer in logs.values():
+            writer.commit()
         actions_offset, action_lines = tail_file(overlay_actions_log, actions_offset)
+        if db is not None and action_lines:
+            # The overlay only writes NDJSON; copy its new rows into the store.
+            db.import_file("overlay_actions", overlay_actions_log)
         for line in action_lines:
             try:
                 action = json.loads(line)
             except json.JSONDecodeError:
                 continue
+            if action.get("type") == "OVERLAY_ACTION" and action.get("cmd_id"):
+                acted_cmds.append(action["cmd_id"])
             if action.get("action") == "pause_15":
                 pause_until = dt.datetime.now() + dt.timedelta(minutes=args.pause_mins)
+                timers.set("pause_end", pause_until)
             if action.get("action") == "align_choice":
-                align_state = read_alignment(args.align_state)
+                align_state = read_alignment(store)
                 qid = action.get("question_id")
                 if qid:
                     align_state["answers"][qid] = action.get("value")
@@ -708,9 +2035,9 @@ def main() -> int:
                         break
                 else:
                     align_state["step"] = len(ALIGN_QUESTIONS)
-                write_json(args.align_state, align_state)
+                store.set("align_state", align_state)
                 append_event(
-                    events_log,
+                    logs["events"],
                     {
                         "ts": dt.datetime.now().isoformat(),
                         "type": "ALIGN_ANSWER",
@@ -720,17 +2047,16 @@ def main() -> int:
                         "source": "overlay",
                     },
                 )
-                last_align_prompt = None
-                write_json(
-                    Path("coach/state/align_prompted.json"),
+                store.set(
+                    "align_prompted",
                     {"question_id": None, "prompted_at": None},
                 )
+                timers.cancel("align_reprompt")
             if action.get("action") == "back_on_track":
-                habit_state_path = Path("coach/state/last_habit.json")
-                habit_state = read_habit_state(habit_state_path)
-                schedule = read_schedule(args.schedule) or {"blocks": []}
+                habit_state = read_habit_state(store)
+                schedule = load_schedule(args.schedule)
                 current = (
-                    current_block(schedule, dt.datetime.now()) if schedule else None
+                    schedule.current_block(dt.datetime.now()) if schedule else None
                 )
                 if (
                     current
@@ -740,7 +2066,7 @@ def main() -> int:
                     and not habit_state.get("done")
                 ):
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": dt.datetime.now().isoformat(),
                             "type": "HABIT_DONE",
@@ -749,10 +2075,11 @@ def main() -> int:
                         },
                     )
                     habit_state["done"] = True
-                    write_json(habit_state_path, habit_state)
+                    store.set("last_habit", habit_state)
+                    timers.cancel("habit_escalate")
                 else:
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": dt.datetime.now().isoformat(),
                             "type": "NUDGE_ACK",
@@ -766,21 +2093,20 @@ def main() -> int:
                     if args.schedule.exists()
                     else ""
                 )
-                schedule = read_schedule(args.schedule) or {"blocks": []}
-                remaining = remaining_blocks(schedule, dt.datetime.now())
-                activity_tail = read_tail_lines(activity_log, 5)
-                off_state = read_off_schedule_state(
-                    Path("coach/state/off_schedule_state.json")
-                )
-                current_block_state = read_current_block_state(
-                    Path("coach/state/current_block.json")
+                compiled = load_schedule(args.schedule)
+                schedule = compiled.data if compiled else {"blocks": []}
+                remaining = (
+                    compiled.remaining_blocks(dt.datetime.now()) if compiled else []
                 )
+                activity_tail = read_log_tail(db, "activity", activity_log, 5)
+                off_state = read_off_schedule_state(store)
+                current_block_state = read_current_block_state(store)
                 recover_context = {
                     "now": dt.datetime.now().isoformat(),
                     "remaining_blocks": remaining,
                     "activity_tail": activity_tail,
                     "off_schedule_state": off_state,
-                    "last_habit": read_habit_state(Path("coach/state/last_habit.json")),
+                    "last_habit": read_habit_state(store),
                     "current_block": current_block_state,
                 }
                 Path("coach/state/recover_context.json").write_text(
@@ -791,9 +2117,12 @@ def main() -> int:
                     "RECOVER_MODE: Update schedule YAML based on remaining blocks. "
                     "Overlay must state what changed."
                 )
-                response = call_coach_plan(
+                # The planner reads the state files it is handed.
+                store.flush()
+                plans.submit(
+                    "recover",
                     recover_prompt,
-                    files=[
+                    [
                         args.schedule,
                         Path("coach/state/recover_context.json"),
                         Path("coach/state/now.json"),
@@ -802,57 +2131,18 @@ def main() -> int:
                         Path("coach/state/current_block.json"),
                         goals_path,
                     ],
+                    {"schedule": schedule, "schedule_before": schedule_before},
                 )
-                revised_yaml = None
-                if isinstance(response, dict):
-                    revised_yaml = response.get("revised_schedule_yaml")
-                if not revised_yaml and schedule.get("blocks"):
-                    revised_yaml = apply_recover_fallback(schedule, dt.datetime.now())
-                if revised_yaml:
-                    args.schedule.write_text(revised_yaml, encoding="utf-8")
-                    append_event(
-                        events_log,
-                        {
-                            "ts": dt.datetime.now().isoformat(),
-                            "type": "SCHEDULE_UPDATED",
-                            "event_id": ensure_uuid(),
-                            "source": "runner",
-                        },
-                    )
-                    overlay = (
-                        response.get("overlay") if isinstance(response, dict) else None
-                    )
-                    if isinstance(overlay, dict):
-                        overlay_payload = {
-                            "ts": dt.datetime.now().isoformat(),
-                            "cmd_id": ensure_uuid(),
-                            "source_event_id": None,
-                            "source": "runner",
-                            **overlay,
-                        }
-                    else:
-                        overlay_payload = {
-                            "ts": dt.datetime.now().isoformat(),
-                            "cmd_id": ensure_uuid(),
-                            "source_event_id": None,
-                            "source": "runner",
-                            "level": "B",
-                            "style_id": "calm",
-                            "headline": "New plan accepted",
-                            "human_line": "Schedule updated.",
-                            "diagnosis": "",
-                            "next_action": "Resume the next block.",
-                            "block_id": None,
-                            "block_name": "",
-                        }
-                    append_overlay_cmd(overlay_cmd_log, overlay_payload)
-                    Path("coach/state/schedule.before.yaml").write_text(
-                        schedule_before, encoding="utf-8"
-                    )
 
         now = dt.datetime.now()
+        timers.pop_due(now)
         if now.date() != current_day:
             current_day = now.date()
+            timers.set(
+                "day_rollover",
+                dt.datetime.combine(current_day + dt.timedelta(days=1), dt.time()),
+                persist=False,
+            )
             events_log = daily_log_path(args.events_log, now)
             activity_log = daily_log_path(args.activity_log, now)
             overlay_actions_log = daily_log_path(args.overlay_actions, now)
@@ -871,24 +2161,61 @@ def main() -> int:
                 overlay_cmd_log.write_text("", encoding="utf-8")
             if not speech_log.exists():
                 speech_log.write_text("", encoding="utf-8")
+            watcher.watch([events_log, activity_log, overlay_actions_log] + watch_paths)
+
+        for call in plans.completed():
+            if call.key.startswith("prefetch:"):
+                if prefetcher is not None:
+                    prefetcher.complete(call)
+                continue
+            if call.started is not None:
+                tracer.span(
+                    (call.context.get("event") or {}).get("trace_id"),
+                    "coach_plan",
+                    call.started,
+                    call.finished,
+                    key=call.key,
+                    ok=call.response is not None,
+                )
+            if call.key == "recover":
+                apply_recover_result(args, logs, overlay_cmd_log, call)
+            elif pause_until and now < pause_until:
+                print(f"runner: dropped coach_plan result {call.key} while paused")
+            else:
+                stale = stale_refinement(call, acted_cmds, logs["overlay_history"])
+                if stale:
+                    print(f"runner: dropped coach_plan refinement {call.key} ({stale})")
+                elif apply_plan_result(args, logs, overlay_cmd_log, call, tracer):
+                    # Only an answered call counts toward cooldown and the cap.
+                    last_nudge = dt.datetime.now()
+                    nudge_times.append(last_nudge)
+            cache_key = call.context.get("cache_key")
+            if plan_cache is not None and cache_key and call.response:
+                plan_cache.admit(cache_key, call.response)
+                plan_cache.save(min_interval=30)
 
         if pause_until and now < pause_until:
-            time.sleep(0.5)
+            wait_for_work(watcher, store, timers, args)
             continue
 
-        schedule = read_schedule(args.schedule)
+        schedule = load_schedule(args.schedule)
+        transition = None
+        if schedule and schedule.is_today():
+            transition = schedule.next_transition(now)
+        if transition:
+            timers.set("schedule_transition", transition, persist=False)
+        else:
+            timers.cancel("schedule_transition")
 
-        if schedule and is_today(schedule):
-            block = current_block(schedule, now)
-            habit_state_path = Path("coach/state/last_habit.json")
-            off_state_path = Path("coach/state/off_schedule_state.json")
+        if schedule and schedule.is_today():
+            block = schedule.current_block(now)
 
             if block:
-                current_state = read_current_block_state(current_block_path)
+                current_state = read_current_block_state(store)
                 if current_state.get("block_id") != block.get("id"):
                     if current_state.get("block_id"):
                         append_event(
-                            events_log,
+                            logs["events"],
                             {
                                 "ts": now.isoformat(),
                                 "type": "BLOCK_END",
@@ -899,7 +2226,7 @@ def main() -> int:
                             },
                         )
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": now.isoformat(),
                             "type": "BLOCK_START",
@@ -917,7 +2244,9 @@ def main() -> int:
                             f"Begin {block.get('title', 'work')}",
                             block.get("intent", "Start now"),
                         )
-                        append_overlay_cmd(overlay_cmd_log, overlay_payload)
+                        append_overlay_cmd(
+                            overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                        )
                     elif block.get("type") == "habit":
                         overlay_payload = block_overlay_payload(
                             block,
@@ -926,9 +2255,11 @@ def main() -> int:
                             block.get("title", "Habit"),
                             block.get("intent", "Do it now"),
                         )
-                        append_overlay_cmd(overlay_cmd_log, overlay_payload)
-                    write_json(
-                        current_block_path,
+                        append_overlay_cmd(
+                            overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                        )
+                    store.set(
+                        "current_block",
                         {
                             "block_id": block.get("id"),
                             "block_type": block.get("type"),
@@ -936,10 +2267,10 @@ def main() -> int:
                         },
                     )
             else:
-                current_state = read_current_block_state(current_block_path)
+                current_state = read_current_block_state(store)
                 if current_state.get("block_id"):
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": now.isoformat(),
                             "type": "BLOCK_END",
@@ -949,16 +2280,16 @@ def main() -> int:
                             "source": "runner",
                         },
                     )
-                    write_json(
-                        current_block_path,
+                    store.set(
+                        "current_block",
                         {"block_id": None, "block_type": None, "block_name": None},
                     )
 
             if block and block.get("type") == "habit":
-                habit_state = read_habit_state(habit_state_path)
+                habit_state = read_habit_state(store)
                 if habit_state.get("block_id") != block.get("id"):
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": now.isoformat(),
                             "type": "HABIT_DUE",
@@ -971,8 +2302,8 @@ def main() -> int:
                             "source": "runner",
                         },
                     )
-                    write_json(
-                        habit_state_path,
+                    store.set(
+                        "last_habit",
                         {
                             "block_id": block.get("id"),
                             "due_at": now.isoformat(),
@@ -980,41 +2311,40 @@ def main() -> int:
                             "done": False,
                         },
                     )
-                else:
-                    due_at = habit_state.get("due_at")
-                    if (
-                        due_at
-                        and not habit_state.get("done")
-                        and not habit_state.get("escalated")
-                    ):
-                        try:
-                            due_time = dt.datetime.fromisoformat(due_at)
-                            if (now - due_time).total_seconds() >= 120:
-                                append_event(
-                                    events_log,
-                                    {
-                                        "ts": now.isoformat(),
-                                        "type": "HABIT_ESCALATE",
-                                        "event_id": ensure_uuid(),
-                                        "block_id": block.get("id"),
-                                        "block_name": block.get("title"),
-                                        "habit_kind": block.get("habit_kind"),
-                                        "message": f"{block.get('title')} overdue.",
-                                        "next_action": block.get("intent", "Do it now"),
-                                        "source": "runner",
-                                    },
-                                )
-                                habit_state["escalated"] = True
-                                write_json(habit_state_path, habit_state)
-                        except ValueError:
-                            pass
+                    timers.set(
+                        "habit_escalate",
+                        now + HABIT_ESCALATE_AFTER,
+                        {"block_id": block.get("id")},
+                    )
+                elif (
+                    habit_state.get("due_at")
+                    and not habit_state.get("done")
+                    and not habit_state.get("escalated")
+                    and not timers.pending("habit_escalate")
+                ):
+                    append_event(
+                        logs["events"],
+                        {
+                            "ts": now.isoformat(),
+                            "type": "HABIT_ESCALATE",
+                            "event_id": ensure_uuid(),
+                            "block_id": block.get("id"),
+                            "block_name": block.get("title"),
+                            "habit_kind": block.get("habit_kind"),
+                            "message": f"{block.get('title')} overdue.",
+                            "next_action": block.get("intent", "Do it now"),
+                            "source": "runner",
+                        },
+                    )
+                    habit_state["escalated"] = True
+                    store.set("last_habit", habit_state)
             if block and block.get("type") in ["coding", "research", "admin"]:
-                last_activity = read_last_activity(activity_log)
+                last_activity = read_last_activity(activity_log, db)
                 if last_activity and last_activity.get("status") == "off_task":
-                    off_state = read_off_schedule_state(off_state_path)
+                    off_state = read_off_schedule_state(store)
                     if off_state.get("block_id") != block.get("id"):
                         append_event(
-                            events_log,
+                            logs["events"],
                             {
                                 "ts": now.isoformat(),
                                 "type": "OFF_SCHEDULE",
@@ -1024,8 +2354,8 @@ def main() -> int:
                                 "source": "runner",
                             },
                         )
-                        write_json(
-                            off_state_path,
+                        store.set(
+                            "off_schedule_state",
                             {
                                 "block_id": block.get("id"),
                                 "since": now.isoformat(),
@@ -1033,30 +2363,33 @@ def main() -> int:
                                 "recover_triggered": False,
                             },
                         )
-                    else:
-                        since = off_state.get("since")
-                        if since and not off_state.get("recover_triggered"):
-                            try:
-                                since_time = dt.datetime.fromisoformat(since)
-                                if (now - since_time).total_seconds() >= 600:
-                                    append_event(
-                                        events_log,
-                                        {
-                                            "ts": now.isoformat(),
-                                            "type": "RECOVER_TRIGGER",
-                                            "event_id": ensure_uuid(),
-                                            "block_id": block.get("id"),
-                                            "block_name": block.get("title"),
-                                            "source": "runner",
-                                        },
-                                    )
-                                    off_state["recover_triggered"] = True
-                                    write_json(off_state_path, off_state)
-                            except ValueError:
-                                pass
+                        timers.set(
+                            "recover_trigger",
+                            now + RECOVER_AFTER,
+                            {"block_id": block.get("id")},
+                        )
+                    elif (
+                        off_state.get("since")
+                        and not off_state.get("recover_triggered")
+                        and not timers.pending("recover_trigger")
+                    ):
+                        append_event(
+                            logs["events"],
+                            {
+                                "ts": now.isoformat(),
+                                "type": "RECOVER_TRIGGER",
+                                "event_id": ensure_uuid(),
+                                "block_id": block.get("id"),
+                                "block_name": block.get("title"),
+                                "source": "runner",
+                            },
+                        )
+                        off_state["recover_triggered"] = True
+                        store.set("off_schedule_state", off_state)
                 elif last_activity and last_activity.get("status") == "on_task":
-                    write_json(
-                        off_state_path,
+                    timers.cancel("recover_trigger")
+                    store.set(
+                        "off_schedule_state",
                         {
                             "block_id": None,
                             "since": None,
@@ -1066,7 +2399,7 @@ def main() -> int:
                     )
 
         if schedule_needs_alignment(args.schedule):
-            align_state = read_alignment(args.align_state)
+            align_state = read_alignment(store)
             step = align_state.get("step", 0)
             if step >= len(ALIGN_QUESTIONS):
                 schedule_yaml = build_daily_schedule(align_state.get("answers", {}))
@@ -1074,7 +2407,7 @@ def main() -> int:
                     args.schedule.parent.mkdir(parents=True, exist_ok=True)
                     args.schedule.write_text(schedule_yaml, encoding="utf-8")
                     append_event(
-                        events_log,
+                        logs["events"],
                         {
                             "ts": now.isoformat(),
                             "type": "SCHEDULE_COMMITTED",
@@ -1082,30 +2415,21 @@ def main() -> int:
                             "source": "runner",
                         },
                     )
-                    args.align_state.unlink(missing_ok=True)
+                    store.delete("align_state")
                     continue
-                time.sleep(0.5)
+                wait_for_work(watcher, store, timers, args)
                 continue
 
-            align_prompted_path = Path("coach/state/align_prompted.json")
-            align_prompted = read_align_prompted(align_prompted_path)
-            if align_prompted.get("question_id") == ALIGN_QUESTIONS[step]["id"]:
-                prompted_at_value = align_prompted.get("prompted_at")
-                if prompted_at_value:
-                    try:
-                        prompted_at = dt.datetime.fromisoformat(prompted_at_value)
-                        if (
-                            now - prompted_at
-                        ).total_seconds() < args.align_min_interval:
-                            time.sleep(0.5)
-                            continue
-                    except ValueError:
-                        pass
+            align_prompted = read_align_prompted(store)
+            prompted = align_prompted.get("question_id") == ALIGN_QUESTIONS[step]["id"]
+            if prompted and timers.pending("align_reprompt"):
+                wait_for_work(watcher, store, timers, args)
+                continue
 
             question = ALIGN_QUESTIONS[step]
 
             append_event(
-                events_log,
+                logs["events"],
                 {
                     "ts": now.isoformat(),
                     "type": "ALIGN_REQUIRED",
@@ -1132,17 +2456,95 @@ def main() -> int:
                 "choices": question["choices"],
                 "question_id": question["id"],
             }
-            append_overlay_cmd(overlay_cmd_log, overlay_payload)
-            write_json(args.align_state, align_state)
-            write_json(
-                align_prompted_path,
+            append_overlay_cmd(
+                overlay_cmd_log, overlay_payload, logs["overlay_history"]
+            )
+            store.set("align_state", align_state)
+            store.set(
+                "align_prompted",
                 {"question_id": question["id"], "prompted_at": now.isoformat()},
             )
-            last_align_prompt = now
-            time.sleep(0.5)
+            timers.set(
+                "align_reprompt", now + dt.timedelta(seconds=args.align_min_interval)
+            )
+            wait_for_work(watcher, store, timers, args)
             continue
 
-        events_offset, event_lines = tail_file(events_log, events_offset)
+        if prefetcher is not None:
+            prefetcher.sweep(now)
+            upcoming = []
+            if schedule and schedule.is_today():
+                transition = schedule.next_transition(now)
+                lead = dt.timedelta(seconds=args.prefetch_lead)
+                if transition and transition - now <= lead:
+                    block = schedule.current_block(transition)
+                    if block:
+                        upcoming.append(
+                            (
+                                {
+                                    "ts": transition.isoformat(),
+                                    "type": "BLOCK_START",
+                                    "event_id": None,
+                                    "block_id": block.get("id"),
+                                    "block_name": block.get("title"),
+                                    "source": "runner",
+                                },
+                                transition + dt.timedelta(seconds=120),
+                            )
+                        )
+            recent = read_log_tail(db, "activity", activity_log, 5)
+            rising = drift_rising(
+                recent,
+                args.prefetch_drift_score,
+                read_log_last_row(db, "events", events_log),
+            )
+            if rising:
+                upcoming.append(
+                    (
+                        {
+                            "ts": rising.get("ts") or now.isoformat(),
+                            "type": "DRIFT_START",
+                            "event_id": None,
+                            "block_id": rising.get("block_id"),
+                            "app": rising.get("app"),
+                            "confidence": rising.get("confidence"),
+                            "reason": rising.get("reason"),
+                            "source": "monitor",
+                        },
+                        now + dt.timedelta(seconds=args.prefetch_ttl),
+                    )
+                )
+            for predicted, expires_at in upcoming:
+                key = plan_key(predicted)
+                trigger = str(predicted["ts"])
+                if not prefetcher.want(key, trigger, now) or key in plans.inflight:
+                    continue
+                if plan_cache is not None and plan_cache.has(
+                    plan_cache.key(predicted, recent)
+                ):
+                    continue
+                prefetcher.issue(
+                    key,
+                    trigger,
+                    expires_at,
+                    build_plan_request(
+                        predicted,
+                        json.dumps(predicted, ensure_ascii=True),
+                        recent,
+                        activity_log,
+                        overlay_actions_log,
+                        db,
+                    ),
+                )
+
+        logs["events"].commit()
+        read_started = time.time()
+        if db is not None:
+            events_offset, event_lines = db.read_after(
+                "events", events_offset, current_day
+            )
+        else:
+            events_offset, event_lines = tail_file(events_log, events_offset)
         if event_lines:
             print(f"runner: read {len(event_lines)} event(s)")
         for event_line in event_lines:
@@ -1151,6 +2553,15 @@ def main() -> int:
             except json.JSONDecodeError:
                 continue
 
+            # Reading and parsing the new lines; the monitor's own spans cover
+            # the time before the event was written.
+            tracer.span(
+                event.get("trace_id"),
+                "event_read",
+                read_started,
+                event_type=event.get("type"),
+            )
+
             if event.get("type") not in EVENT_TYPES:
                 continue
 
@@ -1170,7 +2581,9 @@ def main() -> int:
                     "block_id": event.get("block_id"),
                     "block_name": event.get("block_name", ""),
                 }
-                append_overlay_cmd(overlay_cmd_log, overlay_payload)
+                append_overlay_cmd(
+                    overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                )
                 print("runner: OFF_SCHEDULE overlay queued")
                 continue
 
@@ -1190,7 +2603,9 @@ def main() -> int:
                     "block_id": event.get("block_id"),
                     "block_name": event.get("block_name", ""),
                 }
-                append_overlay_cmd(overlay_cmd_log, overlay_payload)
+                append_overlay_cmd(
+                    overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                )
                 continue
 
             if event.get("type") == "HABIT_ESCALATE":
@@ -1209,9 +2624,20 @@ def main() -> int:
                     "block_id": event.get("block_id"),
                     "block_name": event.get("block_name", ""),
                 }
-                append_overlay_cmd(overlay_cmd_log, overlay_payload)
+                append_overlay_cmd(
+                    overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                )
                 continue
 
+            coalescer.add(event, event_line, dt.datetime.now())
+
+        ready = coalescer.ready(dt.datetime.now())
+        summary = coalescer.report()
+        if summary:
+            print(f"runner: coalesced events: {summary}")
+        if ready or summary:
+            store.set("runner_stats", runner_stats(coalescer, prefetcher))
+        for event, event_line in ready:
             print(f"runner: event {event.get('type')} id={event.get('event_id')}")
 
             now = dt.datetime.now()
@@ -1228,103 +2654,118 @@ def main() -> int:
                 if len(nudge_times) >= args.max_per_hour:
                     continue
 
-            activity_tail = read_tail_lines(activity_log, 5)
-            now_payload = read_json(Path("coach/state/now.json")) or {}
-            last_action_lines = read_tail_lines(overlay_actions_log, 1)
-            last_action = None
-            if last_action_lines:
-                try:
-                    last_action = json.loads(last_action_lines[0])
-                except json.JSONDecodeError:
-                    last_action = None
-
-            context_payload = {
-                "event": event,
-                "activity_tail": activity_tail,
-                "now": now_payload,
-                "last_overlay_action": last_action,
-            }
-            Path("coach/runner_context.json").write_text(
-                json.dumps(context_payload, ensure_ascii=True, indent=2),
-                encoding="utf-8",
-            )
-
-            prompt = build_prompt(event_line, activity_tail, now_payload, last_action)
-            if event.get("type") in ["DRIFT_START", "DRIFT_PERSIST"]:
-                prompt = "Force level B overlay for drift.\n" + prompt
-            response = call_coach_plan(
-                prompt,
-                files=[
-                    Path("coach/state/now.json"),
-                    activity_log,
-                    overlay_actions_log,
-                    Path("coach/runner_context.json"),
-                    goals_path,
-                ],
-            )
-            source_event_id = event.get("event_id")
-            if source_event_id is None:
-                print("runner: event missing event_id")
-            if not response:
-                print("runner: no response from coach_plan")
+            activity_tail = read_log_tail(db, "activity", activity_log, 5)
+            prefetched = None
+            if prefetcher is not None:
+                prefetched = prefetcher.take(plan_key(event), now)
+                store.set("runner_stats", runner_stats(coalescer, prefetcher))
+            if prefetched is not None:
+                print(f"runner: using prefetched coach_plan for {plan_key(event)}")
+                plans.cancel(plan_key(event))
+                call = PlanCall(
+                    plan_key(event), "", [], {"event": event, "plan_source": "prefetch"}
+                )
+                call.response = prefetched
+                if apply_plan_result(args, logs, overlay_cmd_log, call, tracer):
+                    last_nudge = dt.datetime.now()
+                    nudge_times.append(last_nudge)
+                if plan_cache is not None:
+                    plan_cache.admit(plan_cache.key(event, activity_tail), prefetched)
                 continue
 
-            overlay = response.get("overlay")
-            if isinstance(overlay, dict):
-                if event.get("type") in ["DRIFT_START", "DRIFT_PERSIST"]:
-                    overlay = dict(overlay)
-                    overlay["level"] = "B"
-                cmd_id = ensure_uuid()
-                source_event_id = event.get("event_id")
-                overlay_payload = {
-                    "ts": dt.datetime.now().isoformat(),
-                    "cmd_id": cmd_id,
-                    "source_event_id": source_event_id,
-                    "source_event_type": event.get("type"),
-                    "source": "runner",
-                    **overlay,
-                }
-                append_overlay_cmd(overlay_cmd_log, overlay_payload)
-                print(
-                    f"runner: wrote overlay command source_event_id={source_event_id}"
+            cache_key = None
+            if plan_cache is not None:
+                cache_key = plan_cache.key(event, activity_tail)
+                cached = plan_cache.lookup(cache_key)
+                if cached is not None:
+                    print(f"runner: coach_plan cache hit {plan_key(event)}")
+                    plans.cancel(plan_key(event))
+                    call = PlanCall(
+                        plan_key(event),
+                        "",
+                        [],
+                        {"event": event, "plan_source": "cache"},
+                    )
+                    call.response = cached
+                    if apply_plan_result(args, logs, overlay_cmd_log, call, tracer):
+                        last_nudge = dt.datetime.now()
+                        nudge_times.append(last_nudge)
+                    plan_cache.save(min_interval=30)
+                    continue
+
+            parent_cmd_id = None
+            if not args.no_instant_overlay and event.get("type") in [
+                "DRIFT_START",
+                "DRIFT_PERSIST",
+            ]:
+                overlay_payload = drift_overlay_payload(
+                    event, read_current_block_state(store), read_goals(goals_path)
                 )
+                overlay_payload["trace_id"] = event.get("trace_id")
+                with tracer.measure(
+                    event.get("trace_id"),
+                    "overlay_cmd",
+                    cmd_id=overlay_payload["cmd_id"],
+                    phase="instant",
+                    plan_source="template",
+                ):
+                    append_overlay_cmd(
+                        overlay_cmd_log, overlay_payload, logs["overlay_history"]
+                    )
+                parent_cmd_id = overlay_payload["cmd_id"]
+                print(f"runner: wrote instant drift overlay cmd_id={parent_cmd_id}")
 
-            hud_text = response.get("hud_text", "")
-            if isinstance(hud_text, str) and hud_text.strip():
-                args.hud.write_text(hud_text, encoding="utf-8")
+            context = {
+                "event": event,
+                "cache_key": cache_key,
+                "parent_cmd_id": parent_cmd_id,
+            }
+            if prefetcher is not None:
+                adopted = prefetcher.adopt(plan_key(event), context)
+                if adopted is not None:
+                    print(f"runner: adopted in-flight prefetch for {plan_key(event)}")
+                    store.set("runner_stats", runner_stats(coalescer, prefetcher))
+                    continue
 
-            speech_text = response.get("speech_text")
-            if voice and isinstance(speech_text, str) and speech_text.strip():
-                print(f"runner: voice speak: {speech_text}")
-                append_ndjson(
-                    speech_log,
-                    {
-                        "ts": dt.datetime.now().isoformat(),
-                        "event_id": event.get("event_id"),
-                        "event_type": event.get("type"),
-                        "speech_text": speech_text,
-                        "headline": overlay.get("headline") if isinstance(overlay, dict) else None,
-                        "block_id": overlay.get("block_id") if isinstance(overlay, dict) else None,
-                        "block_name": overlay.get("block_name") if isinstance(overlay, dict) else None,
-                    },
+            with tracer.measure(event.get("trace_id"), "context_build"):
+                prompt, files, context_path = build_plan_request(
+                    event,
+                    event_line,
+                    activity_tail,
+                    activity_log,
+                    overlay_actions_log,
+                    db,
                 )
-                voice.speak(speech_text, intensity="urgent")
-
-            last_nudge = dt.datetime.now()
-            nudge_times.append(last_nudge)
+            plans.submit(plan_key(event), prompt, files, context, [context_path])
 
         if (
             args.max_seconds > 0
             and (dt.datetime.now() - start_time).total_seconds() >= args.max_seconds
         ):
-            if args.align_state.exists() and not args.schedule.exists():
+            if store.get("align_state") is not None and not args.schedule.exists():
                 start_time = dt.datetime.now()
+                timers.set(
+                    "max_seconds",
+                    start_time + dt.timedelta(seconds=args.max_seconds),
+                    persist=False,
+                )
             else:
                 print("Runner exiting after max-seconds")
                 break
 
-        time.sleep(0.5)
-
+        wait_for_work(watcher, store, timers, args, coalescer.next_due())
+
+    plans.close()
+    if voice:
+        voice.close()
+    if plan_cache is not None:
+        plan_cache.save()
+    for writer in logs.values():
+        writer.close()
+    if db is not None:
+        db.close()
+    store.flush()
+    watcher.close()
     return 0
 
 
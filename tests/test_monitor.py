@@ -0,0 +1,81 @@
+import argparse
+import datetime as dt
+import json
+import queue
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import logio  # noqa: E402
+import monitor  # noqa: E402
+import tracing  # noqa: E402
+
+
+class Recorder:
+    # Stands in for the sampling scheduler and the frame ring.
+    def observe(self, row: dict) -> None:
+        pass
+
+    def set_verdict(self, slot: int, now: dt.datetime, status: str) -> None:
+        pass
+
+
+def make_job(seq: int, source: str, **fields) -> dict:
+    job = {
+        "seq": seq,
+        "trace_id": f"t{seq}",
+        "ts": dt.datetime(2026, 1, 5, 9, 0, seq),
+        "app": "Code",
+        "title": "main.py",
+        "url_domain": None,
+        "probe_ms": 1.0,
+        "slot": seq,
+        "frame": Path(f"frame_{seq}.jpg"),
+        "bytes_written": 0,
+        "bytes_uploaded": 0,
+        "now_file": None,
+        "screen_ok": True,
+        "frame_hash": seq,
+        "frame_distance": None,
+        "reuse_of": None,
+        "verdict_source": source,
+        "monitor_out": None,
+        "error_reason": "",
+    }
+    job.update(fields)
+    return job
+
+
+def test_reused_frame_of_failed_anchor_is_logged(tmp_path):
+    logs = {
+        name: logio.NdjsonWriter(tmp_path / f"{name}.ndjson", policy="row")
+        for name in ("summaries", "activity", "events")
+    }
+    ctx = {
+        "db": None,
+        "dedup": {"lock": threading.Lock(), "anchor": None},
+        "cache": None,
+        "scheduler": Recorder(),
+        "ring": Recorder(),
+        "logs": logs,
+        "tracer": tracing.Tracer(None, "monitor"),
+    }
+    args = argparse.Namespace(block_id="b1")
+    results: queue.Queue = queue.Queue()
+    results.put(make_job(1, "classifier", error_reason="coach_monitor_exit_1"))
+    results.put(make_job(2, "reused", reuse_of=1, frame_distance=0))
+    results.put(None)
+    monitor.emit_worker(args, results, ctx)
+    for writer in logs.values():
+        writer.close()
+
+    day = dt.date(2026, 1, 5)
+    path = logio.log_path_for_day(tmp_path / "activity.ndjson", day)
+    rows = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [row["verdict_source"] for row in rows] == ["classifier", "reused"]
+    reused = rows[1]
+    assert reused["status"] == "unsure"
+    assert reused["drop_reason"] == "anchor verdict unavailable"
+    assert rows[0]["drop_reason"] is None
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import json
+import math
+import sys
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    from coach import logdb, logio
+except ImportError:
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+    try:
+        from coach import logdb, logio
+    except ImportError:
+        import logdb
+        import logio
+
+TRACE_LOG = Path("coach/logs/trace.ndjson")
+OVERLAY_ACTIONS_LOG = Path("coach/logs/overlay_actions.ndjson")
+PERCENTILES = (50, 95, 99)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+class Tracer:
+    # One row per finished span. The trace_id is minted at capture time and
+    # rides on the activity row, the event and the overlay command, so runner
+    # spans join the monitor spans of the frame that caused them. Without a
+    # writer every call is a no-op.
+    def __init__(self, writer: Optional[logio.NdjsonWriter], service: str) -> None:
+        self.writer = writer
+        self.service = service
+
+    def span(
+        self,
+        trace_id: Optional[str],
+        stage: str,
+        start: float,
+        end: Optional[float] = None,
+        **attrs,
+    ) -> None:
+        if self.writer is None or not trace_id:
+            return
+        end = time.time() if end is None else end
+        started = dt.datetime.fromtimestamp(start)
+        row = {
+            "ts": started.isoformat(),
+            "trace_id": trace_id,
+            "service": self.service,
+            "stage": stage,
+            "duration_ms": round(max(0.0, end - start) * 1000.0, 1),
+        }
+        row.update({key: value for key, value in attrs.items() if value is not None})
+        self.writer.write(row, now=started)
+
+    @contextmanager
+    def measure(self, trace_id: Optional[str], stage: str, **attrs) -> Iterator[dict]:
+        # Attributes added to the yielded dict inside the block land on the span.
+        start = time.time()
+        try:
+            yield attrs
+        finally:
+            self.span(trace_id, stage, start, **attrs)
+
+
+def read_rows(path: Path) -> List[dict]:
+    rows = []
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(row, dict):
+                    rows.append(row)
+    except OSError:
+        pass
+    return rows
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def parse_ts(value) -> Optional[float]:
+    try:
+        return dt.datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def stage_durations(spans: List[dict], actions: List[dict]) -> Dict[str, List[float]]:
+    # Per-stage span durations, plus end-to-end rows derived per trace:
+    # capture start to overlay command, and on to the user's overlay action
+    # (joined on cmd_id with the overlay's time_to_action_ms).
+    durations: Dict[str, List[float]] = defaultdict(list)
+    trace_start: Dict[str, float] = {}
+    overlay_end: Dict[str, float] = {}
+    cmd_traces: Dict[str, str] = {}
+    for row in spans:
+        duration = row.get("duration_ms")
+        start = parse_ts(row.get("ts"))
+        trace_id = row.get("trace_id")
+        if not isinstance(duration, (int, float)) or start is None or not trace_id:
+            continue
+        durations[f"{row.get('service')}.{row.get('stage')}"].append(float(duration))
+        if row.get("stage") == "speech" and row.get("first_audio_ms") is not None:
+            # Split by backend and playback mode so streamed and full-file
+            # clips, and each engine, compare.
+            mode = f"{row.get('backend')}.{row.get('mode')}"
+            durations[f"speech.first_audio.{mode}"].append(
+                float(row["first_audio_ms"])
+            )
+        trace_start[trace_id] = min(start, trace_start.get(trace_id, start))
+        if row.get("stage") == "overlay_cmd":
+            end = start + duration / 1000.0
+            # The first overlay a trace produced is what the user saw first.
+            if trace_id not in overlay_end or end < overlay_end[trace_id]:
+                overlay_end[trace_id] = end
+            if row.get("cmd_id"):
+                cmd_traces.setdefault(row["cmd_id"], trace_id)
+    for trace_id, end in overlay_end.items():
+        durations["total.capture_to_overlay"].append(
+            round((end - trace_start[trace_id]) * 1000.0, 1)
+        )
+    for action in actions:
+        if action.get("type") != "OVERLAY_ACTION":
+            continue
+        time_to_action = action.get("time_to_action_ms")
+        if not isinstance(time_to_action, (int, float)):
+            continue
+        durations["overlay.time_to_action"].append(float(time_to_action))
+        trace_id = cmd_traces.get(action.get("cmd_id"))
+        if trace_id is not None:
+            shown = (overlay_end[trace_id] - trace_start[trace_id]) * 1000.0
+            durations["total.capture_to_action"].append(
+                round(shown + float(time_to_action), 1)
+            )
+    return durations
+
+
+def format_report(day: dt.date, durations: Dict[str, List[float]]) -> str:
+    lines = [day.isoformat()]
+    if not durations:
+        lines.append("  no spans")
+        return "\n".join(lines)
+    header = f"  {'stage':<30} {'n':>6}" + "".join(
+        f" {'p' + str(pct):>9}" for pct in PERCENTILES
+    )
+    lines.append(header)
+    for stage in sorted(durations):
+        values = durations[stage]
+        cells = "".join(f" {percentile(values, pct):>9.1f}" for pct in PERCENTILES)
+        lines.append(f"  {stage:<30} {len(values):>6}{cells}")
+    return "\n".join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Per-stage latency report (ms)")
+    parser.add_argument(
+        "--day",
+        type=dt.date.fromisoformat,
+        default=dt.date.today(),
+        help="Last day to report (YYYY-MM-DD)",
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        default=1,
+        help="Number of days to report, ending at --day",
+    )
+    parser.add_argument(
+        "--trace-log",
+        type=Path,
+        default=TRACE_LOG,
+        help="Base path of the daily trace logs",
+    )
+    parser.add_argument(
+        "--overlay-actions",
+        type=Path,
+        default=OVERLAY_ACTIONS_LOG,
+        help="Base path of the daily overlay action logs",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print percentiles as JSON instead of a table",
+    )
+    parser.add_argument(
+        "--log-db",
+        type=Path,
+        default=None,
+        help="Read spans and overlay actions from this SQLite log store",
+    )
+    args = parser.parse_args()
+
+    db = logdb.open_store(args.log_db)
+    report = {}
+    for offset in range(max(1, args.days) - 1, -1, -1):
+        day = args.day - dt.timedelta(days=offset)
+        if db is not None:
+            spans = db.rows("trace", day)
+            actions = db.rows("overlay_actions", day, type="OVERLAY_ACTION")
+        else:
+            spans = read_rows(logio.log_path_for_day(args.trace_log, day))
+            actions = read_rows(logio.log_path_for_day(args.overlay_actions, day))
+        durations = stage_durations(spans, actions)
+        if args.json:
+            report[day.isoformat()] = {
+                stage: {
+                    "n": len(values),
+                    **{f"p{pct}": percentile(values, pct) for pct in PERCENTILES},
+                }
+                for stage, values in sorted(durations.items())
+            }
+        else:
+            print(format_report(day, durations))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    if db is not None:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
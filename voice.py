@@ -1,6 +1,18 @@
 import asyncio
+import hashlib
+import itertools
+import os
+import queue
+import select
+import shutil
 import subprocess
-import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 try:
     import edge_tts
@@ -9,48 +21,992 @@ try:
 except ImportError:
     HAS_EDGE_TTS = False
 
+try:
+    import pyttsx3
 
-def play_audio(path: str) -> None:
-    try:
-        subprocess.Popen(
-            ["afplay", "-t", "20", path],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-    except Exception:
+    HAS_PYTTSX3 = True
+except ImportError:
+    HAS_PYTTSX3 = False
+
+EDGE_VOICE = "en-US-ChristopherNeural"
+RATES = {"urgent": "+15%", "calm": "+0%"}
+CACHE_DIR = Path("coach/state/tts_cache")
+CACHE_MAX_BYTES = 32 * 1024 * 1024
+PRIORITIES = {"urgent": 0, "calm": 1}
+SPEECH_MAX_AGE = 20.0
+# Tried in order by the "auto" sink; streaming players first.
+AUTO_SINKS = ("ffplay", "mpg123", "afplay", "paplay", "aplay")
+# Backends in order of preference; null is the silent last resort.
+TTS_BACKENDS = ("edge", "say", "espeak", "pyttsx3", "null")
+SPEECH_DEADLINE = 1.5
+# Longest gap between chunks once synthesis has started.
+SPEECH_STALL = 5.0
+BACKEND_COOLDOWN = 60.0
+BACKEND_COOLDOWN_MAX = 600.0
+BACKEND_WINDOW = 20
+
+
+class AudioCache:
+    # Synthesized audio stored under a hash of (voice, rate, text), so a phrase
+    # is only synthesized once. Files are evicted least-recently-played first
+    # once the directory grows past max_bytes; a hit bumps the file's mtime so
+    # the order survives restarts.
+    def __init__(self, root: Path, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.entries: Optional[OrderedDict] = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str, voice: str, rate: str) -> str:
+        raw = "\n".join([voice, rate, " ".join(text.split())])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}.mp3"
+
+    def _load(self) -> OrderedDict:
+        if self.entries is None:
+            found = []
+            try:
+                for path in self.root.glob("*.mp3"):
+                    stat = path.stat()
+                    found.append((stat.st_mtime, path.stem, stat.st_size))
+            except OSError:
+                pass
+            self.entries = OrderedDict((key, size) for _, key, size in sorted(found))
+        return self.entries
+
+    def get(self, text: str, voice: str, rate: str) -> Optional[Path]:
+        key = self.key(text, voice, rate)
+        path = self.path_for(key)
+        with self.lock:
+            entries = self._load()
+            try:
+                os.utime(path)
+            except OSError:
+                entries.pop(key, None)
+                return None
+            entries[key] = entries.get(key) or path.stat().st_size
+            entries.move_to_end(key)
+        return path
+
+    def put(self, text: str, voice: str, rate: str, data: bytes) -> Path:
+        key = self.key(text, voice, rate)
+        path = self.path_for(key)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Another process may be reading the same key; publish by rename.
+        tmp_path = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            entries = self._load()
+            entries[key] = len(data)
+            entries.move_to_end(key)
+            self._evict(entries)
+        return path
+
+    def _evict(self, entries: OrderedDict) -> None:
+        total = sum(entries.values())
+        while total > self.max_bytes and len(entries) > 1:
+            key, size = entries.popitem(last=False)
+            total -= size
+            self.path_for(key).unlink(missing_ok=True)
+
+
+CACHE = AudioCache(CACHE_DIR)
+# Pre-warm threads, stopped between phrases and joined by close().
+PREWARM_STOP = threading.Event()
+PREWARM_THREADS: List[threading.Thread] = []
+# Seconds close() waits for a clip or phrase in progress.
+CLOSE_TIMEOUT = 5.0
+
+
+class Playback:
+    # One clip handed to a sink. Streamed clips are fed with write() and closed
+    # with finish(); wait() returns once the clip has played.
+    def write(self, data: bytes) -> None:
+        pass
+
+    def finish(self) -> None:
         pass
 
+    def wait(self) -> None:
+        pass
+
+    def running(self) -> bool:
+        return False
+
+    def stop(self) -> None:
+        pass
+
+
+class ProcessPlayback(Playback):
+    def __init__(self, proc: subprocess.Popen) -> None:
+        self.proc = proc
+        self.chunks: Optional[queue.Queue] = None
+        if proc.stdin is not None:
+            # Players read at playback speed, so a full pipe would block the
+            # caller (the edge-tts event loop); a feeder thread absorbs that.
+            self.chunks = queue.Queue()
+            threading.Thread(target=self.feed, daemon=True).start()
+
+    def feed(self) -> None:
+        try:
+            while True:
+                data = self.chunks.get()
+                if data is None:
+                    break
+                self.proc.stdin.write(data)
+                self.proc.stdin.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                self.proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+
+    def write(self, data: bytes) -> None:
+        if self.chunks is not None:
+            self.chunks.put(data)
+
+    def finish(self) -> None:
+        if self.chunks is not None:
+            self.chunks.put(None)
+
+    def wait(self) -> None:
+        self.proc.wait()
+
+    def running(self) -> bool:
+        return self.proc.poll() is None
+
+    def stop(self) -> None:
+        if self.proc.poll() is None:
+            self.proc.kill()
+
+
+class AudioSink:
+    # A player command. formats lists what it plays from a file, stream_formats
+    # what it can decode from stdin while the audio is still arriving.
+    name = ""
+    formats: Tuple[str, ...] = ()
+    stream_formats: Tuple[str, ...] = ()
+
+    def command(self, path: Optional[str]) -> List[str]:
+        # The binary named after the sink, given the file or reading stdin.
+        return [self.name, path] if path else [self.name]
+
+    def available(self) -> bool:
+        return shutil.which(self.command(None)[0]) is not None
+
+    def start(self, fmt: str, path: Optional[str] = None) -> Optional[Playback]:
+        # Plays path, or opens a stream when path is None.
+        if fmt not in (self.formats if path else self.stream_formats):
+            return None
+        try:
+            proc = subprocess.Popen(
+                self.command(path),
+                stdin=subprocess.PIPE if path is None else subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            return None
+        return ProcessPlayback(proc)
+
 
-def say_macos(text: str) -> None:
+class AfplaySink(AudioSink):
+    name = "afplay"
+    formats = ("mp3", "wav")
+
+    def command(self, path: Optional[str]) -> List[str]:
+        return ["afplay", "-t", "20", path or ""]
+
+
+class FfplaySink(AudioSink):
+    name = "ffplay"
+    formats = ("mp3", "wav")
+    stream_formats = ("mp3", "wav")
+
+    def command(self, path: Optional[str]) -> List[str]:
+        return [
+            "ffplay",
+            "-nodisp",
+            "-autoexit",
+            "-loglevel",
+            "quiet",
+            "-i",
+            path or "pipe:0",
+        ]
+
+
+class Mpg123Sink(AudioSink):
+    name = "mpg123"
+    formats = ("mp3",)
+    stream_formats = ("mp3",)
+
+    def command(self, path: Optional[str]) -> List[str]:
+        return ["mpg123", "-q", path or "-"]
+
+
+class PaplaySink(AudioSink):
+    name = "paplay"
+    formats = ("wav",)
+    stream_formats = ("wav",)
+
+
+class AplaySink(AudioSink):
+    name = "aplay"
+    formats = ("wav",)
+    stream_formats = ("wav",)
+
+    def command(self, path: Optional[str]) -> List[str]:
+        return ["aplay", "-q", path or "-"]
+
+
+class RecordedPlayback(Playback):
+    def __init__(self, sink: "NullSink", fmt: str, data: bytes = b"") -> None:
+        self.sink = sink
+        self.fmt = fmt
+        self.data = bytearray(data)
+
+    def write(self, data: bytes) -> None:
+        self.data += data
+
+    def finish(self) -> None:
+        self.sink.clips.append((self.fmt, bytes(self.data)))
+
+
+class NullSink(AudioSink):
+    # Plays nothing and keeps the last clips it was given, for tests and for
+    # hosts without a player.
+    name = "null"
+    formats = ("mp3", "wav")
+    stream_formats = ("mp3", "wav")
+
+    def __init__(self) -> None:
+        self.clips: deque = deque(maxlen=32)
+
+    def available(self) -> bool:
+        return True
+
+    def start(self, fmt: str, path: Optional[str] = None) -> Optional[Playback]:
+        if path is None:
+            return RecordedPlayback(self, fmt)
+        try:
+            playback = RecordedPlayback(self, fmt, Path(path).read_bytes())
+        except OSError:
+            return None
+        playback.finish()
+        return playback
+
+
+SINKS = {
+    sink.name: sink
+    for sink in (
+        AfplaySink,
+        FfplaySink,
+        Mpg123Sink,
+        PaplaySink,
+        AplaySink,
+        NullSink,
+    )
+}
+
+
+def make_sinks(name: str = "auto") -> List[AudioSink]:
+    # Candidate sinks in preference order; "auto" keeps every installed player
+    # so each clip can go to the first one that handles its format.
+    if name != "auto":
+        if name not in SINKS:
+            raise ValueError(f"unknown audio sink: {name}")
+        return [SINKS[name]()]
+    sinks = [SINKS[candidate]() for candidate in AUTO_SINKS]
+    sinks = [sink for sink in sinks if sink.available()]
+    return sinks or [NullSink()]
+
+
+def say_macos(text: str) -> Optional[subprocess.Popen]:
     try:
-        subprocess.Popen(["say", "-v", "Fred", text])
+        return subprocess.Popen(["say", "-v", "Fred", text])
     except Exception:
-        pass
+        return None
 
 
 async def _generate_edge_audio(
-    text: str, voice: str, output_path: str, rate: str
-) -> None:
+    text: str,
+    voice: str,
+    rate: str,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+) -> bytes:
     communicate = edge_tts.Communicate(text, voice, rate=rate)
-    await communicate.save(output_path)
+    chunks = []
+    async for chunk in communicate.stream():
+        if chunk.get("type") == "audio" and chunk.get("data"):
+            chunks.append(chunk["data"])
+            if on_chunk is not None:
+                on_chunk(chunk["data"])
+    return b"".join(chunks)
 
 
-def speak(text: str, intensity: str = "urgent") -> None:
-    if not text or not text.strip():
-        return
+def synthesize(
+    text: str,
+    intensity: str = "urgent",
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> Optional[Path]:
+    # Cached audio for text, synthesizing it on a miss (on loop when given).
+    rate = RATES.get(intensity, RATES["calm"])
+    cached = CACHE.get(text, EDGE_VOICE, rate)
+    if cached is not None or not HAS_EDGE_TTS:
+        return cached
+    coroutine = _generate_edge_audio(text, EDGE_VOICE, rate)
+    if loop is not None:
+        data = loop.run_until_complete(coroutine)
+    else:
+        data = asyncio.run(coroutine)
+    if not data:
+        raise RuntimeError("edge_tts returned no audio")
+    return CACHE.put(text, EDGE_VOICE, rate, data)
+
 
-    if HAS_EDGE_TTS:
+def prewarm(phrases: Iterable[str], intensity: str = "urgent") -> int:
+    # Synthesize phrases that are not cached yet; returns how many were added.
+    if not HAS_EDGE_TTS:
+        return 0
+    added = 0
+    rate = RATES.get(intensity, RATES["calm"])
+    for text in dict.fromkeys(phrase for phrase in phrases if phrase.strip()):
+        if PREWARM_STOP.is_set():
+            break
+        if CACHE.get(text, EDGE_VOICE, rate) is not None:
+            continue
         try:
-            voice_name = "en-US-ChristopherNeural"
-            rate = "+15%" if intensity == "urgent" else "+0%"
+            synthesize(text, intensity)
+            added += 1
+        except Exception as exc:
+            print(f"TTS prewarm failed for {text!r}: {exc}")
+            break
+    return added
+
+
+def prewarm_async(phrases: Iterable[str], intensity: str = "urgent") -> None:
+    thread = threading.Thread(
+        target=prewarm, args=(list(phrases), intensity), daemon=True
+    )
+    thread.start()
+    PREWARM_THREADS.append(thread)
+
+
+class TTSBackend(ABC):
+    # A speech engine: an AudioBackend or a DirectBackend. expected_ms is the
+    # first-audio latency assumed before any samples.
+    name = ""
+    fmt: Optional[str] = None
+    expected_ms = 500.0
+    cache = False
+
+    def available(self) -> bool:
+        return True
+
+    def cache_key(self, intensity: str) -> Tuple[str, str]:
+        return self.name, intensity
 
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as handle:
-                temp_path = handle.name
 
-            asyncio.run(_generate_edge_audio(text, voice_name, temp_path, rate))
-            play_audio(temp_path)
+class AudioBackend(TTSBackend):
+    # Yields chunks encoded as fmt (set by each backend) for a sink to play.
+    @abstractmethod
+    def chunks(
+        self,
+        text: str,
+        intensity: str,
+        loop: asyncio.AbstractEventLoop,
+        remaining: Callable[[], Optional[float]],
+    ) -> Iterator[bytes]:
+        # remaining() is the time left for the next chunk, None for no limit;
+        # running out raises TimeoutError.
+        ...
+
+
+class DirectBackend(TTSBackend):
+    # Speaks through its own output; fmt stays None.
+    @abstractmethod
+    def speak(self, text: str, intensity: str) -> Optional[Playback]:
+        ...
+
+
+class EdgeBackend(AudioBackend):
+    name = "edge"
+    fmt = "mp3"
+    expected_ms = 700.0
+    cache = True
+
+    def available(self) -> bool:
+        return HAS_EDGE_TTS
+
+    def cache_key(self, intensity: str) -> Tuple[str, str]:
+        return EDGE_VOICE, RATES.get(intensity, RATES["calm"])
+
+    def chunks(
+        self,
+        text: str,
+        intensity: str,
+        loop: asyncio.AbstractEventLoop,
+        remaining: Callable[[], Optional[float]],
+    ) -> Iterator[bytes]:
+        voice, rate = self.cache_key(intensity)
+        stream = edge_tts.Communicate(text, voice, rate=rate).stream()
+        try:
+            while True:
+                step = stream.__anext__()
+                timeout = remaining()
+                if timeout is not None:
+                    step = asyncio.wait_for(step, max(0.0, timeout))
+                try:
+                    chunk = loop.run_until_complete(step)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise TimeoutError("edge-tts timed out")
+                if chunk.get("type") == "audio" and chunk.get("data"):
+                    yield chunk["data"]
+        finally:
+            loop.run_until_complete(stream.aclose())
+
+
+class EspeakBackend(AudioBackend):
+    # espeak-ng writes a WAV stream to stdout, so it plays through any sink
+    # that decodes wav (paplay, aplay, ffplay).
+    name = "espeak"
+    fmt = "wav"
+    expected_ms = 80.0
+    SPEEDS = {"urgent": "190", "calm": "165"}
+
+    def binary(self) -> Optional[str]:
+        return shutil.which("espeak-ng") or shutil.which("espeak")
+
+    def available(self) -> bool:
+        return self.binary() is not None
+
+    def chunks(
+        self,
+        text: str,
+        intensity: str,
+        loop: asyncio.AbstractEventLoop,
+        remaining: Callable[[], Optional[float]],
+    ) -> Iterator[bytes]:
+        speed = self.SPEEDS.get(intensity, self.SPEEDS["calm"])
+        proc = subprocess.Popen(
+            [self.binary() or "espeak-ng", "--stdout", "-s", speed, text],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        fd = proc.stdout.fileno()
+        try:
+            while True:
+                timeout = remaining()
+                ready, _, _ = select.select(
+                    [fd], [], [], None if timeout is None else max(0.0, timeout)
+                )
+                if not ready:
+                    raise TimeoutError("espeak timed out")
+                data = os.read(fd, 16384)
+                if not data:
+                    return
+                yield data
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+
+class SayBackend(DirectBackend):
+    name = "say"
+    expected_ms = 100.0
+
+    def available(self) -> bool:
+        return shutil.which("say") is not None
+
+    def speak(self, text: str, intensity: str) -> Optional[Playback]:
+        proc = say_macos(text)
+        return ProcessPlayback(proc) if proc is not None else None
+
+
+class EnginePlayback(Playback):
+    # pyttsx3 speaks inside runAndWait(), which wait() runs on the worker.
+    def __init__(self, engine) -> None:
+        self.engine = engine
+        self.active = True
+
+    def wait(self) -> None:
+        try:
+            self.engine.runAndWait()
+        finally:
+            self.active = False
+
+    def running(self) -> bool:
+        return self.active
+
+    def stop(self) -> None:
+        self.engine.stop()
+
+
+class Pyttsx3Backend(DirectBackend):
+    name = "pyttsx3"
+    expected_ms = 150.0
+    SPEEDS = {"urgent": 200, "calm": 175}
+
+    def __init__(self) -> None:
+        self.engine = None
+
+    def available(self) -> bool:
+        return HAS_PYTTSX3
+
+    def speak(self, text: str, intensity: str) -> Optional[Playback]:
+        # The engine is bound to the thread that made it: the speech worker.
+        if self.engine is None:
+            self.engine = pyttsx3.init()
+        self.engine.setProperty(
+            "rate", self.SPEEDS.get(intensity, self.SPEEDS["calm"])
+        )
+        self.engine.say(text)
+        return EnginePlayback(self.engine)
+
+
+class NullBackend(DirectBackend):
+    # Says nothing; the last resort, so a dead audio stack never raises.
+    name = "null"
+    expected_ms = 0.0
+
+    def speak(self, text: str, intensity: str) -> Optional[Playback]:
+        return Playback()
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (EdgeBackend, SayBackend, EspeakBackend, Pyttsx3Backend, NullBackend)
+}
+
+
+class BackendHealth:
+    # Rolling first-audio latency and outcomes for one backend. A failure or a
+    # missed deadline starts a cooldown that doubles per consecutive miss; when
+    # it runs out the window is cleared so the backend gets a fresh trial.
+    def __init__(self, expected_ms: float, window: int = BACKEND_WINDOW) -> None:
+        self.expected_ms = expected_ms
+        self.latencies: deque = deque(maxlen=window)
+        self.outcomes: deque = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        if self.cooldown_until and now >= self.cooldown_until:
+            self.cooldown_until = 0.0
+            self.latencies.clear()
+            self.outcomes.clear()
+        return not self.cooldown_until
+
+    def failure_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def estimate(self, deadline: float) -> float:
+        # Median latency, plus the time a failure wastes (up to the deadline)
+        # weighted by how often this backend fails.
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            latency = ordered[len(ordered) // 2]
+        else:
+            latency = self.expected_ms
+        return latency + self.failure_rate() * deadline * 1000.0
+
+    def succeeded(self, latency_ms: float) -> None:
+        self.latencies.append(latency_ms)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+
+    def failed(self, now: float, cooldown: float) -> None:
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        backoff = cooldown * 2 ** (self.consecutive_failures - 1)
+        self.cooldown_until = now + min(backoff, BACKEND_COOLDOWN_MAX)
+
+
+def make_backends(names: Iterable[str]) -> List[TTSBackend]:
+    backends = []
+    for name in names:
+        if name not in BACKENDS:
+            raise ValueError(f"unknown TTS backend: {name}")
+        backend = BACKENDS[name]()
+        if backend.available():
+            backends.append(backend)
+    return backends
+
+
+class SpeechWorker:
+    # One thread owns synthesis and playback, with a persistent event loop for
+    # edge_tts. Utterances wait in a priority queue (urgent before calm, FIFO
+    # within a level); one older than max_age when its turn comes is dropped,
+    # and only one clip plays at a time. An urgent utterance cuts off a calm
+    # one that is still playing.
+    #
+    # Cached edge-tts audio plays straight away. Otherwise a backend is picked
+    # per utterance: the first healthy one (in preference order) whose
+    # estimated first-audio latency fits the deadline, else the fastest
+    # healthy one. An attempt that has produced no audio by the deadline, or
+    # whose stream then stalls for longer than stall, is abandoned, its backend
+    # cools down, and the next candidate is tried.
+    #
+    # Audio is streamed when a sink can decode from stdin: playback starts on
+    # the first chunk, and edge-tts clips are cached once complete. Each
+    # utterance reports its time to first audio (from the worker picking it
+    # up to the first bytes reaching a player) with the backend and mode:
+    # cache, stream, file (synthesize fully, then play) or direct.
+    def __init__(
+        self,
+        max_age: float = SPEECH_MAX_AGE,
+        sink: str = "auto",
+        stream: bool = True,
+        backends: Iterable[str] = TTS_BACKENDS,
+        deadline: float = SPEECH_DEADLINE,
+        cooldown: float = BACKEND_COOLDOWN,
+        stall: float = SPEECH_STALL,
+    ) -> None:
+        self.max_age = max_age
+        self.sinks = make_sinks(sink)
+        self.stream = stream
+        self.backends = [
+            backend for backend in make_backends(backends) if self.can_play(backend)
+        ]
+        self.deadline = deadline
+        self.cooldown = cooldown
+        self.stall = stall
+        self.health = {
+            backend.name: BackendHealth(backend.expected_ms)
+            for backend in self.backends
+        }
+        self.queue: queue.PriorityQueue = queue.PriorityQueue()
+        self.seq = itertools.count()
+        self.lock = threading.Lock()
+        self.current: Optional[Playback] = None
+        self.current_priority: Optional[int] = None
+        self.stats = {
+            "spoken": 0,
+            "dropped": 0,
+            "preempted": 0,
+            "failed": 0,
+            "missed": 0,
+        }
+        self.first_audio_ms: Dict[str, deque] = {}
+        self.thread = threading.Thread(target=self.run, name="speech", daemon=True)
+        self.thread.start()
+
+    def enqueue(
+        self,
+        text: str,
+        intensity: str = "urgent",
+        on_start: Optional[Callable[[dict], None]] = None,
+    ) -> None:
+        priority = PRIORITIES.get(intensity, PRIORITIES["calm"])
+        self.queue.put(
+            (priority, next(self.seq), time.monotonic(), text, intensity, on_start)
+        )
+        with self.lock:
+            if (
+                self.current is not None
+                and self.current_priority is not None
+                and priority < self.current_priority
+                and self.current.running()
+            ):
+                self.current.stop()
+                self.stats["preempted"] += 1
+
+    def run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                priority, _, queued_at, text, intensity, on_start = self.queue.get()
+                if text is None:
+                    return
+                age = time.monotonic() - queued_at
+                if self.max_age > 0 and age > self.max_age:
+                    self.stats["dropped"] += 1
+                    print(f"voice: dropped stale utterance ({age:.0f}s old): {text}")
+                    continue
+                try:
+                    self.play(text, intensity, priority, loop, on_start)
+                    self.stats["spoken"] += 1
+                except Exception as exc:
+                    self.stats["failed"] += 1
+                    print(f"voice: speech failed: {exc}")
+        finally:
+            loop.close()
+
+    def sink_for(self, fmt: str, stream: bool = False) -> Optional[AudioSink]:
+        for sink in self.sinks:
+            if fmt in (sink.stream_formats if stream else sink.formats):
+                return sink
+        return None
+
+    def can_play(self, backend: TTSBackend) -> bool:
+        # Uncached audio needs a sink that takes it on stdin; cached clips can
+        # also go to a file player.
+        if backend.fmt is None:
+            return True
+        if self.sink_for(backend.fmt, stream=True) is not None:
+            return True
+        return backend.cache and self.sink_for(backend.fmt) is not None
+
+    def candidates(self) -> List[TTSBackend]:
+        now = time.monotonic()
+        deadline = self.deadline if self.deadline > 0 else BACKEND_COOLDOWN_MAX
+        healthy = [
+            backend
+            for backend in self.backends
+            if backend.name != "null" and self.health[backend.name].healthy(now)
+        ]
+        fits = [
+            backend
+            for backend in healthy
+            if self.health[backend.name].estimate(deadline) <= deadline * 1000.0
+        ]
+        rest = sorted(
+            (backend for backend in healthy if backend not in fits),
+            key=lambda backend: self.health[backend.name].estimate(deadline),
+        )
+        fallback = [backend for backend in self.backends if backend.name == "null"]
+        return fits + rest + fallback
+
+    def play(
+        self,
+        text: str,
+        intensity: str,
+        priority: int,
+        loop: asyncio.AbstractEventLoop,
+        on_start: Optional[Callable[[dict], None]],
+    ) -> None:
+        started = time.monotonic()
+        report = {}
+        skipped = []
+
+        def begin(
+            playback: Optional[Playback], backend: str, mode: str, sink: str
+        ) -> None:
+            if playback is None or report:
+                return
+            report.update(
+                backend=backend,
+                mode=mode,
+                sink=sink,
+                first_audio_ms=round((time.monotonic() - started) * 1000.0, 1),
+                skipped=list(skipped) or None,
+            )
+            with self.lock:
+                self.current = playback
+                self.current_priority = priority
+            if on_start is not None:
+                on_start(dict(report))
+
+        playback = None
+        for backend in self.backends:
+            if not backend.cache:
+                continue
+            cached = CACHE.get(text, *backend.cache_key(intensity))
+            if cached is not None:
+                playback = self.start_file(cached, backend, "cache", begin)
+                break
+        if playback is None:
+            for backend in self.candidates():
+                try:
+                    playback, latency_ms = self.attempt(
+                        backend, text, intensity, loop, begin
+                    )
+                except Exception as exc:
+                    missed = isinstance(exc, TimeoutError)
+                    if missed:
+                        self.stats["missed"] += 1
+                    self.health[backend.name].failed(time.monotonic(), self.cooldown)
+                    print(f"voice: {backend.name} {'missed' if missed else exc}")
+                    skipped.append(backend.name)
+                    if report:
+                        # Audio already started; let the partial clip play out.
+                        playback = self.current
+                        break
+                    continue
+                if playback is not None:
+                    self.health[backend.name].succeeded(latency_ms)
+                    break
+        if playback is None:
             return
-        except Exception as exc:
-            print(f"Edge TTS failed, falling back to macOS: {exc}")
+        key = f"{report['backend']}.{report['mode']}"
+        self.first_audio_ms.setdefault(key, deque(maxlen=100)).append(
+            report["first_audio_ms"]
+        )
+        print(
+            f"voice: first audio {report['first_audio_ms']:.0f} ms"
+            f" ({report['backend']} {report['mode']} via {report['sink']})"
+        )
+        try:
+            playback.wait()
+        finally:
+            with self.lock:
+                self.current = None
+                self.current_priority = None
+
+    def start_file(
+        self,
+        path: Path,
+        backend: TTSBackend,
+        mode: str,
+        begin: Callable[[Optional[Playback], str, str, str], None],
+    ) -> Optional[Playback]:
+        sink = self.sink_for(backend.fmt)
+        if sink is None:
+            return None
+        playback = sink.start(backend.fmt, str(path))
+        begin(playback, backend.name, mode, sink.name)
+        return playback
+
+    def attempt(
+        self,
+        backend: TTSBackend,
+        text: str,
+        intensity: str,
+        loop: asyncio.AbstractEventLoop,
+        begin: Callable[[Optional[Playback], str, str, str], None],
+    ) -> Tuple[Optional[Playback], float]:
+        # Returns the playback and the backend's first-audio latency in ms.
+        started = time.monotonic()
+        if backend.fmt is None:
+            playback = backend.speak(text, intensity)
+            if playback is None:
+                raise RuntimeError("did not start")
+            begin(playback, backend.name, "direct", backend.name)
+            return playback, (time.monotonic() - started) * 1000.0
+        fmt = backend.fmt
+        sink = self.sink_for(fmt, stream=True)
+        streaming = self.stream and sink is not None
+        deadline = started + self.deadline if self.deadline > 0 else None
+        playback = None
+        latency_ms = 0.0
+        last_chunk = started
+
+        def remaining() -> Optional[float]:
+            # The deadline covers the first chunk only, so a sink that plays
+            # from a file (afplay) does not hold the whole synthesis to it.
+            # After that each chunk gets stall seconds, so a hung stream never
+            # blocks the worker.
+            if not chunks:
+                return None if deadline is None else deadline - time.monotonic()
+            if self.stall <= 0:
+                return None
+            return last_chunk + self.stall - time.monotonic()
+
+        chunks: List[bytes] = []
+        try:
+            for data in backend.chunks(text, intensity, loop, remaining):
+                last_chunk = time.monotonic()
+                if not chunks:
+                    latency_ms = (last_chunk - started) * 1000.0
+                chunks.append(data)
+                if not streaming:
+                    continue
+                if playback is None:
+                    playback = sink.start(fmt)
+                    if playback is None:
+                        raise RuntimeError(f"{sink.name} did not start")
+                    begin(playback, backend.name, "stream", sink.name)
+                playback.write(data)
+        finally:
+            if playback is not None:
+                playback.finish()
+        audio = b"".join(chunks)
+        if not audio:
+            raise RuntimeError("returned no audio")
+        if backend.cache:
+            path = CACHE.put(text, *backend.cache_key(intensity), audio)
+            if playback is None and self.sink_for(fmt) is not None:
+                return self.start_file(path, backend, "file", begin), latency_ms
+        if playback is None and sink is not None:
+            playback = sink.start(fmt)
+            if playback is not None:
+                begin(playback, backend.name, "file", sink.name)
+                playback.write(audio)
+                playback.finish()
+        return playback, latency_ms
+
+    def backend_status(self) -> Dict[str, dict]:
+        now = time.monotonic()
+        deadline = self.deadline if self.deadline > 0 else BACKEND_COOLDOWN_MAX
+        status = {}
+        for name, health in self.health.items():
+            status[name] = {
+                "healthy": health.healthy(now),
+                "estimate_ms": round(health.estimate(deadline), 1),
+                "failure_rate": round(health.failure_rate(), 2),
+                "cooldown_s": round(max(0.0, health.cooldown_until - now), 1),
+            }
+        return status
+
+    def close(self) -> None:
+        # Stops after the clip in progress; anything still queued is dropped.
+        self.queue.put((-1, next(self.seq), time.monotonic(), None, "", None))
+        with self.lock:
+            if self.current is not None:
+                self.current.stop()
+
+
+WORKER: Optional[SpeechWorker] = None
+WORKER_LOCK = threading.Lock()
+
+
+def start_worker(
+    max_age: float = SPEECH_MAX_AGE,
+    sink: str = "auto",
+    stream: bool = True,
+    backends: Iterable[str] = TTS_BACKENDS,
+    deadline: float = SPEECH_DEADLINE,
+) -> SpeechWorker:
+    global WORKER
+    with WORKER_LOCK:
+        if WORKER is None:
+            WORKER = SpeechWorker(
+                max_age, sink=sink, stream=stream, backends=backends, deadline=deadline
+            )
+        else:
+            WORKER.max_age = max_age
+        return WORKER
+
+
+def speak(
+    text: str,
+    intensity: str = "urgent",
+    on_start: Optional[Callable[[dict], None]] = None,
+) -> None:
+    # Queues the utterance and returns; the speech worker plays it. on_start
+    # gets the playback report (backend, mode, sink, first_audio_ms) when audio
+    # begins.
+    if not text or not text.strip():
+        return
+    worker = WORKER or start_worker()
+    worker.enqueue(text, intensity, on_start)
+
 
-    say_macos(text)
+def close() -> None:
+    # Lets the clip and the pre-warm phrase in progress finish writing to the
+    # cache before the process exits.
+    global WORKER
+    PREWARM_STOP.set()
+    with WORKER_LOCK:
+        worker, WORKER = WORKER, None
+    threads = list(PREWARM_THREADS)
+    if worker is not None:
+        worker.close()
+        threads.append(worker.thread)
+    deadline = time.monotonic() + CLOSE_TIMEOUT
+    for thread in threads:
+        thread.join(timeout=max(0.0, deadline - time.monotonic()))
+    PREWARM_THREADS.clear()
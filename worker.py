@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import queue
+import shutil
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional, Tuple
+
+# JSON-lines protocol, one object per line in each direction:
+#   request:  {"id": "...", "message": "...", "files": ["..."], "timeout": 20}
+#   response: {"id": "...", "code": 0, "out": "...", "err": "..."}
+# A request with "op": "ping" is answered with code 0 and empty output.
+
+# Seconds a worker gets to exit on its own (stdin closed), then after SIGTERM,
+# before its whole process group is killed.
+STOP_GRACE = 2.0
+TERM_GRACE = 6.0
+# Extra seconds the pool waits past a request's timeout, so the worker's own
+# subprocess timeout answers first and the worker is not restarted.
+TIMEOUT_SLACK = 5.0
+
+STUB_RESPONSES = {
+    "coach_monitor": {
+        "status": "unsure",
+        "confidence": 0.5,
+        "reason": "stub backend",
+        "short_caption": "stub classifier response",
+    },
+    "coach_plan": {
+        "overlay": {
+            "level": "B",
+            "style_id": "calm",
+            "headline": "Back to the block",
+            "human_line": "Stub planner response.",
+            "diagnosis": "",
+            "next_action": "Return to the planned work now.",
+            "block_id": None,
+            "block_name": "",
+        },
+        "hud_text": "",
+        "notification_text": "",
+        "speech_text": "",
+    },
+}
+
+
+def run(cmd: list, timeout: Optional[int] = None) -> Tuple[int, str, str]:
+    try:
+        proc = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            timeout=timeout,
+        )
+        return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
+    except subprocess.TimeoutExpired:
+        return 124, "", "timeout"
+    except OSError as exc:
+        return 127, "", str(exc)
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OpencodeBackend:
+    # Keeps one `opencode serve` alive for the worker's lifetime so each request
+    # attaches to an initialised server instead of booting opencode from scratch.
+    def __init__(self, agent: str, warm: bool = True) -> None:
+        self.agent = agent
+        self.server: Optional[subprocess.Popen] = None
+        self.url: Optional[str] = None
+        # Socket connections are served on their own threads; this guards the
+        # server handle while one of them restarts it.
+        self.lock = threading.Lock()
+        if warm and shutil.which("opencode"):
+            self.start_server()
+
+    def start_server(self) -> None:
+        port = free_port()
+        try:
+            self.server = subprocess.Popen(
+                ["opencode", "serve", "--hostname", "127.0.0.1", "--port", str(port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except OSError:
+            self.server = None
+            return
+        deadline = time.time() + 15
+        while time.time() < deadline:
+            if self.server.poll() is not None:
+                self.server = None
+                return
+            try:
+                with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                    self.url = f"http://127.0.0.1:{port}"
+                    return
+            except OSError:
+                time.sleep(0.2)
+
+    def handle(
+        self, message: str, files: list, timeout: Optional[int]
+    ) -> Tuple[int, str, str]:
+        with self.lock:
+            if self.server is not None and self.server.poll() is not None:
+                self.server = None
+                self.url = None
+                self.start_server()
+            url = self.url
+        cmd = ["opencode", "run"]
+        if url:
+            cmd += ["--attach", url]
+        cmd += ["--agent", self.agent]
+        for file_path in files:
+            cmd += ["-f", str(file_path)]
+        cmd += ["--", message]
+        return run(cmd, timeout=timeout)
+
+    def close(self) -> None:
+        with self.lock:
+            server = self.server
+        if server is not None and server.poll() is None:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+
+class StubBackend:
+    def __init__(self, agent: str) -> None:
+        self.agent = agent
+
+    def handle(
+        self, message: str, files: list, timeout: Optional[int]
+    ) -> Tuple[int, str, str]:
+        payload = STUB_RESPONSES.get(self.agent, {})
+        return 0, json.dumps(payload, ensure_ascii=True), ""
+
+    def close(self) -> None:
+        pass
+
+
+def make_backend(args: argparse.Namespace):
+    if args.backend == "stub":
+        return StubBackend(args.agent)
+    return OpencodeBackend(args.agent, warm=not args.no_warm)
+
+
+def handle_line(backend, line: str) -> Optional[str]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError:
+        return json.dumps({"id": None, "code": 2, "out": "", "err": "bad_request"})
+    request_id = request.get("id")
+    if request.get("op") == "ping":
+        return json.dumps({"id": request_id, "code": 0, "out": "", "err": ""})
+    try:
+        code, out, err = backend.handle(
+            str(request.get("message", "")),
+            list(request.get("files") or []),
+            request.get("timeout"),
+        )
+    except Exception as exc:
+        code, out, err = 1, "", f"worker_error:{exc}"
+    return json.dumps(
+        {"id": request_id, "code": code, "out": out, "err": err}, ensure_ascii=True
+    )
+
+
+def serve_stdio(backend) -> None:
+    for line in sys.stdin:
+        response = handle_line(backend, line)
+        if response is None:
+            continue
+        sys.stdout.write(response + "\n")
+        sys.stdout.flush()
+
+
+def serve_socket(backend, path: Path) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            for raw in self.rfile:
+                response = handle_line(backend, raw.decode("utf-8"))
+                if response is None:
+                    continue
+                self.wfile.write((response + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    with socketserver.ThreadingUnixStreamServer(str(path), Handler) as server:
+        server.daemon_threads = True
+        try:
+            server.serve_forever()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+def stop_process(proc: subprocess.Popen, grace: float) -> None:
+    # EOF on stdin lets the worker finish and close its backend; SIGTERM does
+    # the same for a busy one. Only a worker that ignores both is killed,
+    # together with its process group.
+    try:
+        proc.stdin.close()
+    except (OSError, ValueError):
+        pass
+    for step, timeout in (("eof", grace), ("term", TERM_GRACE)):
+        if step == "term" and proc.poll() is None:
+            proc.terminate()
+        try:
+            proc.wait(timeout=timeout)
+            return
+        except subprocess.TimeoutExpired:
+            pass
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        proc.kill()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        pass
+
+
+class Worker:
+    def __init__(self, cmd: list) -> None:
+        self.cmd = cmd
+        self.proc: Optional[subprocess.Popen] = None
+        self.lines: queue.Queue = queue.Queue()
+        self.restarts = -1
+        self.reapers: list = []
+        self.start()
+
+    def start(self) -> None:
+        # Own session, so a last-resort kill also reaches its opencode server.
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            start_new_session=True,
+        )
+        self.lines = queue.Queue()
+        self.restarts += 1
+        threading.Thread(
+            target=self.read_lines, args=(self.proc, self.lines), daemon=True
+        ).start()
+
+    @staticmethod
+    def read_lines(proc: subprocess.Popen, lines: queue.Queue) -> None:
+        for line in proc.stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def restart(self) -> None:
+        self.stop()
+        self.start()
+
+    def retire(self) -> None:
+        # Replaces a worker that may still answer: calls go to a fresh process
+        # at once while the old one is stopped in the background.
+        proc = self.proc
+        self.start()
+        reaper = threading.Thread(target=stop_process, args=(proc, 0.0), daemon=True)
+        reaper.start()
+        self.reapers.append(reaper)
+
+    def stop(self, grace: float = STOP_GRACE) -> None:
+        if self.proc is not None:
+            stop_process(self.proc, grace)
+        for reaper in self.reapers:
+            reaper.join(timeout=TERM_GRACE + 5)
+        self.reapers = []
+
+    def call(self, request: dict, timeout: Optional[float]) -> Tuple[int, str, str]:
+        if not self.alive():
+            self.restart()
+        try:
+            self.proc.stdin.write(json.dumps(request, ensure_ascii=True) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.restart()
+            return 1, "", "worker_died"
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.time())
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                # A timed-out worker may still answer later; replace it so the
+                # stale response can never be read by the next caller.
+                self.retire()
+                return 124, "", "timeout"
+            if line is None:
+                self.restart()
+                return 1, "", "worker_died"
+            try:
+                response = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if response.get("id") != request["id"]:
+                continue
+            return (
+                int(response.get("code", 1)),
+                str(response.get("out", "")),
+                str(response.get("err", "")),
+            )
+
+
+class WorkerPool:
+    def __init__(
+        self,
+        agent: str,
+        size: int = 1,
+        backend: str = "opencode",
+    ) -> None:
+        cmd = [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "--agent",
+            agent,
+            "--backend",
+            backend,
+        ]
+        self.agent = agent
+        self.idle: queue.Queue = queue.Queue()
+        self.workers = [Worker(cmd) for _ in range(max(1, size))]
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def call(
+        self, message: str, files: Optional[list] = None, timeout: Optional[int] = None
+    ) -> Tuple[int, str, str]:
+        started = time.time()
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return 124, "", "worker_pool_busy"
+        try:
+            request = {
+                "id": str(uuid.uuid4()),
+                "message": message,
+                "files": [str(path) for path in (files or [])],
+                "timeout": timeout,
+            }
+            remaining = None
+            if timeout is not None:
+                remaining = max(1.0, timeout - (time.time() - started))
+                request["timeout"] = remaining
+                remaining += TIMEOUT_SLACK
+            return worker.call(request, remaining)
+        finally:
+            self.idle.put(worker)
+
+    def restarts(self) -> int:
+        return sum(worker.restarts for worker in self.workers)
+
+    def close(self) -> None:
+        # Signal every worker first so their backends shut down in parallel.
+        for worker in self.workers:
+            try:
+                worker.proc.stdin.close()
+            except Exception:
+                pass
+        for worker in self.workers:
+            worker.stop()
+
+
+class SocketClient:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def call(
+        self, message: str, files: Optional[list] = None, timeout: Optional[int] = None
+    ) -> Tuple[int, str, str]:
+        request = {
+            "id": str(uuid.uuid4()),
+            "message": message,
+            "files": [str(path) for path in (files or [])],
+            "timeout": timeout,
+        }
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(timeout)
+                sock.connect(str(self.path))
+                line = json.dumps(request, ensure_ascii=True) + "\n"
+                sock.sendall(line.encode("utf-8"))
+                with sock.makefile("r", encoding="utf-8") as reader:
+                    line = reader.readline()
+        except socket.timeout:
+            return 124, "", "timeout"
+        except OSError as exc:
+            return 1, "", f"worker_socket_error:{exc}"
+        try:
+            response = json.loads(line)
+        except json.JSONDecodeError:
+            return 1, "", "worker_bad_response"
+        return (
+            int(response.get("code", 1)),
+            str(response.get("out", "")),
+            str(response.get("err", "")),
+        )
+
+    def close(self) -> None:
+        pass
+
+
+def make_client(
+    agent: str, size: int, backend: str = "opencode", socket_path: Optional[Path] = None
+):
+    if socket_path:
+        return SocketClient(socket_path)
+    if size <= 0:
+        return None
+    return WorkerPool(agent, size=size, backend=backend)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Persistent coach agent worker")
+    parser.add_argument(
+        "--agent",
+        type=str,
+        required=True,
+        help="Agent name (coach_monitor or coach_plan)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["opencode", "stub"],
+        default="opencode",
+        help="Request handler backend",
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        help="Serve on a Unix socket instead of stdin/stdout",
+    )
+    parser.add_argument(
+        "--no-warm",
+        action="store_true",
+        help="Do not keep an opencode server warm between requests",
+    )
+    args = parser.parse_args()
+
+    # SIGTERM unwinds through the finally below, so the backend still closes.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    backend = make_backend(args)
+    try:
+        if args.socket:
+            serve_socket(backend, args.socket)
+        else:
+            serve_stdio(backend)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())